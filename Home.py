@@ -1,106 +1,158 @@
 import datetime
-from googleapiclient.discovery import build
+import hashlib
+import numpy
 import streamlit as st
 import io
 import plotly.express as px
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 import plotly.graph_objects as go
-import concurrent.futures
 from googleapiclient.errors import HttpError
 from streamlit_extras.metric_cards import style_metric_cards
 from streamlit_extras.chart_container import chart_container
 from streamlit_extras.switch_page_button import switch_page
 from streamlit_extras.app_logo import add_logo
 
-from prophet import Prophet
-
-from channelDataExtraction import getChannelData
+from view_forecast import forecast_error, get_forecast
+from shared_datasets import get_channel_dataset, get_search_index
+from channel_resolver import get_channel_resolver
+from request_scheduler import QuotaExceededError
+from instrumentation import render_performance_panel, span, timed
 from channelVideoDataExtraction import *
 
 
 ########################################################################################################################
 #                                               FUNCTIONS
 ########################################################################################################################
-@st.cache_data(ttl=3600, show_spinner=False)
-def get_channel_id(api_key, channel_name):
-    youtube = build('youtube', 'v3', developerKey=api_key)
-    request = youtube.search().list(
-        q=channel_name,
-        part='snippet',
-        type='channel',
-        maxResults=1
-    )
-    response = request.execute()
-    if not response['items']:
-        return None
-    return response['items'][0]['snippet']['channelId']
-def download_data(api_key, channel_id):
-    channel_details = getChannelData(api_key, channel_id)
+# Sort options of the video browser: (catalog sort key, descending), None keeps the search ranking
+BROWSER_SORTS = {
+    "Best match": (None, True),
+    "Newest": ('published_date', True),
+    "Oldest": ('published_date', False),
+    "Most viewed": ('view_count', True),
+    "Most liked": ('like_count', True),
+    "Most commented": ('comment_count', True),
+}
+
+BROWSER_PAGE_SIZES = [10, 25, 50, 100]
+
+BROWSER_COLUMNS = ['thumbnail', 'title', 'published_date', 'view_count', 'like_count', 'comment_count',
+                   'duration_minutes', 'id']
+
+BROWSER_COLUMN_CONFIG = {
+    'thumbnail': st.column_config.ImageColumn("Thumbnail", width="small"),
+    'title': st.column_config.TextColumn("Title", width="large"),
+    'published_date': st.column_config.DatetimeColumn("Published", format="YYYY-MM-DD"),
+    'view_count': st.column_config.NumberColumn("Views", format="localized"),
+    'like_count': st.column_config.NumberColumn("Likes", format="localized"),
+    'comment_count': st.column_config.NumberColumn("Comments", format="localized"),
+    'duration_minutes': st.column_config.NumberColumn("Minutes", format="%.1f"),
+    'id': st.column_config.TextColumn("Video ID"),
+}
+
+
+def frequency_digest(frequencies):
+    return hashlib.sha1(repr(sorted(frequencies.items())).encode("utf-8")).hexdigest()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def render_word_cloud(digest, _frequencies, width, height):
+    # Rendered PNG bytes are cached on the frequency digest and image size
+    with span("word_cloud"):
+        # wordcloud pulls in matplotlib, loaded only when a cloud is actually drawn
+        from wordcloud import WordCloud
+
+        wordcloud = WordCloud(width=width, height=height, background_color='black')\
+            .generate_from_frequencies(_frequencies)
+
+        buf = io.BytesIO()
+        wordcloud.to_image().save(buf, format="png")
+        return buf.getvalue()
+
+
+@timed("download_data")
+def download_data(api_key, channel_id, refresh=False):
+    try:
+        # Every session of a channel shares one loaded dataset, synced at most every few minutes
+        dataset = get_channel_dataset(api_key, channel_id, refresh=refresh)
+    except QuotaExceededError as error:
+        st.error(f"The YouTube API quota is used up, please try again later. ({error})")
+        st.stop()
+    except HttpError as error:
+        st.error(f"The YouTube API request failed with status {error.resp.status}. Please try again.")
+        st.stop()
 
     # check if bad channel id
-    if channel_details is None:
+    if dataset is None:
         return None, None, None, None
 
-    videos = getVideoList(api_key, channel_details["uploads"])
-    videos_df = pd.DataFrame(videos)
-    video_ids = [video['id'] for video in videos if video['id'] is not None]
-    all_video_data = buildVideoListDataframe(api_key, video_ids)
+    # Paging and the selected video only reset when the session moves to another channel or dataset version
+    if st.session_state.get('dataset') is not dataset:
+        st.session_state.browser_page = 1
+        st.session_state['video_id'] = None
+    st.session_state.dataset = dataset
 
-    st.session_state.start_index = 0
-    st.session_state.end_index = 10
-    st.session_state['video_id'] = None
-    st.session_state.all_video_df = all_video_data
+    # Session state only holds references to the shared, read-only frames and indexes
+    st.session_state.all_video_df = dataset.video_data
+    st.session_state.video_tags = dataset.video_tags
+    st.session_state.video_catalog = dataset.catalog
+    st.session_state.search_index = get_search_index(channel_id)
 
     st.session_state.api_key = st.session_state.API_KEY
 
-    return channel_details, videos, all_video_data, videos_df
+    return dataset.channel_details, dataset.videos, dataset.video_data, dataset.catalog
+
 
+def reset_browser_page():
+    st.session_state.browser_page = 1
 
-def display_video_list(video_data, start_index, end_index, search_query=None):
-    """Displays a list of videos in a tabular format with custom column order and buttons."""
 
-    # Input widget for searching videos by title
-    if search_query is None:
-        search_query = ""
-    new_search_query = st.text_input("Search Videos by Title", search_query)
+def display_video_browser(search_index, video_catalog):
+    """Lists the videos in a single dataframe widget, searched, sorted and paged on the server.
 
-    # Initialize start_index and end_index in session_state
-    if 'start_index' not in st.session_state:
-        st.session_state.start_index = start_index
-    if 'end_index' not in st.session_state:
-        st.session_state.end_index = end_index
+    Only the rows of the current page are sent to the browser, whatever the size of the channel. Selecting a row
+    opens the statistics of that video.
+    """
+    col1, col2, col3 = st.columns([3, 2, 1])
+    search_query = col1.text_input("Search Videos by Title", key="browser_query", on_change=reset_browser_page)
+    sort = col2.selectbox("Sort by", list(BROWSER_SORTS), key="browser_sort", on_change=reset_browser_page)
+    page_size = col3.selectbox("Videos per page", BROWSER_PAGE_SIZES, key="browser_page_size",
+                               on_change=reset_browser_page)
 
-    # If a new search query is entered, reset the start and end indices
-    if new_search_query != search_query:
-        st.session_state.start_index = start_index
-        st.session_state.end_index = end_index
+    if search_query.strip():
+        # Look the search query up in the title index, best matches first
+        positions = video_catalog.positions_of(video['id'] for video in search_index.search_titles(search_query))
+    else:
+        positions = None
 
-    # Filter videos based on the search query across the entire video_data list
-    filtered_videos = [video for video in video_data if new_search_query.lower() in video['title'].lower()]
+    sort_key, descending = BROWSER_SORTS[sort]
+    if sort_key is None and positions is not None:
+        ordered = positions
+    else:
+        # Best match without a search query lists the newest videos first
+        ordered = video_catalog.sorted_positions(sort_key or 'published_date', positions, descending)
 
-    # Paginate the filtered results
-    paginated_videos = filtered_videos[st.session_state.start_index:st.session_state.end_index]
+    page_count = max((len(ordered) + page_size - 1) // page_size, 1)
+    st.session_state.browser_page = min(st.session_state.get('browser_page', 1), page_count)
 
-    for video in paginated_videos:
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.image(video['thumbnail'])
-        with col2:
-            st.write(video['id'])
-        with col3:
-            st.write(video['title'])
-        with col4:
-            video_stats = st.button("Check Video Statistics", key=video['id'])
-            if video_stats:
-                st.session_state['video_id'] = video['id']
-                switch_page("video_data")
+    page = video_catalog.rows(ordered[(st.session_state.browser_page - 1) * page_size:
+                                      st.session_state.browser_page * page_size])
 
-    # Display a button to load the next 10 search results
-    if st.session_state.end_index < len(filtered_videos):
-        if st.button('Load next 10 videos', key='load_next'):
-            st.session_state.start_index = st.session_state.end_index
-            st.session_state.end_index += 10
+    # A new widget key after every navigation, so the selection is gone when the user comes back
+    event = st.dataframe(page[BROWSER_COLUMNS],
+                         hide_index=True,
+                         row_height=70,
+                         column_config=BROWSER_COLUMN_CONFIG,
+                         key=f"video_browser_{st.session_state.get('browser_generation', 0)}",
+                         on_select="rerun",
+                         selection_mode="single-row")
+
+    col1, col2 = st.columns([1, 3])
+    col1.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key="browser_page")
+    col2.caption(f"{len(ordered):,} videos")
+
+    if event.selection.rows:
+        st.session_state['video_id'] = page['id'].iloc[event.selection.rows[0]]
+        st.session_state.browser_generation = st.session_state.get('browser_generation', 0) + 1
+        switch_page("video_data")
 
 
 ########################################################################################################################
@@ -125,14 +177,24 @@ if 'CHANNEL_NAME' not in st.session_state:
     st.session_state.CHANNEL_NAME = ""
 #st.session_state.API_KEY = st.sidebar.text_input("Enter your YouTube API Key", st.session_state.API_KEY,
                                              #    type="password")
-st.session_state.CHANNEL_NAME = st.sidebar.text_input("Enter YouTube Channel Name", st.session_state.CHANNEL_NAME)
+st.session_state.CHANNEL_NAME = st.sidebar.text_input("Enter YouTube Channel Name, @handle or URL",
+                                                      st.session_state.CHANNEL_NAME)
 if st.session_state.CHANNEL_NAME:
     with st.spinner("Searching for channel..."):
-        channel_id = get_channel_id(st.session_state.API_KEY, st.session_state.CHANNEL_NAME)
+        # Names resolved before cost nothing, new ones are tried as a handle before falling back to search
+        channel_resolver = get_channel_resolver()
+        try:
+            channel_id = channel_resolver.resolve(st.session_state.API_KEY, st.session_state.CHANNEL_NAME)
+        except QuotaExceededError as error:
+            st.error(f"The YouTube API quota is used up, please try again later. ({error})")
+            st.stop()
         if channel_id:
             st.session_state.CHANNEL_ID = channel_id
         else:
             st.error("❌ Channel not found. Please check the name and try again.")
+            suggestions = channel_resolver.suggest(st.session_state.CHANNEL_NAME)
+            if suggestions:
+                st.info("Did you mean: " + ", ".join(title for title, _ in suggestions) + "?")
             st.stop()
 if not st.session_state.API_KEY or not hasattr(st.session_state, 'CHANNEL_ID'):
     st.warning("Please enter a valid YouTube Channel Name.")
@@ -143,28 +205,23 @@ if not st.session_state.API_KEY or not hasattr(st.session_state, 'CHANNEL_ID'):
 # Data Refresh Button
 refresh_button = st.sidebar.button("Refresh Data")
 
-# First Data Load
-channel_details, videos, all_video_data, videos_df = download_data(st.session_state.API_KEY, st.session_state.CHANNEL_ID)
+# Data Load, shared with every other session on this channel unless a refresh is asked for
+with st.spinner("Refreshing data..." if refresh_button else "Loading data..."):
+    channel_details, videos, all_video_data, video_catalog = download_data(st.session_state.API_KEY,
+                                                                           st.session_state.CHANNEL_ID,
+                                                                           refresh=refresh_button)
 
 if channel_details is None:
     st.warning("Invalid YouTube Channel ID. Please check and enter a valid Channel ID.")
     st.stop()
 
-if refresh_button:
-    with st.spinner("Refreshing data..."):
-        channel_details, videos, all_video_data, videos_df = download_data(st.session_state.API_KEY, st.session_state.CHANNEL_ID)
-
-        if channel_details is None:
-            st.warning("Invalid YouTube Channel ID. Please check and enter a valid Channel ID.")
-            st.stop()
-
 # Data Filters for fine-tuned data selection
 st.sidebar.title("Data Filters")
 
 num_videos = st.sidebar.slider("Select Number of Top Videos to Display:", 1, 50, 10)
 
-# Convert the 'published_date' column to datetime format
-all_video_data['published_date'] = pd.to_datetime(all_video_data['published_date'])
+forecast_modes = {"Automatic": "auto", "Prophet": "prophet", "Fast (Exponential Smoothing)": "fast"}
+forecast_mode = forecast_modes[st.sidebar.selectbox("Forecast Model", list(forecast_modes))]
 
 # Extract min and max publish dates
 min_date = all_video_data['published_date'].min().date()  # Ensure it's a date object
@@ -180,14 +237,19 @@ if start_date > end_date:
 
 tag_search = st.sidebar.text_input("Search Videos by Tag")
 
-date_range_start = pd.Timestamp(start_date)
-date_range_end = pd.Timestamp(end_date)
+# Publish dates are UTC, include the whole end date
+date_range_start = pd.Timestamp(start_date, tz="UTC")
+date_range_end = pd.Timestamp(end_date, tz="UTC") + pd.Timedelta(days=1)
 
-filtered_data = all_video_data[(all_video_data['published_date'] >= date_range_start) &
-                               (all_video_data['published_date'] <= date_range_end)]
+# Row positions of the videos in the date range, resolved on the catalog's date index
+filtered_positions = video_catalog.date_range_positions(date_range_start, date_range_end)
 
 if tag_search:
-    filtered_data = filtered_data[filtered_data['tags'].apply(lambda x: tag_search in x)]
+    # Case-insensitive exact or prefix tag match from the inverted tag index
+    tag_positions = video_catalog.positions_of(st.session_state.search_index.search_tags(tag_search))
+    filtered_positions = filtered_positions[numpy.isin(filtered_positions, tag_positions)]
+
+filtered_data = video_catalog.rows(filtered_positions)
 
 ########################################################################################################################
 #                                       CHANNEL DETAILS AREA CONFIGURATION
@@ -234,9 +296,8 @@ col1, col2, col3 = st.columns(3)
 # Display statistical graphs for the top videos based on views
 with col1:
     st.subheader(f"Top {num_videos} Videos Based on Views")
-    sorted_video_data = filtered_data.sort_values(by='view_count', ascending=False)
-    # Get the top videos from the sorted DataFrame
-    top_views_df = sorted_video_data.head(num_videos)
+    # Get the top videos from the catalog's view ranking
+    top_views_df = video_catalog.top_n('view_count', num_videos, filtered_positions)
     with chart_container(top_views_df):
         # Display statistical graphs for the top videos based on views
         # Create a bar chart using Plotly
@@ -250,9 +311,8 @@ with col1:
 
 with col2:
     st.subheader(f"Top {num_videos} Videos Based on Likes")
-    sorted_video_data = filtered_data.sort_values(by='like_count', ascending=False)
-    # Get the top 10 liked videos from the sorted DataFrame
-    top_likes_df = sorted_video_data.head(num_videos)
+    # Get the top liked videos from the catalog's like ranking
+    top_likes_df = video_catalog.top_n('like_count', num_videos, filtered_positions)
 
     with chart_container(top_likes_df):
         # Display statistical graphs for the top 10 videos based on views
@@ -267,9 +327,8 @@ with col2:
 
 with col3:
     st.subheader(f"Top {num_videos} Based on Comments")
-    sorted_video_data = filtered_data.sort_values(by='comment_count', ascending=False)
-    # Get the top 10 liked videos from the sorted DataFrame
-    top_comments_df = sorted_video_data.head(num_videos)
+    # Get the top commented videos from the catalog's comment ranking
+    top_comments_df = video_catalog.top_n('comment_count', num_videos, filtered_positions)
     with chart_container(top_comments_df):
         # Display statistical graphs for the top 10 videos based on views
         # Create a bar chart using Plotly
@@ -309,27 +368,21 @@ with st.spinner("Predicting Views for the next Week"):
     # Prepare dataframe for Prophet
     forecast_df = all_video_data[['published_date', 'view_count']]
     forecast_df.columns = ['ds', 'y']
-
-    # Initialize the Prophet model
-    model = Prophet(
-        yearly_seasonality=False,
-        weekly_seasonality=True,
-        daily_seasonality=True,
-        seasonality_mode='additive')
-
-    # Fit the model with the data
-    model.fit(forecast_df)
-
-    # Dataframe for future dates
-    future_dates = model.make_future_dataframe(periods=30)
-
-    # Predict views for the future dates
-    forecast = model.predict(future_dates)
-    # Plot the original data and the forecast
-
-    # Plotting using Plotly
-    # Filter the forecast dataframe to include only the forecasted period
-    forecasted_period = forecast[forecast['ds'] > forecast_df['ds'].max()]
+    # Prophet does not accept timezone aware dates
+    forecast_df['ds'] = forecast_df['ds'].dt.tz_localize(None)
+    forecast_df['y'] = forecast_df['y'].astype('float64')
+
+    # Fitted forecasts are cached per series, a changed series is fitted in the background
+    forecast, forecast_is_current = get_forecast(forecast_df, key=st.session_state.CHANNEL_ID,
+                                                 periods=30, mode=forecast_mode)
+    if not forecast_is_current:
+        fit_error = forecast_error(forecast_df, periods=30)
+        if fit_error is not None:
+            st.caption(f"The Prophet forecast could not be computed ({fit_error}), "
+                       "showing the fallback forecast instead.")
+        else:
+            st.caption("Showing the last available forecast while an updated Prophet forecast is computed. "
+                       "Refresh the page to see it once it is ready.")
 
     # Plotting using Plotly
     # Filter the forecast dataframe to include only the forecasted period
@@ -360,24 +413,14 @@ with col1:
     st.divider()
     with st.spinner("Generating Word Cloud..."):
         st.subheader("Most Common Tags")
-        # Extracting tags from DataFrame and creating a single string
-        all_tags = " ".join(" ".join(tags) for tags in filtered_data['tags'])
+        # Summing the precomputed per-video tag counters of the filtered videos
+        tag_frequencies = video_catalog.tag_frequencies(filtered_positions)
 
-        # Generating the word cloud
-        wordcloud = WordCloud(width=800, height=400, background_color='black').generate(all_tags)
-
-        # Plotting the word cloud using matplotlib
-        plt.figure(figsize=(10, 5))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        plt.tight_layout(pad=0)
-
-        # Saving the figure to a bytes buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png", bbox_inches='tight', pad_inches=0)
-        buf.seek(0)
-
-        st.image(buf, use_column_width=True)
+        if tag_frequencies:
+            st.image(render_word_cloud(frequency_digest(tag_frequencies), tag_frequencies, 800, 400),
+                     use_column_width=True)
+        else:
+            st.info("No tags found for the selected videos.")
 
 with col2:
     # Calculating the Like-to-View Ratio
@@ -408,6 +451,8 @@ with col2:
 
 st.divider()
 st.subheader("Detailed Video Statistics Video Selection")
-st.write("Click on view statistics to get detailed information related to the selected video")
-# latest 10 videos
-display_video_list(videos, 0, 10)
+st.write("Select a video to get detailed information related to it")
+display_video_browser(st.session_state.search_index, video_catalog)
+
+render_performance_panel({"all_video_df": st.session_state.all_video_df,
+                          "video_tags": st.session_state.video_tags})
@@ -1,54 +1,124 @@
-import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
-import numpy as np
-import igraph as ig
-import plotly.subplots as sp
+import random
 
-data = pd.read_excel("all_comments.xlsx")
+import numpy as np
+import pandas as pd
 
+from instrumentation import timed
+
+# networkx, igraph and matplotlib take about a second to import together, so they load on the first analysis
+# instead of with the Video Data page
+
+# Number of source authors sampled for approximate betweenness, None computes it exactly.
+# Error shrinks with roughly 1/sqrt(samples) while the cost grows linearly with it.
+BETWEENNESS_SAMPLES = 500
+
+# Number of authors drawn in the community visualization
+SAMPLE_SIZE = 500
+
+
+def _networkx_centrality(G, betweenness_samples, seed):
+    import networkx as nx
+
+    k = betweenness_samples if betweenness_samples and betweenness_samples < len(G) else None
+    return {
+        'Degree Centrality': nx.degree_centrality(G),
+        'In-Degree Centrality': nx.in_degree_centrality(G),
+        'Out-Degree Centrality': nx.out_degree_centrality(G),
+        'Betweenness Centrality': nx.betweenness_centrality(G, k=k, seed=seed),
+        'Closeness Centrality': nx.closeness_centrality(G),
+    }
+
+
+def _igraph_centrality(g, authors, betweenness_samples, seed):
+    # Same definitions and normalizations as the networkx functions, computed in C
+    n = len(authors)
+    scale = 1.0 / (n - 1) if n > 1 else 1.0
+
+    if betweenness_samples and betweenness_samples < n:
+        # Brandes with sampled sources, extrapolated to all sources like networkx does with k
+        sources = random.Random(seed).sample(range(n), betweenness_samples)
+        betweenness = np.array(g.betweenness(directed=True, sources=sources)) * n / betweenness_samples
+    else:
+        betweenness = np.array(g.betweenness(directed=True))
+    betweenness = betweenness / ((n - 1) * (n - 2)) if n > 2 else betweenness
+
+    # networkx uses incoming distances scaled by the share of authors that can reach each author
+    closeness = np.nan_to_num(np.array(g.closeness(mode='in', normalized=True), dtype=float))
+    closeness_raw = np.nan_to_num(np.array(g.closeness(mode='in', normalized=False), dtype=float))
+    reachable = np.divide(closeness, closeness_raw, out=np.zeros(n), where=closeness_raw > 0)
+    closeness = closeness * reachable * scale
+
+    return {
+        'Degree Centrality': dict(zip(authors, np.array(g.degree(mode='all')) * scale)),
+        'In-Degree Centrality': dict(zip(authors, np.array(g.degree(mode='in')) * scale)),
+        'Out-Degree Centrality': dict(zip(authors, np.array(g.degree(mode='out')) * scale)),
+        'Betweenness Centrality': dict(zip(authors, betweenness)),
+        'Closeness Centrality': dict(zip(authors, closeness)),
+    }
+
+
+def _igraph_communities(g, authors, community_method, seed):
+    # Modularity based communities of the whole reply graph, reply direction does not matter here
+    random.seed(seed)
+    undirected = g.as_undirected(mode='collapse', combine_edges='sum')
+    if community_method == 'louvain':
+        clustering = undirected.community_multilevel(weights='weight')
+    else:
+        clustering = undirected.community_leiden(objective_function='modularity', weights='weight')
+    return [[authors[index] for index in community] for community in clustering]
+
+
+@timed("analyze_comments")
+def analyze_comments(data, engine="igraph", betweenness_samples=BETWEENNESS_SAMPLES, community_method="leiden",
+                     seed=42):
+    import matplotlib.pyplot as plt
+    import networkx as nx
 
-def analyze_comments(data):
     # Reset the graph
     G = nx.DiGraph()
 
     # Add nodes to the graph representing authors
-    for author in data['author'].unique():
-        G.add_node(author)
+    G.add_nodes_from(data['author'].unique())
 
-    # Add edges to the graph representing replies
-    for _, row in data.dropna(subset=['linkage']).iterrows():
-        # Find the author of the main comment (the comment being replied to)
-        main_comment_authors = data[data['comment_id'] == row['linkage']]['author'].values
-        if main_comment_authors:
-            main_comment_author = main_comment_authors[0]
-            G.add_edge(row['author'], main_comment_author)
+    # Find the author of every main comment (the comment being replied to) with one hash join
+    comment_authors = data.drop_duplicates(subset='comment_id').set_index('comment_id')['author']
+    replies = data.dropna(subset=['linkage'])
+    replies = replies[replies['linkage'].isin(comment_authors.index)]
+    edges = pd.DataFrame({'source': replies['author'].values,
+                          'target': replies['linkage'].map(comment_authors).values})
 
-    # Calculate centrality measures again
-    degree_centrality = nx.degree_centrality(G)
-    in_degree_centrality = nx.in_degree_centrality(G)
-    out_degree_centrality = nx.out_degree_centrality(G)
-    betweenness_centrality = nx.betweenness_centrality(G)
-    closeness_centrality = nx.closeness_centrality(G)
+    # Add edges to the graph representing replies, weighted by the number of replies
+    edge_weights = edges.groupby(['source', 'target'], dropna=False, sort=False, observed=True).size()
+    G.add_weighted_edges_from((source, target, weight) for (source, target), weight in edge_weights.items())
 
-    # Create a DataFrame to display the results
-    centrality_df = pd.DataFrame({
-        'Author': list(degree_centrality.keys()),
-        'Degree Centrality': list(degree_centrality.values()),
-        'In-Degree Centrality': list(in_degree_centrality.values()),
-        'Out-Degree Centrality': list(out_degree_centrality.values()),
-        'Betweenness Centrality': list(betweenness_centrality.values()),
-        'Closeness Centrality': list(closeness_centrality.values())
-    }).sort_values(by='Degree Centrality', ascending=False)
+    authors = list(G.nodes())
 
-    print(centrality_df.head(10))
+    # Calculate centrality measures again
+    if engine == "igraph":
+        import igraph as ig
+
+        author_index = pd.Index(authors)
+        g = ig.Graph(n=len(authors),
+                     edges=list(zip(author_index.get_indexer(edge_weights.index.get_level_values(0)),
+                                    author_index.get_indexer(edge_weights.index.get_level_values(1)))),
+                     directed=True,
+                     edge_attrs={'weight': edge_weights.values.tolist()})
+        centrality = _igraph_centrality(g, authors, betweenness_samples, seed)
+    elif engine == "networkx":
+        centrality = _networkx_centrality(G, betweenness_samples, seed)
+    else:
+        raise ValueError(f"Unknown graph engine: {engine}")
+
+    degree_centrality = centrality['Degree Centrality']
 
-    centrality_df.head(10).to_excel("centrality.xlsx", index=False)
+    # Create a DataFrame to display the results
+    centrality_df = pd.DataFrame({'Author': authors, **{measure: [values[author] for author in authors]
+                                                        for measure, values in centrality.items()}})\
+        .sort_values(by='Degree Centrality', ascending=False)
 
     # Select the top N authors based on degree centrality for the subgraph
     N = 50
-    top_authors = [author for author, _ in
-                   sorted(degree_centrality.items(), key=lambda item: item[1], reverse=True)[:N]]
+    top_authors = centrality_df['Author'].head(N).tolist()
 
     # Extract the subgraph
     subgraph = G.subgraph(top_authors)
@@ -62,42 +132,43 @@ def analyze_comments(data):
     plt.title("Subgraph of Top 50 Authors based on Degree Centrality")
     plt.close(fig_subgraph)
 
-    # Sample a subset of nodes for the subgraph
-    sample_size = 500
-    sampled_nodes = list(G.nodes())[:sample_size]
+    # Sample the most connected authors for the visualization
+    sampled_nodes = centrality_df['Author'].head(SAMPLE_SIZE).tolist()
 
     # Extract the subgraph for the sampled nodes
     sampled_subgraph = G.subgraph(sampled_nodes)
 
-    # Use the Girvan-Newman algorithm on the sampled subgraph
-    sampled_communities_gn = nx.community.girvan_newman(sampled_subgraph)
-
-    # Get the first partitioning of communities for the sampled subgraph
-    sampled_first_partition = next(sampled_communities_gn)
-
-    # Convert the first_partition into a more readable format
-    sampled_community_list_gn = [list(community) for community in sampled_first_partition]
-
-    # Display the number of detected communities and the size of each community for the sampled subgraph
-    sampled_community_sizes_gn = {f"Sampled Community GN {i + 1}": len(community) for i, community in
-                                  enumerate(sampled_community_list_gn)}
-    no_of_communities = len(sampled_community_sizes_gn)
+    if engine == "igraph":
+        # Detect communities on the whole graph, authors without reply relations count as communities of one
+        # like they do in the Girvan-Newman partitioning
+        community_list = _igraph_communities(g, authors, community_method, seed)
+        no_of_communities = len(community_list)
+
+        sampled = set(sampled_nodes)
+        sampled_community_list = [[author for author in community if author in sampled]
+                                  for community in community_list]
+        sampled_community_list = [community for community in sampled_community_list if community]
+    else:
+        # Use the Girvan-Newman algorithm on the sampled subgraph and keep its first partitioning
+        sampled_first_partition = next(nx.community.girvan_newman(sampled_subgraph))
+        sampled_community_list = [list(community) for community in sampled_first_partition]
+        no_of_communities = len(sampled_community_list)
 
     # Generate a new position layout for the nodes in the sampled subgraph
     sampled_pos = nx.spring_layout(sampled_subgraph)
 
     # Helper function to get edges for a community
     def get_edges(G, community):
-        return [(u, v) for u, v in G.edges() if u in community and v in community]
+        return [(u, v) for u, v in G.subgraph(community).edges()]
 
     # Visualize the communities in the sampled subgraph
     fig_communities = plt.figure(figsize=(15, 15))
 
     # Get unique colors for each community
-    colors = plt.cm.rainbow(np.linspace(0, 1, len(sampled_community_list_gn)))
+    colors = plt.cm.rainbow(np.linspace(0, 1, len(sampled_community_list)))
 
     # Draw nodes and edges with community colors
-    for community, color in zip(sampled_community_list_gn, colors):
+    for community, color in zip(sampled_community_list, colors):
         nx.draw_networkx_nodes(sampled_subgraph, sampled_pos, nodelist=community, node_color=[color] * len(community),
                                node_size=500)
         nx.draw_networkx_edges(sampled_subgraph, sampled_pos, edgelist=get_edges(sampled_subgraph, community),
@@ -0,0 +1,63 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+########################################################################################################################
+#                                       BACKGROUND JOBS
+########################################################################################################################
+
+
+class BackgroundJobs:
+    """At most one running job per key on a small thread pool, with the errors of failed jobs kept per key.
+
+    A key whose last job failed is only started again after retry_delay seconds, never when retry_delay is None,
+    so page reruns report the error instead of repeating a failing job.
+    """
+
+    def __init__(self, max_workers=1, retry_delay=None):
+        self.retry_delay = retry_delay
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Reentrant, a job that is already done runs its done callback right away on the submitting thread
+        self._lock = threading.RLock()
+        self._running = {}
+        self._failed = {}
+
+    def submit(self, key, function, *args, **kwargs):
+        """Starts function(*args, **kwargs) for key unless a job of key is running, returns the job's future.
+
+        Returns None while the key is backing off after a failed job.
+        """
+        with self._lock:
+            future = self._running.get(key)
+            if future is not None:
+                return future
+
+            failure = self._failed.get(key)
+            if failure is not None and (self.retry_delay is None or time.time() - failure[0] < self.retry_delay):
+                return None
+
+            future = self._executor.submit(function, *args, **kwargs)
+            self._running[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+            return future
+
+    def _finished(self, key, future):
+        error = None if future.cancelled() else future.exception()
+        with self._lock:
+            if error is not None:
+                self._failed[key] = time.time(), f"{type(error).__name__}: {error}"
+            else:
+                self._failed.pop(key, None)
+            self._running.pop(key, None)
+
+    def running(self, key):
+        """Returns whether a job of key is running."""
+        with self._lock:
+            return key in self._running
+
+    def error(self, key):
+        """Returns the error of the last job of key if it failed, or None."""
+        with self._lock:
+            failure = self._failed.get(key)
+        return failure[1] if failure is not None else None
@@ -0,0 +1,177 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+########################################################################################################################
+#                                       OFFLINE BENCHMARK SUITE
+########################################################################################################################
+# Usage: python benchmark.py [--scales small,medium] [--output benchmark_results.json] [--baseline old.json]
+#
+# Every scale runs against a synthetic channel served by fake_youtube, in a fresh temporary working directory so
+# the response cache, dataset store and sentiment cache start cold. No network and no API key are needed.
+SCALES = {
+    "small": {"videos": 200, "comments": 5000},
+    "medium": {"videos": 2000, "comments": 50000},
+    "large": {"videos": 10000, "comments": 500000},
+}
+
+# A benchmark this much slower than the baseline counts as a regression
+DEFAULT_TOLERANCE = 1.25
+
+# Synthetic runs spend far more than a real day of quota
+os.environ.setdefault("YOUTUBE_DAILY_QUOTA", str(10 ** 9))
+
+API_KEY = "offline-benchmark"
+
+
+def _timed(results, scale, name, function, items=None, **extra):
+    start = time.perf_counter()
+    value = function()
+    seconds = time.perf_counter() - start
+
+    count = items(value) if callable(items) else items
+    result = {"scale": scale, "benchmark": name, "seconds": round(seconds, 4)}
+    if count is not None:
+        result["items"] = count
+        result["items_per_second"] = round(count / seconds, 1) if seconds else None
+    result.update(extra)
+    results.append(result)
+    print(f"{scale:>8} {name:<28} {seconds:9.3f}s" + (f"  {count} items" if count is not None else ""))
+    return value
+
+
+def run_scale(scale, videos, comments, latency=0.0):
+    """Runs every benchmark against one synthetic channel and returns the results."""
+    from analyze_comments import analyze_comments
+    from channelVideoDataExtraction import buildVideoListDataframe, cleanCommentData, getVideoComments, \
+        parseCommentThread
+    from comment_sentiment import add_sentiment
+    from fake_youtube import FakeYouTube, SyntheticChannel
+    from response_cache import get_response_cache
+    from shared_datasets import get_channel_dataset
+
+    results = []
+    channel = _timed(results, scale, "generate_channel",
+                     lambda: SyntheticChannel(title=f"Benchmark {scale}", videos=videos, comments=comments),
+                     items=videos)
+
+    with FakeYouTube([channel], latency=latency) as fake:
+        # The path Home.download_data takes: sync, compact frames, VideoCatalog and search index. The first call
+        # syncs from scratch, the refresh only fetches what changed and the last one is another session's hit.
+        _timed(results, scale, "download_data", lambda: get_channel_dataset(API_KEY, channel.id, refresh=True),
+               items=lambda dataset: len(dataset.video_data))
+        _timed(results, scale, "download_data_refresh",
+               lambda: get_channel_dataset(API_KEY, channel.id, refresh=True),
+               items=lambda dataset: len(dataset.video_data))
+        _timed(results, scale, "download_data_shared", lambda: get_channel_dataset(API_KEY, channel.id),
+               items=lambda dataset: len(dataset.video_data))
+
+        get_response_cache().clear()
+        _timed(results, scale, "buildVideoListDataframe",
+               lambda: buildVideoListDataframe(API_KEY, channel.video_ids), items=len)
+
+        get_response_cache().clear()
+        busiest = channel.video_ids[int(channel.comment_counts.argmax())]
+        _timed(results, scale, "getVideoComments",
+               lambda: getVideoComments(API_KEY, busiest, max_comments=None), items=len)
+        results[-1]["requests"] = dict(fake.requests)
+
+    comment_data = _timed(results, scale, "build_comment_frame",
+                          lambda: cleanCommentData([comment for thread in channel.iter_comment_threads()
+                                                    for comment in parseCommentThread(thread)]),
+                          items=len)
+
+    _timed(results, scale, "analyze_comments", lambda: analyze_comments(comment_data), items=len(comment_data))
+    _timed(results, scale, "sentiment", lambda: add_sentiment(comment_data.copy()), items=len(comment_data))
+    _timed(results, scale, "sentiment_cached", lambda: add_sentiment(comment_data.copy()), items=len(comment_data))
+
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Prints the ratio to a baseline run for every benchmark and returns the regressions."""
+    previous = {(result["scale"], result["benchmark"]): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        key = (result["scale"], result["benchmark"])
+        if not previous.get(key):
+            continue
+        ratio = result["seconds"] / previous[key]
+        flag = "REGRESSION" if ratio > tolerance else ""
+        print(f"{key[0]:>8} {key[1]:<28} {previous[key]:9.3f}s -> {result['seconds']:9.3f}s  x{ratio:5.2f} {flag}")
+        if ratio > tolerance:
+            regressions.append(dict(result, baseline_seconds=previous[key], ratio=round(ratio, 3)))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the data pipeline against an offline YouTube API stand-in.")
+    parser.add_argument("--scales", default="small,medium",
+                        help=f"comma separated scales out of {', '.join(SCALES)}")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds of latency per API request")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    scales = [scale.strip() for scale in args.scales.split(",") if scale.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f"unknown scales: {', '.join(unknown)}")
+
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Caches and the dataset store use relative paths, so a temporary working directory keeps runs isolated
+    original_directory = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="yt-benchmark-") as directory:
+        os.chdir(directory)
+        try:
+            results = []
+            for scale in scales:
+                results.extend(run_scale(scale, latency=args.latency, **SCALES[scale]))
+        finally:
+            os.chdir(original_directory)
+
+    report = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "latency": args.latency,
+        "results": results,
+    }
+
+    exit_code = 0
+    if baseline is not None:
+        report["regressions"] = compare(results, baseline, args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,17 @@
-import googleapiclient.discovery
+from youtube_client import get_youtube_client
+from response_cache import cached_execute
+from instrumentation import timed
 
 
+@timed("get_channel_data")
 def getChannelData(api_key, channel_id):
     try:
-        # Create a YouTube API object
-        youtube = googleapiclient.discovery.build("youtube",
-                                                  "v3",
-                                                  developerKey=api_key)
+        # Get the shared YouTube API object
+        youtube = get_youtube_client(api_key)
         # request channel details
         request = youtube.channels().list(part="snippet,contentDetails,statistics",
                                           id=channel_id)
-        response = request.execute()
+        response = cached_execute(request)
 
         # Get the channel details from the response
         channel = response["items"][0]
@@ -25,11 +26,10 @@ def getChannelData(api_key, channel_id):
             "thumbnail": channel['snippet']['thumbnails']['medium']['url']
         }
 
-        print(channel_details)
-
         return channel_details
 
-    except Exception as error:
+    # Unknown channel IDs return no items, API errors are left to the caller
+    except (IndexError, KeyError):
         return None
 
 
@@ -1,106 +1,90 @@
-import re
+import contextvars
+import datetime
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-import googleapiclient.discovery
-
-
-def getVideoComments(api_key, video_id):
-    # Create a YouTube Data API object
-    youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
-
-    # Make an API request to get all the comments for the video
-    request = youtube.commentThreads().list(part="snippet,replies",
-                                            videoId=video_id,
-                                            maxResults=100,
-                                            textFormat='plainText')
-    response = request.execute()
-
-    all_comments = []
-
-    for comment in response['items']:
-        comment_data = {
-            'comment_id': comment['id'],
-            'author': comment["snippet"]["topLevelComment"]['snippet']
-            .get('authorDisplayName', None),
-            'like_count': comment["snippet"]["topLevelComment"]['snippet']
-            .get('likeCount', None),
-            'comment_text': comment["snippet"]["topLevelComment"]['snippet']
-            .get('textOriginal', None),
-            'comment_date': comment["snippet"]["topLevelComment"]['snippet']
-            .get('publishedAt', None),
-        }
-
-        all_comments.append(comment_data)
-
-        # Check if there are replies
-        if 'replies' in comment:
-            for reply in comment['replies']['comments']:
-                reply_data = {
-                    'comment_id': reply['id'],
-                    'author': reply['snippet']
-                    .get('authorDisplayName', None),
-                    'comment_text': reply['snippet']
-                    .get('textOriginal', None),
-                    'comment_date': reply['snippet']
-                    .get('publishedAt', None),
-                    'like_count': reply['snippet']
-                    .get('likeCount', None),
-                    'linkage': comment_data['comment_id'],  # Link reply to the main comment
-                }
-                all_comments.append(reply_data)
-
-    next_page_available = response.get('nextPageToken')
-    is_other_pages = True
-
-    while is_other_pages:
-        if len(all_comments) == 1000:
-            break
-        if next_page_available is None:
-            is_other_pages = False
-        else:
-            request = youtube.commentThreads() \
-                .list(part="snippet,replies",
-                      videoId=video_id,
-                      maxResults=100,
-                      textFormat='plainText',
-                      pageToken=next_page_available)
-            response = request.execute()
 
-            for comment in response['items']:
-                comment_data = {
-                    'comment_id': comment['id'],
-                    'author': comment["snippet"]["topLevelComment"]['snippet']
-                    .get('authorDisplayName', None),
-                    'like_count': comment["snippet"]["topLevelComment"]['snippet']
-                    .get('likeCount', None),
-                    'comment_text': comment["snippet"]["topLevelComment"]['snippet']
-                    .get('textOriginal', None),
-                    'comment_date': comment["snippet"]["topLevelComment"]['snippet']
-                    .get('publishedAt', None),
-                }
-
-                all_comments.append(comment_data)
-
-                # Check if there are replies
-                if 'replies' in comment:
-                    for reply in comment['replies']['comments']:
-                        reply_data = {
-                            'comment_id': reply['id'],
-                            'author': reply['snippet']
-                            .get('authorDisplayName', None),
-                            'comment_text': reply['snippet']
-                            .get('textOriginal', None),
-                            'comment_date': reply['snippet']
-                            .get('publishedAt', None),
-                            'like_count': reply['snippet']
-                            .get('likeCount', None),
-                            'linkage': comment_data['comment_id'],
-                        }
-                        all_comments.append(reply_data)
+from dataset_store import delete_parts, write_dataset
+from youtube_client import get_youtube_client
+from response_cache import cached_execute
+from instrumentation import timed
+from compact_frames import compact_comment_data
 
-            next_page_available = response.get('nextPageToken')
 
+COMMENT_COLUMNS = ['comment_id', 'author', 'like_count', 'comment_text', 'comment_date', 'linkage']
+
+
+def parseReply(reply, parent_id):
+    return {
+        'comment_id': reply['id'],
+        'author': reply['snippet']
+        .get('authorDisplayName', None),
+        'comment_text': reply['snippet']
+        .get('textOriginal', None),
+        'comment_date': reply['snippet']
+        .get('publishedAt', None),
+        'like_count': reply['snippet']
+        .get('likeCount', None),
+        'linkage': parent_id,  # Link reply to the main comment
+    }
+
+
+def parseCommentThread(comment):
+    # Flatten a commentThread resource into the top level comment followed by its replies
+    top_level = comment["snippet"]["topLevelComment"]['snippet']
+    comment_data = {
+        'comment_id': comment['id'],
+        'author': top_level.get('authorDisplayName', None),
+        'like_count': top_level.get('likeCount', None),
+        'comment_text': top_level.get('textOriginal', None),
+        'comment_date': top_level.get('publishedAt', None),
+    }
+
+    thread_comments = [comment_data]
+
+    # Check if there are replies
+    if 'replies' in comment:
+        for reply in comment['replies']['comments']:
+            thread_comments.append(parseReply(reply, comment_data['comment_id']))
+
+    return thread_comments
+
+
+def hasTruncatedReplies(comment):
+    # commentThreads only embeds the first few replies of a thread
+    inline_replies = len(comment.get('replies', {}).get('comments', []))
+    return comment['snippet'].get('totalReplyCount', 0) > inline_replies
+
+
+@timed("get_thread_replies")
+def getThreadReplies(api_key, parent_id):
+    # Page through every reply of a comment thread
+    youtube = get_youtube_client(api_key)
+
+    replies = []
+    next_page_available = None
+
+    while True:
+        request = youtube.comments().list(part="snippet",
+                                          parentId=parent_id,
+                                          maxResults=100,
+                                          textFormat='plainText',
+                                          pageToken=next_page_available)
+        response = cached_execute(request)
+
+        replies.extend(parseReply(reply, parent_id) for reply in response['items'])
+
+        next_page_available = response.get('nextPageToken')
+        if next_page_available is None:
+            return replies
+
+
+def cleanCommentData(all_comments):
     # create the dataframe
-    comment_data = pd.DataFrame(all_comments)
+    comment_data = pd.DataFrame(all_comments).reindex(columns=COMMENT_COLUMNS)
+    comment_data['linkage'] = comment_data['linkage'].astype('string')
 
     # Define the regex pattern for illegal characters
     # For this example, I'll remove non-printable ASCII characters and the character '𝙄'
@@ -128,61 +112,196 @@ def getVideoComments(api_key, video_id):
     # Reset the index
     comment_data.reset_index(drop=True, inplace=True)
 
-    comment_data.to_excel("all_comments.xlsx", index=False)
+    return comment_data
 
-    print(comment_data.head(5))
 
-    return comment_data
+def iterVideoComments(api_key, video_id, max_comments=None, order='relevance', since=None, expand_replies=True,
+                      reply_workers=8, known_ids=None):
+    # Yield comment records of a video page by page, so callers never need to hold the whole corpus in memory.
+    # order is 'relevance' or 'time'; since skips comments published before it, and in time order stops paging
+    # once a whole page of threads is older than it. With expand_replies, threads whose replies were truncated
+    # are completed through comments.list on reply_workers threads while the next thread pages are fetched.
+    # known_ids are thread IDs the caller already has: their comments are only yielded again while they are
+    # newer than since, and in time order paging stops at the first known thread older than since (or at the
+    # first known thread at all without since), so a refresh reads little more than the new comments.
+    youtube = get_youtube_client(api_key)
+
+    if since is not None:
+        since = pd.Timestamp(since)
+        since = since.tz_localize('UTC') if since.tzinfo is None else since
+
+    known_ids = set(known_ids) if known_ids is not None else None
+
+    executor = ThreadPoolExecutor(max_workers=reply_workers) if expand_replies else None
+    pending_replies = []
+
+    def expanded_replies(wait):
+        # Remaining replies of the truncated threads that finished expanding
+        for future, inline_ids in list(pending_replies):
+            if not wait and not future.done():
+                continue
+            pending_replies.remove((future, inline_ids))
+            for reply_data in future.result():
+                if reply_data['comment_id'] not in inline_ids:
+                    yield reply_data
+
+    def recent(comment_data):
+        return since is not None and pd.Timestamp(comment_data['comment_date']) >= since
+
+    def wanted(comment_data):
+        if known_ids is None:
+            return since is None or recent(comment_data)
+        # Replies are linked to their thread, top level comments carry the thread ID themselves
+        return comment_data.get('linkage', comment_data['comment_id']) not in known_ids or recent(comment_data)
+
+    yielded = 0
+    next_page_available = None
+
+    try:
+        while True:
+            # Make an API request to get the next page of comment threads for the video
+            request = youtube.commentThreads().list(part="snippet,replies",
+                                                    videoId=video_id,
+                                                    maxResults=100,
+                                                    order=order,
+                                                    textFormat='plainText',
+                                                    pageToken=next_page_available)
+            response = cached_execute(request)
+
+            page_has_new_threads = False
+            page_reached_known = False
+            page_comments = []
+            for comment in response['items']:
+                thread_comments = parseCommentThread(comment)
+                if known_ids is not None and not wanted(thread_comments[0]):
+                    # Known thread outside the refresh window, neither its replies nor later pages are needed
+                    page_reached_known = True
+                    continue
+                if executor is not None and hasTruncatedReplies(comment):
+                    inline_ids = {reply_data['comment_id'] for reply_data in thread_comments[1:]}
+                    # Reply pages keep the priority of the caller
+                    future = executor.submit(contextvars.copy_context().run, getThreadReplies, api_key, comment['id'])
+                    pending_replies.append((future, inline_ids))
+
+                if wanted(thread_comments[0]):
+                    page_has_new_threads = True
+                page_comments.extend(thread_comments)
+
+            next_page_available = response.get('nextPageToken')
+            last_page = next_page_available is None or \
+                (order == 'time' and (page_reached_known or since is not None and not page_has_new_threads))
+
+            # Hand out this page and whatever expansions are ready, then wait for the rest after the last page
+            for comment_data in itertools.chain(page_comments, expanded_replies(wait=last_page)):
+                if not wanted(comment_data):
+                    continue
+                yield comment_data
+                yielded += 1
+                if max_comments is not None and yielded >= max_comments:
+                    return
 
+            if last_page:
+                return
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
 
-def getVideoList(api_key, playlist_id):
-    # Create a YouTube API object
-    youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
 
-    request = youtube.playlistItems().list(part="contentDetails,snippet",
-                                           playlistId=playlist_id,
-                                           maxResults=50)
-    response = request.execute()
+def clearVideoComments(channel_id, video_id, fetch_date):
+    # Every writer replaces the whole comment set of a video in a partition, never leaving parts of an older run
+    delete_parts("comments", channel_id, video_id, fetch_date)
+
+
+def writeVideoComments(comment_data, channel_id, video_id, part=0, fetch_date=None, synced_at=None):
+    # The comment parts of a video are always named <video_id>-<n> and stamped with the time of the fetch
+    synced_at = time.time() if synced_at is None else synced_at
+    return write_dataset(comment_data.assign(video_id=video_id, synced_at=synced_at), channel_id, "comments",
+                         part_name=f"{video_id}-{part:05d}", fetch_date=fetch_date)
+
+
+@timed("save_video_comments")
+def saveVideoComments(api_key, channel_id, video_id, chunk_size=5000, **kwargs):
+    # Stream the comments of a video into the channel's dataset in chunks of chunk_size records
+    fetch_date = datetime.date.today().isoformat()
+    synced_at = time.time()
+    clearVideoComments(channel_id, video_id, fetch_date)
+
+    chunk = []
+    part = 0
+    total = 0
+
+    for comment_data in iterVideoComments(api_key, video_id, **kwargs):
+        chunk.append(comment_data)
+        if len(chunk) == chunk_size:
+            writeVideoComments(cleanCommentData(chunk), channel_id, video_id, part, fetch_date, synced_at)
+            total += len(chunk)
+            part += 1
+            chunk = []
+
+    if chunk:
+        writeVideoComments(cleanCommentData(chunk), channel_id, video_id, part, fetch_date, synced_at)
+        total += len(chunk)
+
+    return total
+
+
+@timed("get_video_comments")
+def getVideoComments(api_key, video_id, channel_id=None, max_comments=1000, order='relevance', since=None,
+                     expand_replies=True):
+    all_comments = list(iterVideoComments(api_key, video_id, max_comments=max_comments, order=order, since=since,
+                                          expand_replies=expand_replies))
+
+    comment_data = cleanCommentData(all_comments)
+
+    # Keep a copy in the channel's dataset, replacing whatever was stored for the video today
+    if channel_id is not None:
+        fetch_date = datetime.date.today().isoformat()
+        clearVideoComments(channel_id, video_id, fetch_date)
+        writeVideoComments(comment_data, channel_id, video_id, fetch_date=fetch_date)
+
+    # Pages keep the frame around, so it is handed out with compact dtypes
+    return compact_comment_data(comment_data)
+
+
+@timed("get_video_list")
+def getVideoList(api_key, playlist_id, known_ids=None, cache_ttl=None):
+    # Get the shared YouTube API object
+    youtube = get_youtube_client(api_key)
+
+    # Uploads playlists are ordered newest first, so paging can stop at the first video already in the catalog
+    known_ids = set(known_ids or [])
 
     all_videos = []
+    next_page_available = None
 
-    for vid in response['items']:
-        vid_stats = {
-            'id': vid['contentDetails'].get('videoId', None),
-            'title': vid['snippet'].get('title', None),
-            'thumbnail': vid['snippet']['thumbnails']['default']['url']
-        }
-        all_videos.append(vid_stats)
+    while True:
+        request = youtube.playlistItems().list(part="contentDetails,snippet",
+                                               playlistId=playlist_id,
+                                               maxResults=50,
+                                               pageToken=next_page_available)
+        response = cached_execute(request, ttl=cache_ttl)
 
-    next_page_available = response.get('nextPageToken')
-    is_next_pages = True
+        for vid in response['items']:
+            vid_stats = {
+                'id': vid['contentDetails'].get('videoId', None),
+                'title': vid['snippet'].get('title', None),
+                'thumbnail': vid['snippet']['thumbnails']['default']['url']
+            }
+            if vid_stats['id'] in known_ids:
+                return all_videos
+            all_videos.append(vid_stats)
 
-    while is_next_pages:
+        next_page_available = response.get('nextPageToken')
         if next_page_available is None:
-            is_next_pages = False
-        else:
-            request = youtube.playlistItems().list(part="contentDetails,snippet",
-                                                   playlistId=playlist_id,
-                                                   maxResults=50,
-                                                   pageToken=next_page_available)
-            response = request.execute()
-
-            for vid in response['items']:
-                vid_stats = {
-                    'id': vid['contentDetails'].get('videoId', None),
-                    'title': vid['snippet'].get('title', None),
-                    'thumbnail': vid['snippet']['thumbnails']['default']['url']
-                }
-                all_videos.append(vid_stats)
-
-            next_page_available = response.get('nextPageToken')
+            break
 
     # print(all_videos)
     return all_videos
 
 
+@timed("build_video_dataframe")
 def buildVideoListDataframe(api_key, video_ids):
-    youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
+    youtube = get_youtube_client(api_key)
 
     all_vids_stats = []
 
@@ -190,7 +309,7 @@ def buildVideoListDataframe(api_key, video_ids):
         request = youtube.videos().list(
             part='snippet,contentDetails,statistics',
             id=','.join(video_ids[i:i + 50]))
-        response = request.execute()
+        response = cached_execute(request)
 
         for vid in response['items']:
             thumbnail_url = vid['snippet']['thumbnails'].get('standard', {}).get('url', None)
@@ -209,41 +328,41 @@ def buildVideoListDataframe(api_key, video_ids):
             }
             all_vids_stats.append(vid_stats)
 
-    # create the dataframe
-    vids_info = pd.DataFrame(all_vids_stats)
-    # Convert columns to numeric
-    numeric_columns = ['comment_count', 'like_count', 'view_count']
-    vids_info[numeric_columns] = vids_info[numeric_columns]\
-                                  .apply(pd.to_numeric, errors='coerce')
+    # create the dataframe, with every column even when none of the videos exists any more
+    vids_info = normalizeVideoData(pd.DataFrame(all_vids_stats, columns=VIDEO_COLUMNS))
 
-    # Function to convert ISO 8601 duration to minutes
-    def iso8601_duration_to_minutes(duration):
-        minutes_match = re.search(r'(\d+)M', duration)
-        seconds_match = re.search(r'(\d+)S', duration)
+    return vids_info
 
-        # Get the minutes and seconds values, or default to 0 if they are not found.
-        minutes = int(minutes_match.group(1)) if minutes_match else 0
-        seconds = int(seconds_match.group(1)) if seconds_match else 0
 
-        # Calculate the total duration in minutes.
-        total_minutes = minutes + seconds / 60.0
+VIDEO_COLUMNS = ['id', 'title', 'published_date', 'tags', 'duration', 'view_count', 'like_count', 'favorite_count',
+                 'comment_count', 'thumbnail']
 
-        return total_minutes
+COUNT_COLUMNS = ['view_count', 'like_count', 'favorite_count', 'comment_count']
 
-    # Apply the conversion function to the 'duration' column
-    vids_info['duration_minutes'] = vids_info['duration']\
-                                     .apply(iso8601_duration_to_minutes)
+# ISO 8601 duration as returned by the API, e.g. P1DT2H3M4S or PT15M33S
+ISO8601_DURATION_PATTERN = r'^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?' \
+                           r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+DURATION_UNIT_SECONDS = {'weeks': 604800, 'days': 86400, 'hours': 3600, 'minutes': 60, 'seconds': 1}
 
-    # Convert 'published_date' to a pandas datetime object
-    vids_info['published_date'] = pd.to_datetime(vids_info['published_date'])
 
-    # Format 'published_date'
-    vids_info['published_date'] = vids_info['published_date']\
-                                   .dt.strftime('%Y-%m-%d %I:%M:%S')
+def normalizeVideoData(vids_info):
+    # Cast counts, durations and dates to real dtypes in one vectorized pass, formatting is left to the pages
+    vids_info = vids_info.reindex(columns=vids_info.columns.union(VIDEO_COLUMNS, sort=False))
+
+    # Convert count columns to nullable integers
+    for column in COUNT_COLUMNS:
+        vids_info[column] = pd.to_numeric(vids_info[column], errors='coerce').astype('Int64')
 
-    vids_info.to_excel("all_vids_info.xlsx", index=False)
+    # Parse every duration component at once and add them up in seconds
+    components = vids_info['duration'].astype('string').str.extract(ISO8601_DURATION_PATTERN)
+    seconds = sum(pd.to_numeric(components[unit]).fillna(0) * factor
+                  for unit, factor in DURATION_UNIT_SECONDS.items())
+    seconds = seconds.where(components.notna().any(axis=1))
+    vids_info['duration_seconds'] = seconds.astype('Int64')
+    vids_info['duration_minutes'] = vids_info['duration_seconds'].astype('float64') / 60.0
 
-    print(vids_info.head(5))
+    # Keep 'published_date' as a timezone aware datetime
+    vids_info['published_date'] = pd.to_datetime(vids_info['published_date'], utc=True)
 
     return vids_info
 
@@ -0,0 +1,201 @@
+import difflib
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from youtube_client import get_youtube_client
+from response_cache import cached_execute
+
+########################################################################################################################
+#                                       PERSISTENT CHANNEL RESOLVER
+########################################################################################################################
+RESOLVER_PATH = os.path.join(".cache", "channels.sqlite")
+
+# Seconds a failed lookup is remembered, so a mistyped name does not pay for a search on every rerun
+NEGATIVE_TTL = 24 * 3600
+
+CHANNEL_ID_PATTERN = re.compile(r"^UC[\w-]{22}$")
+HANDLE_PATTERN = re.compile(r"^@?[\w.-]{3,30}$")
+
+
+def normalize_name(name):
+    """Returns the lookup key of a channel name: trimmed, case folded, single spaced."""
+    return " ".join(name.split()).casefold()
+
+
+def parse_channel_reference(text):
+    """Parses a channel ID, channel URL or @handle without any API call.
+
+    Returns ("id", channel_id), ("handle", handle), ("username", username), ("custom", name) for legacy /c/ URLs
+    or None for plain names.
+    """
+    text = text.strip()
+    if CHANNEL_ID_PATTERN.match(text):
+        return "id", text
+    if text.startswith("@") and HANDLE_PATTERN.match(text):
+        return "handle", text
+
+    url = urllib.parse.urlparse(text if "://" in text else "https://" + text)
+    if not url.netloc.lower().endswith(("youtube.com", "youtu.be")):
+        return None
+
+    segments = [segment for segment in url.path.split("/") if segment]
+    if not segments:
+        return None
+    if segments[0] == "channel" and len(segments) > 1 and CHANNEL_ID_PATTERN.match(segments[1]):
+        return "id", segments[1]
+    if segments[0].startswith("@"):
+        return "handle", urllib.parse.unquote(segments[0])
+    if segments[0] == "user" and len(segments) > 1:
+        return "username", segments[1]
+    if segments[0] == "c" and len(segments) > 1:
+        return "custom", urllib.parse.unquote(segments[1])
+    return None
+
+
+class ChannelResolver:
+    """Resolves channel names, handles and URLs to channel IDs, cheapest lookup first.
+
+    Channel IDs and URLs are parsed locally (0 quota units), handles are looked up with channels.list(forHandle)
+    (1 unit) and only names that are not a handle fall back to search.list (100 units). Every answer is kept in a
+    SQLite store shared by all processes, so a name is only ever resolved once.
+    """
+
+    def __init__(self, path=RESOLVER_PATH, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+
+        self.hits = 0
+        self.lookups = {"parsed": 0, "handle": 0, "username": 0, "search": 0}
+
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS channels (
+                name TEXT PRIMARY KEY,
+                channel_id TEXT,
+                title TEXT,
+                resolved_by TEXT NOT NULL,
+                resolved_at REAL NOT NULL
+            )""")
+        self._connection.commit()
+
+    def _get(self, name):
+        with self._lock:
+            row = self._connection.execute("SELECT channel_id, resolved_at FROM channels WHERE name = ?",
+                                           (name,)).fetchone()
+        if row is None:
+            return False, None
+        channel_id, resolved_at = row
+        if channel_id is None and time.time() - resolved_at > self.negative_ttl:
+            return False, None
+        return True, channel_id
+
+    def _put(self, names, channel_id, title, resolved_by):
+        now = time.time()
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO channels VALUES (?, ?, ?, ?, ?)",
+                                         [(name, channel_id, title, resolved_by, now) for name in names])
+            self._connection.commit()
+
+    def _list_channel(self, api_key, **params):
+        youtube = get_youtube_client(api_key)
+        response = cached_execute(youtube.channels().list(part="id,snippet", maxResults=1, **params))
+        if not response.get("items"):
+            return None, None
+        channel = response["items"][0]
+        return channel["id"], channel["snippet"]["title"]
+
+    def _search_channel(self, api_key, name):
+        youtube = get_youtube_client(api_key)
+        response = cached_execute(youtube.search().list(q=name, part="snippet", type="channel", maxResults=1))
+        if not response["items"]:
+            return None, None
+        snippet = response["items"][0]["snippet"]
+        return snippet["channelId"], snippet["title"]
+
+    def resolve(self, api_key, name):
+        """Returns the channel ID of a name, handle, channel ID or channel URL, or None if there is no such channel."""
+        key = normalize_name(name)
+        if not key:
+            return None
+
+        reference = parse_channel_reference(name)
+        if reference is not None and reference[0] == "id":
+            self.lookups["parsed"] += 1
+            return reference[1]
+
+        found, channel_id = self._get(key)
+        if found:
+            self.hits += 1
+            return channel_id
+
+        channel_id = title = None
+        resolved_by = None
+        if reference is not None and reference[0] == "username":
+            resolved_by = "username"
+            self.lookups[resolved_by] += 1
+            channel_id, title = self._list_channel(api_key, forUsername=reference[1])
+        else:
+            # Names and legacy custom URLs are tried as a handle first, handles cannot contain spaces
+            search_name = reference[1] if reference is not None else name
+            handle = search_name if search_name.startswith("@") else "@" + "".join(search_name.split())
+            if HANDLE_PATTERN.match(handle):
+                resolved_by = "handle"
+                self.lookups[resolved_by] += 1
+                channel_id, title = self._list_channel(api_key, forHandle=handle)
+
+            # Explicit handles that do not exist are not worth a search
+            if channel_id is None and (reference is None or reference[0] == "custom"):
+                resolved_by = "search"
+                self.lookups[resolved_by] += 1
+                channel_id, title = self._search_channel(api_key, search_name)
+
+        # The channel title is stored as a name too, so it resolves for free and shows up in suggestions
+        names = [key]
+        if title:
+            names.append(normalize_name(title))
+        self._put(names, channel_id, title, resolved_by or "parsed")
+        return channel_id
+
+    def suggest(self, name, n=5, cutoff=0.6):
+        """Returns up to n (title, channel_id) pairs of resolved channels whose name or title resembles the name."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, title, channel_id FROM channels WHERE channel_id IS NOT NULL").fetchall()
+
+        by_name = {stored_name: (title or stored_name, channel_id) for stored_name, title, channel_id in rows}
+        matches = difflib.get_close_matches(normalize_name(name), list(by_name), n=max(len(by_name), 1), cutoff=cutoff)
+
+        suggestions = []
+        for match in matches:
+            if by_name[match] not in suggestions:
+                suggestions.append(by_name[match])
+        return suggestions[:n]
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_channel_resolver():
+    """Returns the process wide channel resolver, opening its store on first use."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = ChannelResolver()
+    return _resolver
+
+
+def resolve_channel(api_key, name):
+    """Resolves a channel name, handle, channel ID or URL through the process wide resolver."""
+    return get_channel_resolver().resolve(api_key, name)
@@ -0,0 +1,107 @@
+import time
+from datetime import timedelta
+
+import pandas as pd
+
+from channelVideoDataExtraction import getVideoList, buildVideoListDataframe, normalizeVideoData
+from dataset_store import read_dataset, write_dataset
+from instrumentation import annotate, timed
+
+########################################################################################################################
+#                                       INCREMENTAL CHANNEL SYNC
+########################################################################################################################
+# (video age up to, maximum age of its statistics) - new uploads move fast, old ones barely change
+STATS_MAX_AGE_TIERS = [
+    (timedelta(days=2), timedelta(hours=1)),
+    (timedelta(days=30), timedelta(hours=12)),
+    (timedelta(days=365), timedelta(days=3)),
+    (None, timedelta(days=14)),
+]
+
+
+def loadCatalog(channel_id):
+    """Returns the latest stored (uploads, video stats) frames of a channel, or (None, None)."""
+    videos_df = read_dataset("uploads", channel_id)
+    stats_df = read_dataset("videos", channel_id)
+    if videos_df is None or stats_df is None:
+        return None, None
+    # Snapshots written before normalization stored dates as text
+    return videos_df, normalizeVideoData(stats_df)
+
+
+def saveCatalog(channel_id, videos_df, stats_df):
+    # One full snapshot per entity and fetch date, older dates are kept as history
+    write_dataset(videos_df, channel_id, "uploads", part_name="snapshot", replace=True)
+    write_dataset(stats_df, channel_id, "videos", part_name="snapshot", replace=True)
+
+
+def staleVideoIds(stats_df, tiers=None, now=None):
+    """Returns the IDs of videos whose statistics are older than allowed for their age tier."""
+    tiers = tiers or STATS_MAX_AGE_TIERS
+    now = pd.Timestamp.now(tz="UTC") if now is None else now
+
+    video_age = now - pd.to_datetime(stats_df['published_date'], utc=True)
+    stats_age = now - pd.to_datetime(stats_df['stats_fetched_at'], unit='s', utc=True)
+
+    stale = pd.Series(False, index=stats_df.index)
+    remaining = pd.Series(True, index=stats_df.index)
+    for max_video_age, max_stats_age in tiers:
+        in_tier = remaining if max_video_age is None else remaining & (video_age <= max_video_age)
+        stale |= in_tier & (stats_age > max_stats_age)
+        remaining &= ~in_tier
+
+    return stats_df.loc[stale, 'id'].tolist()
+
+
+@timed("sync_channel")
+def syncChannel(api_key, channel_id, playlist_id, full=False, tiers=None):
+    """Brings the local catalog of a channel's uploads playlist up to date and returns (videos, video stats dataframe).
+
+    Playlist paging stops at the first already known video and statistics are only requested for new videos
+    and for videos whose statistics are stale, so a routine refresh costs a handful of API calls. Videos the API
+    no longer returns are left out of the statistics. Pass full=True to rebuild the catalog from scratch (e.g. to
+    drop deleted videos from the uploads list).
+    """
+    videos_df, stats_df = (None, None) if full else loadCatalog(channel_id)
+
+    if videos_df is None:
+        videos = getVideoList(api_key, playlist_id)
+        video_ids = [video['id'] for video in videos if video['id'] is not None]
+        stats_df = buildVideoListDataframe(api_key, video_ids)
+        stats_df['stats_fetched_at'] = time.time()
+        videos_df = pd.DataFrame(videos)
+        saveCatalog(channel_id, videos_df, stats_df)
+        return videos, stats_df
+
+    # Always revalidate the playlist pages, an unchanged first page only costs a 304
+    new_videos = getVideoList(api_key, playlist_id, known_ids=videos_df['id'].tolist(), cache_ttl=0)
+    new_ids = [video['id'] for video in new_videos if video['id'] is not None]
+
+    refresh_ids = new_ids + [video_id for video_id in staleVideoIds(stats_df, tiers) if video_id not in new_ids]
+
+    unavailable_ids = []
+    if refresh_ids:
+        refreshed_df = buildVideoListDataframe(api_key, refresh_ids)
+        refreshed_df['stats_fetched_at'] = time.time()
+
+        # Deleted and private videos are missing from videos.list. Their statistics are dropped, while the uploads
+        # list keeps them as known so neither playlist paging nor the stale check asks for them again.
+        returned_ids = set(refreshed_df['id'])
+        unavailable_ids = [video_id for video_id in refresh_ids if video_id not in returned_ids]
+        kept_df = stats_df[~stats_df['id'].isin(refresh_ids)]
+        stats_df = pd.concat([refreshed_df, kept_df]) if len(refreshed_df) else kept_df
+
+        # Keep the newest first order of the uploads playlist
+        order = {video_id: position for position, video_id in enumerate(new_ids + videos_df['id'].tolist())}
+        stats_df = stats_df.sort_values('id', key=lambda ids: ids.map(order)).reset_index(drop=True)
+
+    if new_videos:
+        videos_df = pd.concat([pd.DataFrame(new_videos), videos_df], ignore_index=True)
+
+    if refresh_ids or new_videos:
+        saveCatalog(channel_id, videos_df, stats_df)
+
+    annotate(new_videos=len(new_ids), refreshed_videos=len(refresh_ids) - len(new_ids),
+             unavailable_videos=len(unavailable_ids))
+
+    return videos_df.to_dict('records'), stats_df
@@ -0,0 +1,178 @@
+import contextvars
+import datetime
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from googleapiclient.errors import HttpError
+
+from channelVideoDataExtraction import parseCommentThread, cleanCommentData, clearVideoComments, writeVideoComments
+from youtube_client import get_youtube_client
+from response_cache import cached_execute
+from request_scheduler import PRIORITY_BACKGROUND, QuotaExceededError
+from instrumentation import annotate, timed
+
+########################################################################################################################
+#                                       CHANNEL WIDE COMMENT HARVESTER
+########################################################################################################################
+# commentThreads.list costs 1 quota unit per page
+COMMENT_THREAD_PAGE_COST = 1
+
+PROGRESS_DIR = os.path.join(".cache", "harvests")
+
+
+class QuotaBudget:
+    """Thread-safe quota unit counter shared by every worker of a harvest run.
+
+    Units are granted by spend() before each request. With a parent (any object with spend and settle, e.g. the
+    run budget of ingest.py) every grant is also taken from the parent, so concurrent harvests share its limit.
+    """
+
+    def __init__(self, units, parent=None):
+        self.units = units
+        self.used = 0
+        self.parent = parent
+        self._lock = threading.Lock()
+
+    def spend(self, cost):
+        with self._lock:
+            if self.used + cost > self.units:
+                return False
+            if self.parent is not None and not self.parent.spend(cost):
+                return False
+            self.used += cost
+            return True
+
+    def settle(self, cost):
+        # The request the units were granted for has been answered
+        if self.parent is not None:
+            self.parent.settle(cost)
+
+
+def _progress_path(channel_id):
+    return os.path.join(PROGRESS_DIR, f"{channel_id}.json")
+
+
+def _load_progress(channel_id, resume):
+    path = _progress_path(channel_id)
+    if not resume or not os.path.exists(path):
+        # Every resumed run of a harvest writes into the partition of the date it started
+        return {"completed": [], "quota_used": 0, "fetch_date": datetime.date.today().isoformat()}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_progress(channel_id, progress):
+    # Write to a temporary file first so an interrupted run never leaves a corrupt progress file
+    os.makedirs(PROGRESS_DIR, exist_ok=True)
+    path = _progress_path(channel_id)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, path)
+
+
+def _fetch_video_comments(api_key, video_id, budget):
+    # Page through every comment thread of one video, stopping early if the run budget runs out
+    youtube = get_youtube_client(api_key)
+
+    all_comments = []
+    page_token = None
+
+    while True:
+        if not budget.spend(COMMENT_THREAD_PAGE_COST):
+            return all_comments, False
+
+        request = youtube.commentThreads().list(part="snippet,replies",
+                                                videoId=video_id,
+                                                maxResults=100,
+                                                textFormat='plainText',
+                                                pageToken=page_token)
+        try:
+            # Harvests yield to interactive requests and stop cleanly when the shared quota runs out
+            response = cached_execute(request, priority=PRIORITY_BACKGROUND)
+        except QuotaExceededError:
+            return all_comments, False
+        except HttpError as error:
+            # Videos with comments turned off are finished, not failed
+            if error.resp.status == 403 and "commentsDisabled" in str(error.content):
+                return all_comments, True
+            raise
+        finally:
+            budget.settle(COMMENT_THREAD_PAGE_COST)
+
+        for comment in response['items']:
+            all_comments.extend(parseCommentThread(comment))
+
+        page_token = response.get('nextPageToken')
+        if page_token is None:
+            return all_comments, True
+
+
+def _write_video_comments(channel_id, video_id, all_comments, fetch_date):
+    comment_data = cleanCommentData(all_comments)
+    clearVideoComments(channel_id, video_id, fetch_date)
+    writeVideoComments(comment_data, channel_id, video_id, fetch_date=fetch_date)
+    return len(comment_data)
+
+
+@timed("harvest_comments")
+def harvest_channel_comments(api_key, channel_id, video_ids, max_workers=8, quota_budget=10000, resume=True,
+                             shared_budget=None):
+    """Fetches the comment threads of many videos in parallel and streams them to the channel's comment dataset.
+
+    Progress is checkpointed after every video, so calling this again for the same channel resumes where the
+    previous run stopped (because of an error, an exhausted run budget or an exhausted API quota). A harvest that
+    finished every video drops its checkpoint, the next call fetches the comments again. Pass resume=False to
+    start over. quota_budget limits this harvest, shared_budget (see QuotaBudget) is checked before every request
+    as well, so concurrent harvests can draw from one limit.
+    """
+    progress = _load_progress(channel_id, resume)
+    completed = set(progress["completed"])
+    pending = [video_id for video_id in dict.fromkeys(video_ids) if video_id and video_id not in completed]
+
+    budget = QuotaBudget(quota_budget, parent=shared_budget)
+    previous_quota_used = progress["quota_used"]
+    summary = {"videos": 0, "comments": 0, "failed": [], "skipped": len(completed)}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Workers run in a copy of the caller's context, so their API calls count towards this harvest
+        futures = {executor.submit(contextvars.copy_context().run, _fetch_video_comments, api_key, video_id, budget):
+                   video_id for video_id in pending}
+
+        for future in as_completed(futures):
+            video_id = futures[future]
+            try:
+                all_comments, finished = future.result()
+            except Exception as error:
+                annotate(last_error=f"{video_id}: {error}")
+                summary["failed"].append(video_id)
+                continue
+
+            # Videos cut short by the budget are left out of the checkpoint and fetched again on resume
+            if not finished:
+                continue
+
+            if all_comments:
+                summary["comments"] += _write_video_comments(channel_id, video_id, all_comments,
+                                                             progress["fetch_date"])
+            summary["videos"] += 1
+
+            progress["completed"].append(video_id)
+            progress["quota_used"] = previous_quota_used + budget.used
+            _save_progress(channel_id, progress)
+
+    summary["quota_used"] = budget.used
+    summary["remaining"] = len(pending) - summary["videos"] - len(summary["failed"])
+
+    progress["quota_used"] = previous_quota_used + budget.used
+    if summary["remaining"] or summary["failed"]:
+        _save_progress(channel_id, progress)
+    elif os.path.exists(_progress_path(channel_id)):
+        # Nothing left to resume, a later harvest of the channel starts over and picks up new comments
+        os.remove(_progress_path(channel_id))
+    annotate(videos=summary["videos"], comments=summary["comments"], failed=len(summary["failed"]),
+             remaining=summary["remaining"])
+
+    return summary
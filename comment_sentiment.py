@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count_cache, timed
+
+########################################################################################################################
+#                                       CACHED SENTIMENT SCORING
+########################################################################################################################
+CACHE_PATH = os.path.join(".cache", "sentiment.sqlite")
+
+# Comments scored per task, and the number of unscored comments from which a process pool pays off
+BATCH_SIZE = 500
+PROCESS_POOL_THRESHOLD = 5000
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_CHUNK = 400
+
+_lock = threading.Lock()
+_connection = None
+
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(CACHE_PATH, timeout=30, check_same_thread=False)
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS polarity (
+                comment_id TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (comment_id, text_hash)
+            )""")
+        _connection.commit()
+    return _connection
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _score_batch(texts):
+    # TextBlob takes well over a second to import, only pay for it when a comment is missing from the cache
+    from textblob import TextBlob
+
+    # Evaluate the polarity once per comment
+    return [TextBlob(text).sentiment.polarity for text in texts]
+
+
+def _lookup(keys):
+    connection = _get_connection()
+    scores = {}
+    with _lock:
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            clause = " OR ".join(["(comment_id = ? AND text_hash = ?)"] * len(chunk))
+            rows = connection.execute(f"SELECT comment_id, text_hash, score FROM polarity WHERE {clause}",
+                                      [value for key in chunk for value in key]).fetchall()
+            scores.update(((comment_id, text_hash), score) for comment_id, text_hash, score in rows)
+    return scores
+
+
+def _store(rows):
+    connection = _get_connection()
+    with _lock:
+        connection.executemany("INSERT OR REPLACE INTO polarity VALUES (?, ?, ?)", rows)
+        connection.commit()
+
+
+def score_comments(comment_ids, texts, processes=None):
+    """Returns the TextBlob polarity of every comment, scoring only comments missing from the persistent cache.
+
+    Unscored comments are scored in batches, across a process pool when there are many of them (processes=None
+    picks the pool automatically, 0 or 1 forces scoring in this process).
+    """
+    texts = ["" if pd.isna(text) else str(text) for text in texts]
+    keys = list(zip((str(comment_id) for comment_id in comment_ids), (_text_hash(text) for text in texts)))
+
+    cached = _lookup(list(set(keys)))
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached:
+            missing.setdefault(key, text)
+    count_cache("sentiment", "hits", len(keys) - len(missing))
+    count_cache("sentiment", "misses", len(missing))
+
+    if missing:
+        missing_keys = list(missing)
+        missing_texts = list(missing.values())
+        batches = [missing_texts[start:start + BATCH_SIZE] for start in range(0, len(missing_texts), BATCH_SIZE)]
+
+        use_pool = processes is None and len(missing_texts) >= PROCESS_POOL_THRESHOLD or (processes or 0) > 1
+        if use_pool:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                scores = [score for batch in executor.map(_score_batch, batches) for score in batch]
+        else:
+            scores = [score for batch in batches for score in _score_batch(batch)]
+
+        new_scores = dict(zip(missing_keys, scores))
+        _store([(comment_id, text_hash, score) for (comment_id, text_hash), score in new_scores.items()])
+        cached.update(new_scores)
+
+    return np.array([cached[key] for key in keys], dtype=float)
+
+
+def sentiment_labels(polarity):
+    """Classifies polarity scores as Positive, Neutral or Negative."""
+    polarity = np.asarray(polarity)
+    return np.select([polarity > 0, polarity == 0], ['Positive', 'Neutral'], default='Negative')
+
+
+@timed("sentiment")
+def add_sentiment(comment_data, processes=None):
+    """Adds 'polarity' and 'Sentiment' columns to a comment dataframe."""
+    polarity = score_comments(comment_data['comment_id'], comment_data['comment_text'], processes)
+    comment_data['polarity'] = polarity
+    comment_data['Sentiment'] = sentiment_labels(polarity)
+    return comment_data
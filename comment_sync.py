@@ -0,0 +1,157 @@
+import collections
+import datetime
+import threading
+import time
+
+import pandas as pd
+
+from background_jobs import BackgroundJobs
+from channelVideoDataExtraction import COMMENT_COLUMNS, cleanCommentData, iterVideoComments, writeVideoComments
+from compact_frames import compact_comment_data
+from dataset_store import delete_parts, list_parts, read_parts
+from instrumentation import annotate, count_cache, timed
+from request_scheduler import PRIORITY_BACKGROUND, request_priority
+
+########################################################################################################################
+#                                       INCREMENTAL COMMENT SYNC
+########################################################################################################################
+# Stored comments of a video are served as they are for this many seconds, after that a delta fetch is started
+COMMENT_MAX_AGE = 30 * 60
+
+# Comments of known threads published within this window are read again to pick up their new like counts
+LIKE_REFRESH_WINDOW = pd.Timedelta(days=7)
+
+# Comments fetched for a video seen for the first time, and at most per delta fetch
+MAX_COMMENTS = 1000
+MAX_DELTA_COMMENTS = 2000
+
+# Videos whose comments are kept in memory, least recently opened ones are dropped first
+MAX_LOADED_VIDEOS = 16
+
+# Seconds before a delta fetch that failed is tried again
+SYNC_RETRY_DELAY = 5 * 60
+
+# Delta fetches run in the background per (channel_id, video_id), so opening a video never waits on the API when
+# comments are stored. A failed fetch is retried after SYNC_RETRY_DELAY seconds.
+_syncs = BackgroundJobs(max_workers=2, retry_delay=SYNC_RETRY_DELAY)
+
+# (channel_id, video_id) -> (comments, synced_at) of the most recently opened videos
+_lock = threading.Lock()
+_loaded = collections.OrderedDict()
+
+
+def _remember(key, comments, synced_at):
+    with _lock:
+        _loaded[key] = comments, synced_at
+        _loaded.move_to_end(key)
+        while len(_loaded) > MAX_LOADED_VIDEOS:
+            _loaded.popitem(last=False)
+
+
+def load_comments(channel_id, video_id):
+    """Returns the stored (comments, synced_at) of a video, or (None, None).
+
+    Only the parts of the newest fetch date are read, every writer replaces the video's whole comment set there.
+    Parts written before comments were stamped with a sync time count as stale.
+    """
+    key = (channel_id, video_id)
+    with _lock:
+        if key in _loaded:
+            _loaded.move_to_end(key)
+            return _loaded[key]
+
+    parts = list_parts("comments", channel_id, video_id)
+    comments = read_parts(parts[max(parts)]) if parts else None
+    if comments is None:
+        return None, None
+
+    synced_at = 0.0
+    if 'synced_at' in comments and comments['synced_at'].notna().any():
+        synced_at = float(comments['synced_at'].max())
+
+    comments = comments.reindex(columns=COMMENT_COLUMNS).drop_duplicates(subset='comment_id', keep='last')
+    comments = comments.sort_values(by="like_count", ascending=False).reset_index(drop=True)
+
+    _remember(key, comments, synced_at)
+    return comments, synced_at
+
+
+def save_comments(channel_id, video_id, comments, synced_at):
+    # The merged set becomes the video's only comment part, parts of earlier dates and writers are dropped
+    path = writeVideoComments(comments, channel_id, video_id, fetch_date=datetime.date.today().isoformat(),
+                              synced_at=synced_at)
+    delete_parts("comments", channel_id, video_id, keep=[path])
+    _remember((channel_id, video_id), comments, synced_at)
+
+
+@timed("sync_video_comments")
+def sync_video_comments(api_key, channel_id, video_id, full=False):
+    """Brings the stored comments of a video up to date and returns them.
+
+    A video without stored comments gets its MAX_COMMENTS most relevant ones. Afterwards comments are paged
+    newest first and paging stops at the first known thread older than LIKE_REFRESH_WINDOW, so a refresh costs
+    about one API page plus the pages of new comments. Known comments inside the window replace their stored
+    copies, which keeps their like counts current. Pass full=True to fetch from scratch.
+    """
+    stored, _ = (None, None) if full else load_comments(channel_id, video_id)
+    synced_at = time.time()
+
+    if stored is None:
+        comments = cleanCommentData(list(iterVideoComments(api_key, video_id, max_comments=MAX_COMMENTS)))
+        save_comments(channel_id, video_id, comments, synced_at)
+        annotate(new_comments=len(comments))
+        return comments
+
+    known_ids = stored.loc[stored['linkage'].isna(), 'comment_id'].tolist()
+    since = pd.Timestamp.now(tz="UTC") - LIKE_REFRESH_WINDOW
+    fetched = list(iterVideoComments(api_key, video_id, max_comments=MAX_DELTA_COMMENTS, order='time', since=since,
+                                     known_ids=known_ids))
+
+    comments = stored
+    if fetched:
+        fetched = cleanCommentData(fetched)
+        comments = pd.concat([fetched, stored[~stored['comment_id'].isin(fetched['comment_id'])]])
+        comments = comments.sort_values(by="like_count", ascending=False).reset_index(drop=True)
+        new_comments = len(comments) - len(stored)
+        annotate(new_comments=new_comments, refreshed_comments=len(fetched) - new_comments)
+
+    save_comments(channel_id, video_id, comments, synced_at)
+    return comments
+
+
+def _background_sync(api_key, channel_id, video_id):
+    with request_priority(PRIORITY_BACKGROUND):
+        return sync_video_comments(api_key, channel_id, video_id)
+
+
+def sync_error(channel_id, video_id):
+    """Returns the error of the last failed delta fetch of a video, or None."""
+    return _syncs.error((channel_id, video_id))
+
+
+def get_video_comments(api_key, channel_id, video_id, max_age=COMMENT_MAX_AGE):
+    """Returns (comments, is_current) of a video for display, with compact dtypes.
+
+    Stored comments are returned right away. When they are older than max_age a delta fetch is started in the
+    background and is_current is False until it is done. A failed delta fetch is reported by sync_error and only
+    tried again after SYNC_RETRY_DELAY seconds. Only a video without stored comments is fetched on the caller's
+    thread.
+    """
+    comments, synced_at = load_comments(channel_id, video_id)
+    if comments is None:
+        count_cache("comments", "misses", resource=video_id)
+        return compact_comment_data(sync_video_comments(api_key, channel_id, video_id)), True
+
+    if time.time() - synced_at < max_age:
+        count_cache("comments", "hits", resource=video_id)
+        return compact_comment_data(comments), True
+
+    count_cache("comments", "revalidated", resource=video_id)
+    future = _syncs.submit((channel_id, video_id), _background_sync, api_key, channel_id, video_id)
+
+    if future is not None and future.done() and future.exception() is None:
+        return compact_comment_data(future.result()), True
+    if future is None:
+        # Still backing off after a failed fetch
+        annotate(comment_sync_error=sync_error(channel_id, video_id))
+    return compact_comment_data(comments), False
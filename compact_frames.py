@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+########################################################################################################################
+#                                       MEMORY COMPACT FRAMES
+########################################################################################################################
+# Arrow backed strings store text in one contiguous buffer instead of one Python object per cell
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+VIDEO_STRING_COLUMNS = ['id', 'title', 'thumbnail', 'duration']
+
+# View counts pass 2**31 on large channels, the other counts and durations do not
+VIDEO_INT_DTYPES = {
+    'view_count': 'Int64',
+    'like_count': 'Int64',
+    'comment_count': 'Int64',
+    'favorite_count': 'Int32',
+    'duration_seconds': 'Int32',
+}
+
+COMMENT_STRING_COLUMNS = ['comment_id', 'comment_text', 'comment_date', 'linkage']
+
+
+def compact_video_data(video_data):
+    """Returns (videos, video_tags): the video frame with compact dtypes and its tags as a (video_id, tag) table.
+
+    Both columns of the tag table are categoricals, i.e. dictionary encoded, so every distinct ID and tag is
+    stored once however many rows use it.
+    """
+    videos = video_data.copy()
+
+    tag_lists = videos.pop('tags') if 'tags' in videos else pd.Series([[]] * len(videos), index=videos.index)
+    tag_lists = tag_lists.map(lambda tags: list(tags) if tags is not None and not isinstance(tags, float) else [])
+
+    for column in VIDEO_STRING_COLUMNS:
+        if column in videos:
+            videos[column] = videos[column].astype(STRING_DTYPE)
+    for column, dtype in VIDEO_INT_DTYPES.items():
+        if column in videos:
+            videos[column] = videos[column].astype(dtype)
+    if 'duration_minutes' in videos:
+        videos['duration_minutes'] = videos['duration_minutes'].astype('float32')
+
+    counts = tag_lists.map(len).to_numpy(dtype='int64')
+    video_ids = np.repeat(videos['id'].to_numpy(dtype=object), counts)
+    tags = [tag for video_tags in tag_lists for tag in video_tags]
+    video_tags = pd.DataFrame({
+        'video_id': pd.Categorical(video_ids, categories=pd.unique(videos['id'].dropna().to_numpy(dtype=object))),
+        'tag': pd.Categorical(tags),
+    })
+
+    return videos.reset_index(drop=True), video_tags
+
+
+def video_tag_lists(video_tags, video_ids):
+    """Returns the tags of every video in video_ids as lists, empty for videos without tags."""
+    video_codes = video_tags['video_id'].cat.codes.to_numpy()
+    order = np.argsort(video_codes, kind='stable')
+    tags = video_tags['tag'].astype(object).to_numpy()[order]
+
+    # Rows of one video are contiguous once sorted by video code
+    categories = video_tags['video_id'].cat.categories
+    bounds = np.searchsorted(video_codes[order], np.arange(len(categories) + 1))
+    lists = {video_id: tags[bounds[code]:bounds[code + 1]].tolist() for code, video_id in enumerate(categories)}
+    return [lists.get(video_id, []) for video_id in video_ids]
+
+
+def compact_comment_data(comment_data):
+    """Returns a comment frame with Arrow backed strings, categorical authors and int32 like counts."""
+    comments = comment_data.copy()
+    for column in COMMENT_STRING_COLUMNS:
+        if column in comments:
+            comments[column] = comments[column].astype(STRING_DTYPE)
+    if 'author' in comments:
+        comments['author'] = comments['author'].astype('category')
+    if 'like_count' in comments:
+        comments['like_count'] = comments['like_count'].astype('Int32')
+    return comments
+
+
+def memory_report(frames):
+    """Returns the rows, deep memory use and bytes per row of every frame in a {name: dataframe} dict."""
+    rows = []
+    for name, frame in frames.items():
+        if frame is None:
+            continue
+        size = int(frame.memory_usage(deep=True).sum())
+        rows.append({'frame': name, 'rows': len(frame), 'columns': len(frame.columns), 'bytes': size,
+                     'bytes_per_row': round(size / len(frame), 1) if len(frame) else 0.0})
+    return pd.DataFrame(rows, columns=['frame', 'rows', 'columns', 'bytes', 'bytes_per_row'])
+
+
+def column_memory(frame):
+    """Returns the dtype and deep memory use of every column of a frame, largest first."""
+    usage = frame.memory_usage(deep=True, index=False)
+    return pd.DataFrame({'dtype': frame.dtypes.astype(str), 'bytes': usage}).sort_values('bytes', ascending=False)
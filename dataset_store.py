@@ -0,0 +1,165 @@
+import datetime
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from instrumentation import annotate, timed
+
+########################################################################################################################
+#                                       PARQUET DATASET STORE
+########################################################################################################################
+# Hive partitioned layout: data/channel_id=<id>/entity=<entity>/fetch_date=<YYYY-MM-DD>/<part>.parquet
+DATA_DIR = "data"
+
+PARTITION_FIELDS = ["channel_id", "entity", "fetch_date"]
+
+PARTITIONING = ds.partitioning(pa.schema([("channel_id", pa.string()),
+                                          ("entity", pa.string()),
+                                          ("fetch_date", pa.string())]),
+                               flavor="hive")
+
+
+def _partition_dir(channel_id, entity, fetch_date, root=DATA_DIR):
+    return os.path.join(root, f"channel_id={channel_id}", f"entity={entity}", f"fetch_date={fetch_date}")
+
+
+def _fetch_dates(channel_id, entity, root=DATA_DIR):
+    entity_dir = os.path.join(root, f"channel_id={channel_id}", f"entity={entity}")
+    if not os.path.isdir(entity_dir):
+        return []
+    return sorted(name.split("=", 1)[1] for name in os.listdir(entity_dir) if name.startswith("fetch_date="))
+
+
+@timed("write_dataset")
+def write_dataset(df, channel_id, entity, part_name=None, fetch_date=None, replace=False, root=DATA_DIR):
+    """Atomically writes a dataframe as one Parquet part of a channel/entity/fetch date partition.
+
+    Writing a part_name that already exists replaces that part, replace=True drops every other part of the
+    partition (used for full snapshots). Returns the path of the written file.
+    """
+    fetch_date = fetch_date or datetime.date.today().isoformat()
+    partition_dir = _partition_dir(channel_id, entity, fetch_date, root)
+    os.makedirs(partition_dir, exist_ok=True)
+
+    part_name = part_name or uuid.uuid4().hex
+    path = os.path.join(partition_dir, f"{part_name}.parquet")
+
+    # Files starting with '.' are ignored by readers, so a half written file is never picked up
+    tmp_path = os.path.join(partition_dir, f".{part_name}.{uuid.uuid4().hex}.tmp")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+    annotate(rows=len(df), bytes_written=os.path.getsize(path))
+
+    if replace:
+        for name in os.listdir(partition_dir):
+            if name.endswith(".parquet") and name != os.path.basename(path):
+                os.remove(os.path.join(partition_dir, name))
+
+    return path
+
+
+def _is_part_of(name, part_prefix):
+    # A series of parts is named <prefix>-<n>.parquet, a lone <prefix>.parquet is accepted as well
+    if not name.endswith(".parquet"):
+        return False
+    stem = name[:-len(".parquet")]
+    return stem == part_prefix or (stem.startswith(part_prefix + "-") and stem[len(part_prefix) + 1:].isdigit())
+
+
+def list_parts(entity, channel_id, part_prefix, root=DATA_DIR):
+    """Returns {fetch_date: [paths]} of the parts named part_prefix-<n> (or part_prefix), oldest date first."""
+    parts = {}
+    for fetch_date in _fetch_dates(channel_id, entity, root):
+        partition_dir = _partition_dir(channel_id, entity, fetch_date, root)
+        paths = sorted(os.path.join(partition_dir, name) for name in os.listdir(partition_dir)
+                       if _is_part_of(name, part_prefix))
+        if paths:
+            parts[fetch_date] = paths
+    return parts
+
+
+def delete_parts(entity, channel_id, part_prefix, fetch_date=None, keep=(), root=DATA_DIR):
+    """Deletes the parts named part_prefix-<n> (or part_prefix) of one fetch date, or of every date when None.
+
+    Paths in keep are left in place. Returns the number of deleted parts.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    deleted = 0
+    for date, paths in list_parts(entity, channel_id, part_prefix, root).items():
+        if fetch_date is not None and date != fetch_date:
+            continue
+        for path in paths:
+            if os.path.abspath(path) not in keep:
+                os.remove(path)
+                deleted += 1
+    return deleted
+
+
+@timed("read_parts")
+def read_parts(paths, columns=None):
+    """Reads the given Parquet parts into one dataframe, returns None if they hold no rows."""
+    if not paths:
+        return None
+    schema = pa.unify_schemas([pq.read_schema(path) for path in paths])
+    table = ds.dataset(list(paths), schema=schema, format="parquet").to_table(columns=columns)
+    if table.num_rows == 0:
+        return None
+    return table.to_pandas()
+
+
+@timed("read_dataset")
+def read_dataset(entity, channel_id=None, columns=None, filter=None, fetch_date="latest", root=DATA_DIR):
+    """Reads an entity with column projection and predicate pushdown, returns None if nothing is stored.
+
+    fetch_date can be a date string, "latest" (most recent partition of each channel) or None (every partition).
+    filter is a pyarrow.dataset expression, e.g. ds.field("video_id") == video_id.
+    """
+    if channel_id is None:
+        # Every channel: discover the whole store and prune partitions with the filter
+        if not os.path.isdir(root):
+            return None
+        source, partitioning = root, PARTITIONING
+        expression = ds.field("entity") == entity
+        if fetch_date == "latest":
+            latest = None
+            channel_ids = [name.split("=", 1)[1] for name in os.listdir(root) if name.startswith("channel_id=")]
+            for stored_channel_id in sorted(channel_ids):
+                fetch_dates = _fetch_dates(stored_channel_id, entity, root)
+                if fetch_dates:
+                    clause = (ds.field("channel_id") == stored_channel_id) & (ds.field("fetch_date") == fetch_dates[-1])
+                    latest = clause if latest is None else latest | clause
+            if latest is None:
+                return None
+            expression &= latest
+        elif fetch_date is not None:
+            expression &= ds.field("fetch_date") == fetch_date
+    else:
+        # One channel: only list the files below its entity directory
+        fetch_dates = _fetch_dates(channel_id, entity, root)
+        if not fetch_dates:
+            return None
+        if fetch_date == "latest":
+            fetch_date = fetch_dates[-1]
+        source = os.path.join(root, f"channel_id={channel_id}", f"entity={entity}")
+        partitioning = ds.partitioning(pa.schema([("fetch_date", pa.string())]), flavor="hive")
+        expression = ds.field("fetch_date") == fetch_date if fetch_date is not None else None
+
+    if filter is not None:
+        expression = filter if expression is None else expression & filter
+
+    dataset = ds.dataset(source, format="parquet", partitioning=partitioning)
+    # Parts written at different times may disagree on all-null columns, let pyarrow promote them
+    schema = pa.unify_schemas([pq.read_schema(path) for path in dataset.files] + [dataset.schema])
+    dataset = ds.dataset(source, schema=schema, format="parquet", partitioning=partitioning)
+
+    if columns is None:
+        columns = [name for name in schema.names if name not in PARTITION_FIELDS]
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    if table.num_rows == 0:
+        return None
+
+    return table.to_pandas()
@@ -0,0 +1,466 @@
+import collections
+import datetime
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+import httplib2
+import numpy as np
+
+import youtube_client
+
+########################################################################################################################
+#                                       OFFLINE YOUTUBE API STAND-IN
+########################################################################################################################
+# Serves channels, playlistItems, videos, commentThreads, comments and search responses for synthetic channels,
+# with the API's pagination, inline reply limit, ETags and error format, so every code path runs without network:
+#
+#     fake = FakeYouTube([SyntheticChannel(title="Bench", videos=10000, comments=500000)])
+#     with fake:
+#         getVideoComments("any key", fake.channels[0].video_ids[0])
+NEWEST_UPLOAD = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc)
+UPLOAD_INTERVAL = datetime.timedelta(hours=9)
+
+# commentThreads embeds at most this many replies per thread, the rest needs comments.list
+INLINE_REPLIES = 5
+
+# Default and maximum maxResults per resource
+PAGE_SIZES = {
+    "playlistItems": (5, 50),
+    "commentThreads": (20, 100),
+    "comments": (20, 100),
+    "search": (5, 50),
+}
+
+VOCABULARY = (
+    "great video love this awesome amazing thanks helpful best explained clearly brilliant useful nice cool "
+    "bad boring worst hate terrible wrong confusing slow annoying poor awful disappointing "
+    "physics chemistry maths exam lecture notes question answer teacher sir class chapter concept "
+    "today tomorrow please more again really very much so just also what when why how the a is it this that"
+).split()
+
+# Threads of this many recently used videos are kept in memory
+THREAD_CACHE_SIZE = 64
+
+
+def _timestamp(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class SyntheticChannel:
+    """Deterministic synthetic channel: videos with Zipf distributed comment counts and reply trees.
+
+    Comments of a video are generated on first request, so a channel with 500k comments costs little until its
+    comment threads are paged through.
+    """
+
+    def __init__(self, title="Synthetic Channel", videos=1000, comments=50000, reply_share=0.3, authors=None,
+                 seed=0, channel_id=None, handle=None):
+        digest = hashlib.sha1(f"{title}:{seed}".encode()).hexdigest()
+        self.title = title
+        self.id = channel_id or "UC" + digest[:22]
+        self.handle = handle or "@" + "".join(character for character in title.lower() if character.isalnum())
+        self.uploads_id = "UU" + self.id[2:]
+        self.reply_share = reply_share
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        weights = 1.0 / np.arange(1, videos + 1) ** 0.9
+        rng.shuffle(weights)
+        self.comment_counts = rng.multinomial(comments, weights / weights.sum()) if videos else np.zeros(0, int)
+        self.view_counts = (self.comment_counts * rng.uniform(50, 200, videos)).astype(int) + \
+            rng.integers(100, 1000, videos)
+        self.durations = rng.integers(60, 3 * 3600, videos)
+
+        # Video IDs are 11 characters like real ones and unique across channels
+        self.video_ids = [f"{digest[22:27]}{index:06d}" for index in range(videos)]
+        self.video_index = {video_id: index for index, video_id in enumerate(self.video_ids)}
+
+        tag_pool = [f"topic {number}" for number in range(max(20, videos // 5))] + ["physics", "maths", "exam"]
+        tag_weights = 1.0 / np.arange(1, len(tag_pool) + 1)
+        tag_weights /= tag_weights.sum()
+        self.tags = [list(dict.fromkeys(rng.choice(tag_pool, size=rng.integers(3, 9), p=tag_weights).tolist()))
+                     for _ in range(videos)]
+
+        self.authors = [f"viewer_{number}" for number in range(authors or max(50, comments // 20))]
+        author_weights = 1.0 / np.arange(1, len(self.authors) + 1) ** 0.7
+        self._author_weights = author_weights / author_weights.sum()
+
+        self._threads = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def video_count(self):
+        return len(self.video_ids)
+
+    @property
+    def comment_count(self):
+        return int(self.comment_counts.sum())
+
+    def published_at(self, index):
+        return NEWEST_UPLOAD - index * UPLOAD_INTERVAL
+
+    def channel_resource(self):
+        return {
+            "kind": "youtube#channel",
+            "id": self.id,
+            "snippet": {
+                "title": self.title,
+                "description": f"Synthetic channel with {self.video_count} videos",
+                "customUrl": self.handle,
+                "thumbnails": {size: {"url": f"https://example.invalid/{self.id}/{size}.jpg"}
+                               for size in ("default", "medium", "high")},
+            },
+            "contentDetails": {"relatedPlaylists": {"uploads": self.uploads_id}},
+            "statistics": {
+                "viewCount": str(int(self.view_counts.sum())),
+                "subscriberCount": str(int(self.view_counts.sum()) // 100),
+                "videoCount": str(self.video_count),
+            },
+        }
+
+    def _thumbnails(self, video_id):
+        return {size: {"url": f"https://example.invalid/vi/{video_id}/{size}.jpg"}
+                for size in ("default", "medium", "high", "standard")}
+
+    def playlist_item(self, index):
+        video_id = self.video_ids[index]
+        published = _timestamp(self.published_at(index))
+        return {
+            "kind": "youtube#playlistItem",
+            "id": f"{self.uploads_id}.{video_id}",
+            "snippet": {
+                "publishedAt": published,
+                "channelId": self.id,
+                "title": f"Lecture {self.video_count - index}: video {video_id}",
+                "thumbnails": self._thumbnails(video_id),
+                "position": index,
+                "resourceId": {"kind": "youtube#video", "videoId": video_id},
+            },
+            "contentDetails": {"videoId": video_id, "videoPublishedAt": published},
+        }
+
+    def video_resource(self, index):
+        video_id = self.video_ids[index]
+        minutes, seconds = divmod(int(self.durations[index]), 60)
+        hours, minutes = divmod(minutes, 60)
+        views = int(self.view_counts[index])
+        return {
+            "kind": "youtube#video",
+            "id": video_id,
+            "snippet": {
+                "publishedAt": _timestamp(self.published_at(index)),
+                "channelId": self.id,
+                "title": f"Lecture {self.video_count - index}: video {video_id}",
+                "description": "",
+                "thumbnails": self._thumbnails(video_id),
+                "channelTitle": self.title,
+                "tags": self.tags[index],
+            },
+            "contentDetails": {"duration": f"PT{hours}H{minutes}M{seconds}S" if hours else f"PT{minutes}M{seconds}S"},
+            "statistics": {
+                "viewCount": str(views),
+                "likeCount": str(views // 25),
+                "favoriteCount": "0",
+                "commentCount": str(int(self.comment_counts[index])),
+            },
+        }
+
+    def _comment(self, comment_id, author, text, likes, published, video_id, parent_id=None):
+        snippet = {
+            "videoId": video_id,
+            "textDisplay": text,
+            "textOriginal": text,
+            "authorDisplayName": author,
+            "likeCount": likes,
+            "publishedAt": published,
+            "updatedAt": published,
+        }
+        if parent_id is not None:
+            snippet["parentId"] = parent_id
+        return {"kind": "youtube#comment", "id": comment_id, "snippet": snippet}
+
+    def _generate_threads(self, index):
+        total = int(self.comment_counts[index])
+        video_id = self.video_ids[index]
+        rng = np.random.default_rng((self.seed, index))
+
+        thread_count = max(total - int(total * self.reply_share), 1 if total else 0)
+        reply_total = total - thread_count
+        reply_weights = rng.pareto(1.2, thread_count) + 0.1 if thread_count else np.zeros(0)
+        reply_counts = rng.multinomial(reply_total, reply_weights / reply_weights.sum()) if thread_count else []
+
+        # Texts, authors, likes and ages of every comment of the video, drawn in bulk
+        word_counts = rng.integers(4, 16, total)
+        words = rng.integers(0, len(VOCABULARY), (total, 16))
+        authors = rng.choice(len(self.authors), size=total, p=self._author_weights)
+        likes = rng.zipf(2.0, total) - 1
+        ages = np.sort(rng.integers(60, 60 * 24 * 3600, total))[::-1]
+        published = self.published_at(index)
+
+        def comment_fields(position):
+            text = " ".join(VOCABULARY[word] for word in words[position, :word_counts[position]])
+            moment = _timestamp(published + datetime.timedelta(seconds=int(ages[position])))
+            return self.authors[authors[position]], f"{text} #{position}", int(likes[position]), moment
+
+        threads = []
+        position = 0
+        for thread_number in range(thread_count):
+            thread_id = f"Ug{video_id}_{thread_number}"
+            author, text, like_count, moment = comment_fields(position)
+            position += 1
+
+            replies = []
+            for reply_number in range(int(reply_counts[thread_number])):
+                reply_author, reply_text, reply_likes, reply_moment = comment_fields(position)
+                position += 1
+                replies.append(self._comment(f"{thread_id}.{reply_number}", reply_author, reply_text, reply_likes,
+                                             reply_moment, video_id, parent_id=thread_id))
+
+            thread = {
+                "kind": "youtube#commentThread",
+                "id": thread_id,
+                "snippet": {
+                    "channelId": self.id,
+                    "videoId": video_id,
+                    "topLevelComment": self._comment(thread_id, author, text, like_count, moment, video_id),
+                    "canReply": True,
+                    "totalReplyCount": len(replies),
+                    "isPublic": True,
+                },
+            }
+            threads.append((thread, replies))
+        return threads
+
+    def comment_threads(self, index):
+        """Returns [(commentThread resource without replies, every reply)] of a video, newest thread first."""
+        with self._lock:
+            threads = self._threads.get(index)
+            if threads is not None:
+                self._threads.move_to_end(index)
+                return threads
+
+        threads = self._generate_threads(index)
+        with self._lock:
+            self._threads[index] = threads
+            while len(self._threads) > THREAD_CACHE_SIZE:
+                self._threads.popitem(last=False)
+        return threads
+
+    def iter_comment_threads(self, indexes=None):
+        """Yields commentThread resources with every reply embedded, for building comment frames without paging."""
+        for index in range(self.video_count) if indexes is None else indexes:
+            for thread, replies in self.comment_threads(index):
+                if replies:
+                    yield dict(thread, replies={"comments": replies})
+                else:
+                    yield thread
+
+
+class _ApiError(Exception):
+    def __init__(self, status, reason, message):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+class FakeYouTube:
+    """In-process stand-in for the YouTube Data API v3, installed as the transport of youtube_client.
+
+    latency adds a sleep per request, error_rate answers that share of requests with a 503 backendError.
+    """
+
+    def __init__(self, channels=(), latency=0.0, error_rate=0.0, seed=0):
+        self.channels = []
+        self.latency = latency
+        self.error_rate = error_rate
+
+        self._channels_by_id = {}
+        self._channels_by_handle = {}
+        self._channels_by_playlist = {}
+        self._videos = {}
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.bytes_served = 0
+
+        for channel in channels:
+            self.add_channel(channel)
+
+    def add_channel(self, channel):
+        self.channels.append(channel)
+        self._channels_by_id[channel.id] = channel
+        self._channels_by_handle[channel.handle.lower()] = channel
+        self._channels_by_playlist[channel.uploads_id] = channel
+        self._videos.update((video_id, (channel, index)) for index, video_id in enumerate(channel.video_ids))
+        return channel
+
+    def hide_video(self, video_id):
+        """Answers for a video as the API does once it is made private: listed in the playlist, unknown elsewhere."""
+        self._videos.pop(video_id, None)
+
+    def http(self):
+        """Returns a new httplib2.Http look-alike bound to this API."""
+        return FakeHttp(self)
+
+    def install(self):
+        youtube_client.set_transport(self.http)
+        return self
+
+    def uninstall(self):
+        youtube_client.set_transport(None)
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def _page_bounds(self, resource, params, total):
+        default_size, max_size = PAGE_SIZES[resource]
+        size = min(int(params.get("maxResults", default_size)), max_size)
+        start = int(params.get("pageToken") or 0)
+        end = min(start + size, total)
+        return start, end, (str(end) if end < total else None)
+
+    def _list_response(self, kind, items, next_page_token=None, total=None):
+        response = {"kind": kind, "items": items,
+                    "pageInfo": {"totalResults": len(items) if total is None else total,
+                                 "resultsPerPage": len(items)}}
+        if next_page_token is not None:
+            response["nextPageToken"] = next_page_token
+        return response
+
+    def _list_channels(self, params):
+        if "id" in params:
+            channels = [self._channels_by_id[channel_id] for channel_id in params["id"].split(",")
+                        if channel_id in self._channels_by_id]
+        elif "forHandle" in params:
+            handle = params["forHandle"].lower()
+            channel = self._channels_by_handle.get(handle if handle.startswith("@") else "@" + handle)
+            channels = [channel] if channel is not None else []
+        elif "forUsername" in params:
+            channels = [channel for channel in self.channels
+                        if channel.handle[1:] == params["forUsername"].lower()]
+        else:
+            raise _ApiError(400, "missingRequiredParameter", "No filter selected.")
+        return self._list_response("youtube#channelListResponse",
+                                   [channel.channel_resource() for channel in channels])
+
+    def _list_playlist_items(self, params):
+        channel = self._channels_by_playlist.get(params.get("playlistId"))
+        if channel is None:
+            raise _ApiError(404, "playlistNotFound", "The playlist identified with the request's playlistId "
+                                                     "parameter cannot be found.")
+        start, end, next_page_token = self._page_bounds("playlistItems", params, channel.video_count)
+        return self._list_response("youtube#playlistItemListResponse",
+                                   [channel.playlist_item(index) for index in range(start, end)],
+                                   next_page_token, channel.video_count)
+
+    def _list_videos(self, params):
+        items = []
+        for video_id in params.get("id", "").split(",")[:50]:
+            if video_id in self._videos:
+                channel, index = self._videos[video_id]
+                items.append(channel.video_resource(index))
+        return self._list_response("youtube#videoListResponse", items)
+
+    def _list_comment_threads(self, params):
+        if params.get("videoId") not in self._videos:
+            raise _ApiError(404, "videoNotFound", "The video identified by the videoId parameter could not be found.")
+        channel, index = self._videos[params["videoId"]]
+        threads = channel.comment_threads(index)
+        start, end, next_page_token = self._page_bounds("commentThreads", params, len(threads))
+
+        with_replies = "replies" in params.get("part", "")
+        items = []
+        for thread, replies in threads[start:end]:
+            if with_replies and replies:
+                thread = dict(thread, replies={"comments": replies[:INLINE_REPLIES]})
+            items.append(thread)
+        return self._list_response("youtube#commentThreadListResponse", items, next_page_token, len(threads))
+
+    def _list_comments(self, params):
+        parent_id = params.get("parentId", "")
+        video_id, _, thread_number = parent_id[2:].partition("_")
+        if video_id not in self._videos or not thread_number.isdigit():
+            raise _ApiError(404, "commentNotFound", "The comment identified by the parentId parameter could not "
+                                                    "be found.")
+        channel, index = self._videos[video_id]
+        threads = channel.comment_threads(index)
+        if int(thread_number) >= len(threads):
+            raise _ApiError(404, "commentNotFound", "The comment identified by the parentId parameter could not "
+                                                    "be found.")
+        replies = threads[int(thread_number)][1]
+        start, end, next_page_token = self._page_bounds("comments", params, len(replies))
+        return self._list_response("youtube#commentListResponse", replies[start:end], next_page_token, len(replies))
+
+    def _list_search(self, params):
+        query = params.get("q", "").lower()
+        channels = [channel for channel in self.channels if query and query in channel.title.lower()]
+        start, end, next_page_token = self._page_bounds("search", params, len(channels))
+        items = [{"kind": "youtube#searchResult",
+                  "id": {"kind": "youtube#channel", "channelId": channel.id},
+                  "snippet": {"channelId": channel.id, "title": channel.title, "description": ""}}
+                 for channel in channels[start:end]]
+        return self._list_response("youtube#searchListResponse", items, next_page_token, len(channels))
+
+    def handle(self, uri, headers=None):
+        """Answers one API request, returning (status, body bytes)."""
+        url = urllib.parse.urlparse(uri)
+        resource = url.path.rstrip("/").rsplit("/", 1)[-1]
+        params = dict(urllib.parse.parse_qsl(url.query))
+        handlers = {
+            "channels": self._list_channels,
+            "playlistItems": self._list_playlist_items,
+            "videos": self._list_videos,
+            "commentThreads": self._list_comment_threads,
+            "comments": self._list_comments,
+            "search": self._list_search,
+        }
+
+        with self._lock:
+            self.requests[resource] += 1
+            failed = self.error_rate and self._random.random() < self.error_rate
+
+        try:
+            if resource not in handlers:
+                raise _ApiError(404, "notFound", f"Unknown resource {resource}.")
+            if failed:
+                raise _ApiError(503, "backendError", "Backend Error")
+            body = handlers[resource](params)
+        except _ApiError as error:
+            body = {"error": {"code": error.status, "message": str(error),
+                              "errors": [{"message": str(error), "domain": "youtube", "reason": error.reason}]}}
+            return error.status, json.dumps(body).encode()
+
+        content = json.dumps(body).encode()
+        etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+        if headers and headers.get("If-None-Match", headers.get("if-none-match")) == etag:
+            return 304, b""
+
+        body["etag"] = etag
+        content = json.dumps(body).encode()
+        with self._lock:
+            self.bytes_served += len(content)
+        return 200, content
+
+
+class FakeHttp:
+    """httplib2.Http look-alike that answers from a FakeYouTube instead of the network."""
+
+    def __init__(self, api):
+        self.api = api
+        self.connections = {}
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        if self.api.latency:
+            time.sleep(self.api.latency)
+        status, content = self.api.handle(uri, headers)
+        self.connections.setdefault("fake", None)
+        response = httplib2.Response({"status": str(status), "content-type": "application/json; charset=UTF-8"})
+        return response, content
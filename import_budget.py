@@ -0,0 +1,129 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+########################################################################################################################
+#                                       PAGE IMPORT TIME BUDGET
+########################################################################################################################
+# Usage: python import_budget.py [--runs 3] [--top 8] [--json import_budget.json]
+#
+# Runs the module level imports of every page in a fresh interpreter under "python -X importtime" and compares the
+# total against the page's budget. Only imports count, the page body needs a Streamlit session and is not run.
+# Files opened or SQLite databases connected to while importing are reported too, imports must not do I/O. A page
+# with an import that fails (e.g. a package that is not installed) fails the check as well.
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds of module imports allowed per page before the first widget can render
+PAGE_BUDGETS = {
+    "Home.py": 2.0,
+    os.path.join("pages", "🎥_Video_Data.py"): 1.8,
+    os.path.join("pages", "📅_Post_Scheduler.py"): 1.6,
+}
+
+# Runs inside the measured interpreter: every import of the page, guarded so one missing package does not hide
+# the cost of the others, with an audit hook recording the data files the imports touch
+_PROBE = """
+import json, os, sys
+_root = {root!r}
+_io = []
+def _audit(event, args):
+    if event == "open" and isinstance(args[0], str):
+        path = os.path.abspath(args[0])
+        if path.startswith(_root) and not path.endswith((".py", ".pyc")) and "__pycache__" not in path:
+            _io.append(path)
+    elif event == "sqlite3.connect":
+        _io.append(str(args[0]))
+sys.addaudithook(_audit)
+sys.path.insert(0, _root)
+_missing = []
+{imports}
+print(json.dumps({{"missing": _missing, "io": sorted(set(_io))}}))
+"""
+
+
+def page_imports(path):
+    """Returns the source of every module level import statement of a page."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def _parse_importtime(stderr):
+    # Lines look like "import time:  self [us] | cumulative | package", nesting is shown by indenting the name
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_page(page, python=sys.executable):
+    """Returns the import seconds, heaviest top level imports, missing packages and import time I/O of a page."""
+    statements = page_imports(os.path.join(ROOT, page))
+    guarded = "\n".join(f"try:\n    {statement}\nexcept ImportError as error:\n    _missing.append(error.name)"
+                        for statement in statements)
+    code = _PROBE.format(root=ROOT, imports=guarded)
+
+    baseline = subprocess.run([python, "-X", "importtime", "-c", _PROBE.format(root=ROOT, imports="")],
+                              capture_output=True, text=True, cwd=ROOT)
+    startup = {name.strip() for name, _, _ in _parse_importtime(baseline.stderr)}
+
+    result = subprocess.run([python, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {page} failed:\n{result.stderr[-2000:]}")
+
+    # Top level imports are the unindented names, anything the bare interpreter already loads is not the page's
+    top_level = [(name, cumulative) for name, _, cumulative in _parse_importtime(result.stderr)
+                 if not name.startswith("  ") and name.strip() not in startup]
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        "page": page,
+        "seconds": round(sum(cumulative for _, cumulative in top_level) / 1e6, 4),
+        "heaviest": sorted(((name.strip(), round(cumulative / 1e6, 4)) for name, cumulative in top_level),
+                           key=lambda item: item[1], reverse=True),
+        "missing": probe["missing"],
+        "io": [os.path.relpath(path, ROOT) if path.startswith(ROOT) else path for path in probe["io"]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the module import time of every page against its budget.")
+    parser.add_argument("--runs", type=int, default=3, help="cold interpreter runs per page, the fastest counts")
+    parser.add_argument("--top", type=int, default=8, help="heaviest imports listed per page")
+    parser.add_argument("--json", help="where to write the measurements as JSON")
+    args = parser.parse_args(argv)
+
+    report = []
+    failed = False
+    for page, budget in PAGE_BUDGETS.items():
+        measurement = min((measure_page(page) for _ in range(max(args.runs, 1))), key=lambda m: m["seconds"])
+        measurement["budget"] = budget
+        over = measurement["seconds"] > budget
+        # A page that could not import everything has not been measured, so it cannot pass its budget
+        incomplete = bool(measurement["missing"])
+        failed |= over or incomplete or bool(measurement["io"])
+        report.append(measurement)
+
+        status = "OVER BUDGET" if over else "INCOMPLETE" if incomplete else "ok"
+        print(f"{page:<30} {measurement['seconds']:7.3f}s / {budget:.1f}s  {status}")
+        for name, seconds in measurement["heaviest"][:args.top]:
+            print(f"    {name:<40} {seconds:7.3f}s")
+        if measurement["missing"]:
+            print(f"    not installed, not measured: {', '.join(sorted(set(measurement['missing'])))}")
+        for path in measurement["io"]:
+            print(f"    I/O at import: {path}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from channelDataExtraction import getChannelData
+from channel_resolver import resolve_channel
+from channel_sync import syncChannel
+from comment_harvester import harvest_channel_comments
+from dataset_store import DATA_DIR, write_dataset
+from request_scheduler import PRIORITY_BACKGROUND, QuotaExceededError, get_scheduler, request_priority
+from youtube_client import client_stats
+
+########################################################################################################################
+#                                       MULTI CHANNEL INGESTION
+########################################################################################################################
+# Usage: python ingest.py channels.txt [--workers 8] [--comments] [--quota-budget 5000]
+#
+# channels.txt holds one channel name, @handle, channel ID or channel URL per line, '#' starts a comment.
+CHECKPOINT_DIR = os.path.join(".cache", "ingest")
+
+STAGES = ["channel", "videos", "comments"]
+
+
+class RunBudget:
+    """Quota units a run may spend, measured on the shared request scheduler.
+
+    Every comment harvest of the run takes its units from this one object before each request (see
+    comment_harvester.QuotaBudget). Units granted to requests that have not been answered yet count as spent,
+    so parallel channels can never spend more than the budget between them.
+    """
+
+    def __init__(self, units):
+        self.units = units
+        self._start = get_scheduler().stats()["quota_used"]
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def used(self):
+        return get_scheduler().stats()["quota_used"] - self._start
+
+    def exhausted(self):
+        with self._lock:
+            return self.units is not None and self.used + self._in_flight >= self.units
+
+    def spend(self, cost):
+        """Grants cost units to a request about to be made, False when the run cannot afford it."""
+        with self._lock:
+            if self.units is not None and self.used + self._in_flight + cost > self.units:
+                return False
+            self._in_flight += cost
+            return True
+
+    def settle(self, cost):
+        """Releases units granted by spend once their request was answered, the scheduler counts them from then on."""
+        with self._lock:
+            self._in_flight -= cost
+
+
+def read_channel_list(path):
+    """Returns the channel references listed in a file, skipping blank lines, comments and duplicates."""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line))
+
+
+def _checkpoint_path(channel_id):
+    return os.path.join(CHECKPOINT_DIR, f"{channel_id}.json")
+
+
+def _load_checkpoint(channel_id, fetch_date, resume):
+    path = _checkpoint_path(channel_id)
+    if resume and os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        # Stages finished on an earlier day are ingested again
+        if checkpoint["fetch_date"] == fetch_date:
+            return checkpoint
+    return {"fetch_date": fetch_date, "completed": []}
+
+
+def _save_checkpoint(channel_id, checkpoint):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = _checkpoint_path(channel_id)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def _stored_bytes(channel_id, root=DATA_DIR):
+    total = 0
+    for directory, _, files in os.walk(os.path.join(root, f"channel_id={channel_id}")):
+        total += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+    return total
+
+
+def ingest_channel(api_key, reference, budget, comments=False, resume=True):
+    """Ingests one channel into the dataset store, skipping stages a checkpoint marks as done today."""
+    start = time.perf_counter()
+    result = {"channel": reference, "channel_id": None, "status": "done", "videos": 0, "comments": 0}
+
+    with request_priority(PRIORITY_BACKGROUND):
+        try:
+            channel_id = resolve_channel(api_key, reference)
+            if channel_id is None:
+                result["status"] = "not found"
+                result["seconds"] = time.perf_counter() - start
+                return result
+            result["channel_id"] = channel_id
+
+            checkpoint = _load_checkpoint(channel_id, datetime.date.today().isoformat(), resume)
+            stages = STAGES if comments else STAGES[:-1]
+
+            for stage in stages:
+                if stage in checkpoint["completed"]:
+                    continue
+                if budget.exhausted():
+                    result["status"] = "pending"
+                    break
+
+                if stage == "channel":
+                    channel_details = getChannelData(api_key, channel_id)
+                    if channel_details is None:
+                        result["status"] = "not found"
+                        break
+                    write_dataset(pd.DataFrame([channel_details]), channel_id, "channel", part_name="snapshot",
+                                  replace=True)
+                    checkpoint["uploads"] = channel_details["uploads"]
+
+                elif stage == "videos":
+                    videos, stats_df = syncChannel(api_key, channel_id, checkpoint["uploads"])
+                    checkpoint["video_ids"] = [video["id"] for video in videos if video["id"] is not None]
+                    result["videos"] = len(stats_df)
+
+                elif stage == "comments":
+                    # Every channel's harvest draws from the run budget itself, not from a copy of what is left,
+                    # and --restart starts the harvester over instead of resuming its per-video checkpoint
+                    harvest = harvest_channel_comments(api_key, channel_id, checkpoint["video_ids"],
+                                                       quota_budget=float("inf"), resume=resume,
+                                                       shared_budget=budget)
+                    result["comments"] = harvest["comments"]
+                    # The harvester keeps its own per-video checkpoint, the stage is done once nothing is left
+                    if harvest["remaining"] or harvest["failed"]:
+                        result["status"] = "pending"
+                        break
+
+                checkpoint["completed"].append(stage)
+                _save_checkpoint(channel_id, checkpoint)
+
+        except QuotaExceededError:
+            result["status"] = "pending"
+        except Exception as error:
+            result["status"] = f"failed: {error}"
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def ingest_channels(api_key, references, max_workers=8, comments=False, quota_budget=None, resume=True):
+    """Ingests many channels in parallel under one quota budget and returns the per-channel results and a summary.
+
+    Workers are threads: ingestion waits on the network, and threads share the process wide request scheduler,
+    so the quota bucket and the priorities hold across every channel. Rerunning the same list resumes where the
+    last run stopped.
+    """
+    budget = RunBudget(quota_budget)
+    start_stats = client_stats()
+    start = time.perf_counter()
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(ingest_channel, api_key, reference, budget, comments, resume)
+                   for reference in references]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"{result['channel']}: {result['status']} ({result['videos']} videos, {result['comments']} "
+                  f"comments, {result['seconds']:.1f}s)")
+
+    elapsed = time.perf_counter() - start
+    scheduler_stats = get_scheduler().stats()
+    end_stats = client_stats()
+    done = sum(result["status"] == "done" for result in results)
+
+    summary = {
+        "channels": len(references),
+        "done": done,
+        "pending": sum(result["status"] == "pending" for result in results),
+        "failed": sum(result["status"] not in ("done", "pending") for result in results),
+        "seconds": elapsed,
+        "channels_per_minute": done / elapsed * 60 if elapsed else 0.0,
+        "api_calls": (end_stats["cold_calls"] + end_stats["warm_calls"]
+                      - start_stats["cold_calls"] - start_stats["warm_calls"]),
+        "quota_used": budget.used,
+        "remaining_quota": scheduler_stats["remaining_quota"],
+        "throttled_requests": scheduler_stats["throttled_requests"],
+        "retries": scheduler_stats["retries"],
+        "response_bytes": end_stats["response_bytes"] - start_stats["response_bytes"],
+        "stored_bytes": sum(_stored_bytes(result["channel_id"]) for result in results if result["channel_id"]),
+    }
+    return results, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest many YouTube channels into the local dataset store.")
+    parser.add_argument("channels", help="file with one channel name, @handle, ID or URL per line")
+    parser.add_argument("--api-key", default=os.environ.get("YOUTUBE_API_KEY"),
+                        help="YouTube Data API key (defaults to $YOUTUBE_API_KEY)")
+    parser.add_argument("--workers", type=int, default=8, help="channels ingested in parallel")
+    parser.add_argument("--comments", action="store_true", help="also harvest the comments of every video")
+    parser.add_argument("--quota-budget", type=int, default=None, help="quota units this run may spend")
+    parser.add_argument("--restart", action="store_true", help="ignore today's checkpoints and start over")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an API key is required, pass --api-key or set YOUTUBE_API_KEY")
+
+    references = read_channel_list(args.channels)
+    _, summary = ingest_channels(args.api_key, references, max_workers=args.workers, comments=args.comments,
+                                 quota_budget=args.quota_budget, resume=not args.restart)
+
+    print(f"\n{summary['done']}/{summary['channels']} channels in {summary['seconds']:.1f}s "
+          f"({summary['channels_per_minute']:.1f} channels/min), {summary['pending']} pending, "
+          f"{summary['failed']} failed")
+    print(f"{summary['api_calls']} API calls, {summary['quota_used']} quota units "
+          f"({summary['remaining_quota']} left), {summary['throttled_requests']} throttled, "
+          f"{summary['retries']} retries")
+    print(f"{summary['response_bytes'] / 1e6:.1f} MB downloaded, {summary['stored_bytes'] / 1e6:.1f} MB stored")
+
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
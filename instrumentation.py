@@ -0,0 +1,255 @@
+import collections
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+########################################################################################################################
+#                                       PIPELINE INSTRUMENTATION
+########################################################################################################################
+# Spans time pipeline stages and API calls, counters track cache hits and misses. Everything is process wide, so
+# the numbers cover every Streamlit session and thread since the server started.
+
+# Finished spans kept for the recent spans view and the JSON export
+RECENT_SPANS = 2000
+
+# Every finished span is appended to this JSON lines file when set
+SPAN_LOG_PATH = os.environ.get("YTDASH_SPAN_LOG")
+
+_lock = threading.Lock()
+_recent = collections.deque(maxlen=RECENT_SPANS)
+_stages = collections.defaultdict(lambda: {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0})
+_api = collections.defaultdict(lambda: {"calls": 0, "errors": 0, "seconds": 0.0, "bytes": 0, "quota_units": 0})
+_caches = collections.defaultdict(int)
+_span_ids = itertools.count(1)
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span(dict):
+    """Attributes of a running span, set with span["key"] = value or annotate()."""
+
+    def __init__(self, name, kind, parent, **attributes):
+        super().__init__(attributes)
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.id = next(_span_ids)
+
+    def add(self, key, amount):
+        self[key] = self.get(key, 0) + amount
+
+
+def _finish(current, start, seconds, error):
+    record = {"id": current.id, "parent": current.parent.id if current.parent is not None else None,
+              "name": current.name, "kind": current.kind, "start": start, "seconds": seconds,
+              "thread": threading.current_thread().name, "error": error, **current}
+
+    with _lock:
+        _recent.append(record)
+        if current.kind == "api":
+            totals = _api[current.get("resource", current.name)]
+            totals["bytes"] += current.get("bytes", 0)
+            totals["quota_units"] += current.get("quota_units", 0)
+
+            # Stages show the pages, bytes and quota of every API call made inside them
+            ancestor = current.parent
+            while ancestor is not None:
+                ancestor.add("api_calls", 1)
+                ancestor.add("bytes", current.get("bytes", 0))
+                ancestor.add("quota_units", current.get("quota_units", 0))
+                ancestor = ancestor.parent
+        else:
+            totals = _stages[current.name]
+            totals["max_seconds"] = max(totals["max_seconds"], seconds)
+        totals["calls"] += 1
+        totals["seconds"] += seconds
+        totals["errors"] += error is not None
+
+        if SPAN_LOG_PATH:
+            with open(SPAN_LOG_PATH, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextlib.contextmanager
+def span(name, kind="stage", **attributes):
+    """Times the block as a span nested under the caller's current span and yields its attributes."""
+    current = Span(name, kind, _current.get(), **attributes)
+    token = _current.set(current)
+    start = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as exception:
+        status = getattr(getattr(exception, "resp", None), "status", None)
+        if status is not None:
+            current["status"] = status
+        # Not modified answers to ETag revalidation are a success
+        if status != 304:
+            error = f"{type(exception).__name__}" + (f" {status}" if status is not None else "")
+        raise
+    finally:
+        _current.reset(token)
+        _finish(current, start, time.perf_counter() - started, error)
+
+
+def timed(name):
+    """Decorator recording every call of a function as a stage span."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attributes):
+    """Adds numbers to (or sets other values on) the attributes of the caller's current span, if any."""
+    current = _current.get()
+    if current is None:
+        return
+    for key, value in attributes.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            current.add(key, value)
+        else:
+            current[key] = value
+
+
+def count_cache(cache, result, amount=1, resource=None):
+    """Counts cache lookups by cache name, result (hits, misses, revalidated) and optionally resource."""
+    with _lock:
+        _caches[(cache, result, resource)] += amount
+
+
+def reset():
+    """Clears every span and counter."""
+    with _lock:
+        _recent.clear()
+        _stages.clear()
+        _api.clear()
+        _caches.clear()
+
+
+def snapshot():
+    """Returns the stage, API call and cache totals plus the recent spans as plain data."""
+    with _lock:
+        return {
+            "stages": {name: dict(totals) for name, totals in _stages.items()},
+            "api": {resource: dict(totals) for resource, totals in _api.items()},
+            "caches": [{"cache": cache, "result": result, "resource": resource, "count": count}
+                       for (cache, result, resource), count in _caches.items()],
+            "recent_spans": list(_recent),
+        }
+
+
+def export_json(path=None):
+    """Returns the snapshot as JSON, also writing it to path when given."""
+    text = json.dumps(snapshot(), default=str, indent=2)
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """Returns the totals in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_label(label)}"' for key, label in labels.items() if label is not None)
+            lines.append(f"{name}{{{label_text}}} {value}")
+
+    stages = sorted(data["stages"].items())
+    metric("ytdash_stage_calls_total", "counter", "Pipeline stage runs.",
+           [({"stage": name}, totals["calls"]) for name, totals in stages])
+    metric("ytdash_stage_errors_total", "counter", "Pipeline stage runs that raised.",
+           [({"stage": name}, totals["errors"]) for name, totals in stages])
+    metric("ytdash_stage_seconds_total", "counter", "Time spent in pipeline stages.",
+           [({"stage": name}, round(totals["seconds"], 6)) for name, totals in stages])
+
+    api = sorted(data["api"].items())
+    metric("ytdash_api_calls_total", "counter", "YouTube API requests (pages) sent.",
+           [({"resource": name}, totals["calls"]) for name, totals in api])
+    metric("ytdash_api_errors_total", "counter", "YouTube API requests that failed.",
+           [({"resource": name}, totals["errors"]) for name, totals in api])
+    metric("ytdash_api_seconds_total", "counter", "Latency of YouTube API requests.",
+           [({"resource": name}, round(totals["seconds"], 6)) for name, totals in api])
+    metric("ytdash_api_response_bytes_total", "counter", "Bytes of YouTube API responses.",
+           [({"resource": name}, totals["bytes"]) for name, totals in api])
+    metric("ytdash_api_quota_units_total", "counter", "YouTube API quota units spent.",
+           [({"resource": name}, totals["quota_units"]) for name, totals in api])
+
+    metric("ytdash_cache_lookups_total", "counter", "Cache lookups by result.",
+           [({"cache": entry["cache"], "result": entry["result"], "resource": entry["resource"]}, entry["count"])
+            for entry in sorted(data["caches"], key=lambda entry: (entry["cache"], entry["result"],
+                                                                    entry["resource"] or ""))])
+
+    return "\n".join(lines) + "\n"
+
+
+def render_performance_panel(frames=None):
+    """Shows a collapsed "Performance" expander with the totals (and the memory use of frames) in the sidebar."""
+    import pandas as pd
+    import streamlit as st
+
+    from compact_frames import memory_report
+    from request_scheduler import get_scheduler
+
+    data = snapshot()
+    with st.sidebar.expander("Performance", expanded=False):
+        quota = get_scheduler().stats()
+        st.caption(f"Quota left: {quota['remaining_quota']} units · used {quota['quota_used']} · "
+                   f"{quota['throttled_requests']} throttled · {quota['retries']} retries")
+
+        if data["stages"]:
+            stages = pd.DataFrame.from_dict(data["stages"], orient="index")
+            stages["avg_seconds"] = stages["seconds"] / stages["calls"]
+            st.markdown("**Stages**")
+            st.dataframe(stages[["calls", "seconds", "avg_seconds", "max_seconds", "errors"]]
+                         .sort_values("seconds", ascending=False).round(3))
+
+        if data["api"]:
+            api = pd.DataFrame.from_dict(data["api"], orient="index")
+            api["avg_ms"] = api["seconds"] / api["calls"] * 1000
+            st.markdown("**API calls**")
+            st.dataframe(api[["calls", "avg_ms", "bytes", "quota_units", "errors"]]
+                         .sort_values("calls", ascending=False).round(1))
+
+        if data["caches"]:
+            caches = pd.DataFrame(data["caches"]).pivot_table(index="cache", columns="result", values="count",
+                                                              aggfunc="sum", fill_value=0)
+            st.markdown("**Caches**")
+            st.dataframe(caches)
+
+        if frames:
+            report = memory_report(frames)
+            if len(report):
+                st.markdown("**Memory**")
+                st.dataframe(report.assign(MB=report['bytes'] / 1e6).set_index('frame')
+                             [['rows', 'MB', 'bytes_per_row']].round(2))
+
+        # Only shown once a page has loaded the shared datasets, the panel never imports the pipeline itself
+        shared_datasets = sys.modules.get("shared_datasets")
+        if shared_datasets is not None:
+            datasets = shared_datasets.dataset_stats()
+            if len(datasets):
+                st.markdown("**Shared datasets**")
+                st.dataframe(datasets.assign(MB=datasets['bytes'] / 1e6).drop(columns='bytes').round(2))
+
+        st.download_button("JSON log", export_json(), file_name="performance.json", mime="application/json")
+        st.download_button("Prometheus metrics", prometheus_text(), file_name="metrics.prom", mime="text/plain")
@@ -2,15 +2,17 @@ from datetime import datetime
 
 import numpy
 import streamlit as st
-import plotly.express as px
+
 import plotly.graph_objects as go
 from streamlit_extras.chart_container import chart_container
-from textblob import TextBlob
 
 from streamlit_extras.metric_cards import style_metric_cards
 from streamlit_extras.switch_page_button import switch_page
 
 from analyze_comments import analyze_comments
+from comment_sentiment import add_sentiment
+from comment_sync import get_video_comments, sync_error
+from instrumentation import render_performance_panel
 from channelVideoDataExtraction import *
 
 
@@ -18,8 +20,14 @@ from channelVideoDataExtraction import *
 #                                       FUNCTIONS
 ########################################################################################################################
 def get_comments():
-    comment_data = getVideoComments(api_key, video_id)
-    return comment_data
+    # Stored comments show right away, new ones are fetched in the background once they are stale
+    comment_data, comments_are_current = get_video_comments(api_key, st.session_state.CHANNEL_ID, video_id)
+    return comment_data, comments_are_current
+
+
+def format_count(count):
+    # Hidden like counts and disabled comments are missing values, not zero
+    return "n/a" if pd.isna(count) else "{:,}".format(count)
 
 
 def tag_list(tags):
@@ -47,31 +55,33 @@ st.set_page_config(page_title="Video Statistics",
 ########################################################################################################################
 #                                       VIDEO STATISTICAL DATA CONFIGURATION
 ########################################################################################################################
-if st.session_state['video_id'] is None:
+# ID lookup on the catalog's hash index, None when the video is no longer in the session's dataset
+video_row = None
+if st.session_state.get('video_id') is not None and 'video_catalog' in st.session_state:
+    video_row = st.session_state.video_catalog.get(st.session_state['video_id'])
+
+if video_row is None:
     st.error("No Video Has been selected to view statistics. Please select a video from the home page.")
     if st.button("Go Home"):
         switch_page("Home")
 else:
     api_key = st.session_state.api_key
-    all_video_data = st.session_state.all_video_df
     video_id = st.session_state['video_id']
 
-    video_row = all_video_data[all_video_data['id'] == video_id]
-
-    title = video_row['title'].values[0]
-    image_url = video_row['thumbnail'].values[0]
-    view_count = video_row['view_count'].values[0]
-    like_count = video_row['like_count'].values[0]
-    favourite_count = video_row['favorite_count'].values[0]
-    comment_count = video_row['comment_count'].values[0]
-    duration = round(video_row['duration_minutes'].values[0], 2)
-    publish_date = video_row['published_date'].values[0]
-    tags = video_row['tags'].values[0]
+    title = video_row['title']
+    image_url = video_row['thumbnail']
+    view_count = video_row['view_count']
+    like_count = video_row['like_count']
+    favourite_count = video_row['favorite_count']
+    comment_count = video_row['comment_count']
+    duration = round(video_row['duration_minutes'], 2)
+    publish_date = video_row['published_date'].strftime('%Y-%m-%d %I:%M %p')
+    tags = st.session_state.video_catalog.tags_of(video_id)
 
     # Format view count and subscriber count with commas
-    view_count_formatted = "{:,}".format(view_count)
-    like_count_formatted = "{:,}".format(like_count)
-    comment_count_formatted = "{:,}".format(comment_count)
+    view_count_formatted = format_count(view_count)
+    like_count_formatted = format_count(like_count)
+    comment_count_formatted = format_count(comment_count)
 
     st.subheader(title, divider="green")
 
@@ -122,7 +132,15 @@ else:
     st.subheader("Top 10 Comments", divider="green")
 
     with st.spinner("Getting Comment Data...."):
-        comment_data = get_comments()
+        comment_data, comments_are_current = get_comments()
+        if not comments_are_current:
+            comments_error = sync_error(st.session_state.CHANNEL_ID, video_id)
+            if comments_error is not None:
+                st.caption(f"The last attempt to fetch new comments failed ({comments_error}), showing the stored "
+                           "comments. It is retried in a few minutes.")
+            else:
+                st.caption("Showing the stored comments while new comments are fetched. "
+                           "Refresh the page to see them once they are ready.")
         top_10_comments_df = comment_data.head(10)
         st.table(top_10_comments_df)
 
@@ -168,18 +186,8 @@ else:
         st.plotly_chart(fig, use_container_width=True)
 
     with col2:
-        def get_sentiment(text):
-            analysis = TextBlob(text)
-            # Classify the polarity of the text
-            if analysis.sentiment.polarity > 0:
-                return 'Positive'
-            elif analysis.sentiment.polarity == 0:
-                return 'Neutral'
-            else:
-                return 'Negative'
-
-
-        comment_data['Sentiment'] = comment_data['comment_text'].apply(get_sentiment)
+        # Scores are cached per comment, only newly fetched comments are run through TextBlob
+        comment_data = add_sentiment(comment_data)
         sentiment_counts = comment_data['Sentiment'].value_counts()
 
         with chart_container(comment_data):
@@ -240,5 +248,7 @@ else:
         with col2:
             # Display the communities visualization with a brief title/description
             st.subheader("👥 Community Visualization")
-            st.caption(f"Communities in Sample of 500 Nodes: {no_of_communities} detected")
+            st.caption(f"{no_of_communities} communities detected, showing the 500 most connected authors")
             st.pyplot(fig_communities)
+
+    render_performance_panel({"all_video_df": st.session_state.all_video_df, "comments": comment_data})
@@ -1,6 +1,11 @@
+import os
+
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+from streamlit_extras.switch_page_button import switch_page
+
+from dataset_store import read_dataset, write_dataset
 
 
 ########################################################################################################################
@@ -14,19 +19,40 @@ def suggest_next_publish_date(video_data):
     return df_sorted['published_date'].iloc[0] + average_diff
 
 
+# Posts scheduled before the dataset store were kept in one Excel file for every channel
+LEGACY_POSTS_FILE = 'scheduled_posts.xlsx'
+IMPORTED_POSTS_FILE = 'scheduled_posts.imported.xlsx'
+POST_COLUMNS = ["title", "description", "date", "time"]
+
+
+def load_scheduled_posts(channel_id):
+    # The first channel opened without stored posts takes over the Excel posts, the file is then renamed so
+    # they are imported only once and the original stays available
+    posts = read_dataset("scheduled_posts", channel_id)
+    if posts is not None or not os.path.exists(LEGACY_POSTS_FILE):
+        return posts
+
+    legacy = pd.read_excel(LEGACY_POSTS_FILE).reindex(columns=POST_COLUMNS)
+    if legacy.empty:
+        return None
+
+    legacy['date'] = pd.to_datetime(legacy['date']).dt.date
+    legacy['time'] = pd.to_datetime(legacy['time'].astype(str), format='mixed').dt.time
+    write_dataset(legacy, channel_id, "scheduled_posts", part_name="posts", replace=True)
+    os.replace(LEGACY_POSTS_FILE, IMPORTED_POSTS_FILE)
+    return legacy
+
+
 ########################################################################################################################
 #                                       SCHEDULED POST DB CONFIG
 ########################################################################################################################
-# Excel filepath
-EXCEL_DB = 'scheduled_posts.xlsx'
+# Scheduled posts are kept per channel in the dataset store
+channel_id = st.session_state.get('CHANNEL_ID')
 
-# Try to read the Excel file, if it doesn't exist, create a new DataFrame
-try:
-    df = pd.read_excel(EXCEL_DB)
-except FileNotFoundError:
-    columns = ["title", "description", "date", "time"]
-    df = pd.DataFrame(columns=columns)
-    df.to_excel(EXCEL_DB, index=False)  # Create the Excel file with the columns
+# Try to read the stored posts, if there are none, create a new DataFrame
+df = load_scheduled_posts(channel_id) if channel_id else None
+if df is None:
+    df = pd.DataFrame(columns=POST_COLUMNS)
 
 ########################################################################################################################
 #                                       PAGE CONFIGURATION
@@ -35,8 +61,19 @@ st.set_page_config(page_title="Content Publishing Calender",
                    page_icon="📊",
                    layout="wide")
 
-# Load video data
-video_data = pd.read_excel('all_video_Data.xlsx')  # Replace with your video data file path
+if channel_id is None:
+    st.error("No Channel has been selected yet. Please select a channel from the home page.")
+    if st.button("Go Home"):
+        switch_page("Home")
+    st.stop()
+
+# Load the publish dates of the channel's latest video snapshot
+video_data = read_dataset("videos", channel_id, columns=['published_date'])
+if video_data is None:
+    st.warning("No video data has been stored for this channel yet. Please load the channel on the home page first.")
+    if st.button("Go Home"):
+        switch_page("Home")
+    st.stop()
 
 # Get the suggested date
 suggested_date = suggest_next_publish_date(video_data)
@@ -66,14 +103,14 @@ schedule_date = st.date_input("Schedule Date", suggested_date.date())  # Default
 schedule_time = st.time_input("Schedule Time")
 
 if st.button("Schedule Video"):
-    # Append to DataFrame and save back to Excel
-    df = df.append({
+    # Append to DataFrame and save back to the dataset store
+    df = pd.concat([df, pd.DataFrame([{
         "title": video_title,
         "description": video_description,
         "date": schedule_date,
         "time": schedule_time
-    }, ignore_index=True)
-    df.to_excel(EXCEL_DB, index=False)
+    }])], ignore_index=True)
+    write_dataset(df, channel_id, "scheduled_posts", part_name="posts", replace=True)
     st.success("Video scheduled!")
 
 # Display scheduled posts
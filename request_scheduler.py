@@ -0,0 +1,220 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from youtube_client import execute as execute_request
+from instrumentation import span
+
+########################################################################################################################
+#                                       QUOTA AWARE REQUEST SCHEDULER
+########################################################################################################################
+# Daily quota of the API project, in YouTube quota units
+DAILY_QUOTA = int(os.environ.get("YOUTUBE_DAILY_QUOTA", 10000))
+
+# Quota units per call type, every other list call costs 1 unit
+QUOTA_COSTS = {
+    "youtube.search.list": 100,
+}
+DEFAULT_QUOTA_COST = 1
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Share of the bucket that background requests may not touch, so the dashboard keeps working during crawls
+INTERACTIVE_RESERVE = 0.1
+
+# Seconds a request waits for quota to refill before giving up
+MAX_QUOTA_WAIT = {PRIORITY_INTERACTIVE: 5.0, PRIORITY_BACKGROUND: 60.0}
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "backendError", "internalError"}
+QUOTA_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+
+_priority = contextvars.ContextVar("request_priority", default=PRIORITY_INTERACTIVE)
+
+
+class QuotaExceededError(Exception):
+    """Raised when the quota budget cannot cover a request in time, or the API reports the quota as spent."""
+
+
+@contextlib.contextmanager
+def request_priority(priority):
+    """Runs the API requests made inside the block (on this thread) with the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _error_reason(error):
+    try:
+        return json.loads(error.content)["error"]["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+class RequestScheduler:
+    """Token bucket of quota units with a priority queue in front of a fixed number of in-flight requests."""
+
+    def __init__(self, daily_quota=DAILY_QUOTA, max_concurrent=8, interactive_reserve=INTERACTIVE_RESERVE,
+                 max_retries=5, base_delay=1.0, max_delay=32.0):
+        self.capacity = daily_quota
+        self.tokens = float(daily_quota)
+        self.refill_rate = daily_quota / 86400.0
+        self.reserve = daily_quota * interactive_reserve
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._condition = threading.Condition()
+        self._refilled_at = time.monotonic()
+        self._active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+
+        self._metrics = defaultdict(float)
+        self._calls = defaultdict(int)
+        self._units = defaultdict(int)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._refilled_at) * self.refill_rate)
+        self._refilled_at = now
+
+    def _acquire(self, cost, priority):
+        floor = self.reserve if priority != PRIORITY_INTERACTIVE else 0.0
+        ticket = (priority, next(self._sequence))
+        throttled_since = None
+
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    self._refill()
+                    first_in_line = self._waiting[0] == ticket
+                    slot_free = self._active < self.max_concurrent
+                    if first_in_line and slot_free and self.tokens - cost >= floor:
+                        break
+
+                    timeout = 1.0
+                    if first_in_line and slot_free:
+                        # Only running out of quota counts as throttling, waiting for a slot does not
+                        if throttled_since is None:
+                            throttled_since = time.monotonic()
+                            self._metrics["throttled_requests"] += 1
+                        waited = time.monotonic() - throttled_since
+                        max_wait = MAX_QUOTA_WAIT.get(priority, MAX_QUOTA_WAIT[PRIORITY_BACKGROUND])
+                        needed = (cost + floor - self.tokens) / self.refill_rate if self.refill_rate else float("inf")
+                        if waited + needed > max_wait:
+                            self._metrics["quota_rejections"] += 1
+                            raise QuotaExceededError(f"Not enough YouTube API quota left for a {cost} unit request")
+                        timeout = min(timeout, needed)
+
+                    self._condition.wait(timeout=timeout)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                if throttled_since is not None:
+                    self._metrics["throttle_seconds"] += time.monotonic() - throttled_since
+                self._condition.notify_all()
+
+            self.tokens -= cost
+            self._active += 1
+
+    def _release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _exhaust(self):
+        with self._condition:
+            self.tokens = 0.0
+            self._refilled_at = time.monotonic()
+
+    def execute(self, request, priority=None):
+        """Executes an API request once quota and a slot are available, retrying transient failures."""
+        priority = _priority.get() if priority is None else priority
+        cost = QUOTA_COSTS.get(request.methodId, DEFAULT_QUOTA_COST)
+
+        for attempt in range(self.max_retries + 1):
+            self._acquire(cost, priority)
+            with self._condition:
+                self._calls[request.methodId] += 1
+                self._units[request.methodId] += cost
+            try:
+                with span(request.methodId, kind="api", resource=request.methodId, quota_units=cost,
+                          attempt=attempt, priority=priority):
+                    return execute_request(request)
+            except HttpError as error:
+                status = error.resp.status
+                reason = _error_reason(error)
+                # Not modified answers to ETag revalidation are handled by the response cache
+                if status == 304:
+                    raise
+                if reason in QUOTA_REASONS:
+                    self._exhaust()
+                    raise QuotaExceededError(f"YouTube API quota exceeded ({reason})") from error
+                if status not in RETRYABLE_STATUSES and reason not in RETRYABLE_REASONS:
+                    raise
+                if attempt == self.max_retries:
+                    self._metrics["failures"] += 1
+                    raise
+            except (httplib2.HttpLib2Error, OSError):
+                if attempt == self.max_retries:
+                    self._metrics["failures"] += 1
+                    raise
+            finally:
+                self._release()
+
+            # Exponential backoff with full jitter
+            self._metrics["retries"] += 1
+            time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def stats(self):
+        """Returns quota and throttling metrics."""
+        with self._condition:
+            self._refill()
+            return {
+                "remaining_quota": int(self.tokens),
+                "quota_used": sum(self._units.values()),
+                "calls": dict(self._calls),
+                "units": dict(self._units),
+                "active": self._active,
+                "waiting": len(self._waiting),
+                "throttled_requests": int(self._metrics["throttled_requests"]),
+                "throttle_seconds": self._metrics["throttle_seconds"],
+                "quota_rejections": int(self._metrics["quota_rejections"]),
+                "retries": int(self._metrics["retries"]),
+                "failures": int(self._metrics["failures"]),
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process wide request scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler()
+    return _scheduler
+
+
+def execute(request, priority=None):
+    """Executes an API request through the process wide scheduler."""
+    return get_scheduler().execute(request, priority)
@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from googleapiclient.errors import HttpError
+
+from request_scheduler import execute
+from instrumentation import count_cache
+
+########################################################################################################################
+#                                       PERSISTENT API RESPONSE CACHE
+########################################################################################################################
+CACHE_PATH = os.path.join(".cache", "api_responses.sqlite")
+
+# Maximum size of all cached response bodies before least recently used entries are evicted
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Seconds a cached response is served without asking the API, per resource method
+DEFAULT_TTLS = {
+    "youtube.channels.list": 6 * 3600,
+    "youtube.playlistItems.list": 30 * 60,
+    "youtube.videos.list": 60 * 60,
+    "youtube.commentThreads.list": 15 * 60,
+    "youtube.comments.list": 15 * 60,
+    "youtube.search.list": 24 * 3600,
+}
+DEFAULT_TTL = 60 * 60
+
+# Query parameters that do not change the response
+IGNORED_PARAMS = {"key", "alt"}
+
+
+def request_cache_key(request):
+    """Builds the cache key of a request from its resource method and its query parameters (parts, ids, page token)."""
+    query = urllib.parse.parse_qsl(urllib.parse.urlparse(request.uri).query)
+    params = sorted((name, value) for name, value in query if name not in IGNORED_PARAMS)
+    return request.methodId + "?" + urllib.parse.urlencode(params)
+
+
+class ResponseCache:
+    """SQLite backed store of API responses and their ETags, shared by every thread and process."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES, ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                resource TEXT NOT NULL,
+                etag TEXT,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._connection.commit()
+
+    def record(self, counter, resource=None):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        count_cache("api_responses", counter, resource=resource)
+
+    def ttl(self, resource):
+        return self.ttls.get(resource, DEFAULT_TTL)
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT etag, body, fetched_at FROM responses WHERE key = ?",
+                                           (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+        etag, body, fetched_at = row
+        return etag, json.loads(body), fetched_at
+
+    def put(self, key, resource, response):
+        body = json.dumps(response)
+        now = time.time()
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (key, resource, response.get("etag"), body, len(body), now, now))
+            self._connection.commit()
+            self._evict()
+
+    def mark_fresh(self, key):
+        now = time.time()
+        with self._lock:
+            self._connection.execute("UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?",
+                                     (now, now, key))
+            self._connection.commit()
+
+    def _evict(self):
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until the cache fits again
+        freed = 0
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if total - freed <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            freed += size
+            self.evictions += 1
+        self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses + self.revalidated
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Returns the process wide response cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def cached_execute(request, ttl=None, priority=None):
+    """Executes an API request through the response cache.
+
+    Fresh entries are returned without a network call. Stale entries are revalidated with their ETag, so an
+    unchanged page costs a 304 instead of a full payload. Network calls go through the request scheduler with the
+    given priority (the caller's request_priority when None).
+    """
+    cache = get_response_cache()
+    key = request_cache_key(request)
+    if ttl is None:
+        ttl = cache.ttl(request.methodId)
+
+    cached = cache.get(key)
+    if cached is not None:
+        etag, body, fetched_at = cached
+        if time.time() - fetched_at < ttl:
+            cache.record("hits", request.methodId)
+            return body
+
+        if etag:
+            request.headers["If-None-Match"] = etag
+            try:
+                response = execute(request, priority)
+            except HttpError as error:
+                if error.resp.status != 304:
+                    raise
+                cache.record("revalidated", request.methodId)
+                cache.mark_fresh(key)
+                return body
+
+            cache.record("misses", request.methodId)
+            cache.put(key, request.methodId, response)
+            return response
+
+    cache.record("misses", request.methodId)
+    response = execute(request, priority)
+    cache.put(key, request.methodId, response)
+    return response
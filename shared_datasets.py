@@ -0,0 +1,124 @@
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+from channelDataExtraction import getChannelData
+from channel_sync import syncChannel
+from compact_frames import compact_video_data, video_tag_lists
+from dataset_store import write_dataset
+from instrumentation import count_cache, span
+from video_catalog import VideoCatalog
+from video_search import VideoSearchIndex
+
+########################################################################################################################
+#                                       SHARED CHANNEL DATASETS
+########################################################################################################################
+# Seconds a loaded channel is served to every session before the next request syncs it again
+DATASET_MAX_AGE = 15 * 60
+
+
+class ChannelDataset:
+    """One loaded version of a channel, shared read-only by every session that looks at the channel.
+
+    Sessions filter it through the catalog's row positions and must never modify its frames in place.
+    """
+
+    def __init__(self, channel_id, channel_details, videos, video_data, video_tags, version):
+        self.channel_id = channel_id
+        self.channel_details = channel_details
+        self.videos = videos
+        self.catalog = VideoCatalog(video_data, video_tags)
+        self.video_data = self.catalog.data
+        self.video_tags = video_tags
+        self.version = version
+        self.loaded_at = time.time()
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dataset = None
+        self.synced_at = 0.0
+        self.search_index = VideoSearchIndex()
+
+
+_entries = {}
+_entries_lock = threading.Lock()
+
+# Versions replaced by a newer sync stay alive only as long as some session still holds them
+_superseded = weakref.WeakSet()
+
+
+def _entry(channel_id):
+    with _entries_lock:
+        entry = _entries.get(channel_id)
+        if entry is None:
+            entry = _entries[channel_id] = _Entry()
+        return entry
+
+
+def get_channel_dataset(api_key, channel_id, max_age=DATASET_MAX_AGE, refresh=False):
+    """Returns the shared dataset of a channel, or None if the channel does not exist.
+
+    The channel is synced at most once per max_age seconds (or when refresh is set) however many sessions ask for
+    it; concurrent requests wait for the running sync instead of starting their own. A sync that finds nothing
+    new keeps handing out the same dataset object.
+    """
+    entry = _entry(channel_id)
+    with entry.lock:
+        if entry.dataset is not None and not refresh and time.time() - entry.synced_at < max_age:
+            count_cache("datasets", "hits", resource=channel_id)
+            return entry.dataset
+        count_cache("datasets", "misses", resource=channel_id)
+
+        with span("sync_shared_dataset", channel_id=channel_id):
+            channel_details = getChannelData(api_key, channel_id)
+            if channel_details is None:
+                return None
+            write_dataset(pd.DataFrame([channel_details]), channel_id, "channel", part_name="snapshot", replace=True)
+
+            # Only new videos and videos with stale statistics are fetched, the rest comes from the local catalog
+            videos, stats_df = syncChannel(api_key, channel_id, channel_details["uploads"])
+            entry.synced_at = time.time()
+
+            version = (len(stats_df), float(stats_df['stats_fetched_at'].max()) if len(stats_df) else 0.0)
+            if entry.dataset is not None and entry.dataset.version == version:
+                entry.dataset.channel_details = channel_details
+                return entry.dataset
+
+            video_data, video_tags = compact_video_data(stats_df)
+            dataset = ChannelDataset(channel_id, channel_details, videos, video_data, video_tags, version)
+
+            entry.search_index.update_titles(videos)
+            entry.search_index.update_tags(dataset.video_data['id'], video_tag_lists(video_tags,
+                                                                                     dataset.video_data['id']))
+
+            if entry.dataset is not None:
+                _superseded.add(entry.dataset)
+            entry.dataset = dataset
+            return dataset
+
+
+def get_search_index(channel_id):
+    """Returns the title and tag search index of a channel, shared by every session."""
+    return _entry(channel_id).search_index
+
+
+def dataset_stats():
+    """Returns one row per loaded channel version with its size, age and whether it is still current."""
+    with _entries_lock:
+        current = {channel_id: entry.dataset for channel_id, entry in _entries.items() if entry.dataset is not None}
+
+    rows = []
+    for dataset in list(current.values()) + list(_superseded):
+        rows.append({
+            'channel_id': dataset.channel_id,
+            'videos': len(dataset.video_data),
+            'bytes': int(dataset.video_data.memory_usage(deep=True).sum()
+                         + dataset.video_tags.memory_usage(deep=True).sum()),
+            'age_seconds': round(time.time() - dataset.loaded_at, 1),
+            'current': current.get(dataset.channel_id) is dataset,
+        })
+    return pd.DataFrame(rows, columns=['channel_id', 'videos', 'bytes', 'age_seconds', 'current'])
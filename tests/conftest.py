@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Synthetic channels spend far more than a real day of quota, the scheduler reads this on import
+os.environ.setdefault("YOUTUBE_DAILY_QUOTA", str(10 ** 9))
+
+from fake_youtube import FakeYouTube, SyntheticChannel  # noqa: E402
+
+API_KEY = "offline-test"
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # The dataset store and the caches use relative paths, so every test starts from an empty directory
+    monkeypatch.chdir(tmp_path)
+
+    import comment_sync
+    import view_forecast
+    from response_cache import get_response_cache
+
+    get_response_cache().clear()
+    comment_sync._loaded.clear()
+    comment_sync._syncs._failed.clear()
+    view_forecast._fits._failed.clear()
+    yield tmp_path
+
+
+@pytest.fixture
+def channel():
+    return SyntheticChannel(title="Test channel", videos=60, comments=3000)
+
+
+@pytest.fixture
+def fake(channel):
+    with FakeYouTube([channel]) as fake:
+        yield fake
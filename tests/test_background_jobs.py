@@ -0,0 +1,62 @@
+import threading
+import time
+
+from background_jobs import BackgroundJobs
+
+
+def wait_until_idle(jobs, key, timeout=10):
+    deadline = time.time() + timeout
+    while jobs.running(key):
+        assert time.time() < deadline, "background job did not finish"
+        time.sleep(0.01)
+
+
+def test_one_running_job_per_key():
+    jobs = BackgroundJobs(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def job(value):
+        calls.append(value)
+        release.wait(10)
+        return value
+
+    first = jobs.submit("a", job, 1)
+    assert jobs.submit("a", job, 2) is first
+    assert jobs.running("a")
+
+    release.set()
+    assert first.result(10) == 1
+    wait_until_idle(jobs, "a")
+    assert calls == [1]
+    assert jobs.error("a") is None
+
+
+def test_failed_job_is_reported_and_not_retried():
+    jobs = BackgroundJobs()
+
+    def failing():
+        raise RuntimeError("boom")
+
+    future = jobs.submit("a", failing)
+    future.exception(10)
+    wait_until_idle(jobs, "a")
+
+    assert jobs.error("a") == "RuntimeError: boom"
+    assert jobs.submit("a", failing) is None
+    assert jobs.submit("b", lambda: "ok").result(10) == "ok"
+
+
+def test_failed_job_is_retried_after_the_delay():
+    jobs = BackgroundJobs(retry_delay=60)
+    jobs.submit("a", lambda: 1 / 0).exception(10)
+    wait_until_idle(jobs, "a")
+
+    assert jobs.error("a") == "ZeroDivisionError: division by zero"
+    assert jobs.submit("a", lambda: "ok") is None
+
+    jobs.retry_delay = 0
+    future = jobs.submit("a", lambda: "ok")
+    assert future.result(10) == "ok"
+    wait_until_idle(jobs, "a")
+    assert jobs.error("a") is None
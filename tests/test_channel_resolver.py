@@ -0,0 +1,58 @@
+import pytest
+
+from channel_resolver import ChannelResolver, parse_channel_reference
+from conftest import API_KEY
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    return ChannelResolver(path=str(tmp_path / "channels.sqlite"))
+
+
+def test_channel_ids_and_urls_are_parsed_locally(channel, fake, resolver):
+    assert resolver.resolve(API_KEY, channel.id) == channel.id
+    assert resolver.resolve(API_KEY, f"https://www.youtube.com/channel/{channel.id}/videos") == channel.id
+    assert sum(fake.requests.values()) == 0
+
+    assert parse_channel_reference("youtube.com/@Some.Handle") == ("handle", "@Some.Handle")
+    assert parse_channel_reference("https://www.youtube.com/user/legacy") == ("username", "legacy")
+    assert parse_channel_reference("https://www.youtube.com/c/Custom%20Name") == ("custom", "Custom Name")
+    assert parse_channel_reference("https://example.com/@someone") is None
+
+
+def test_handles_are_looked_up_without_search(channel, fake, resolver):
+    assert resolver.resolve(API_KEY, channel.handle) == channel.id
+    assert resolver.resolve(API_KEY, f"https://www.youtube.com/{channel.handle}") == channel.id
+
+    assert fake.requests["channels"] == 1
+    assert fake.requests["search"] == 0
+
+
+def test_names_try_the_handle_before_search(channel, fake, resolver):
+    # "Test channel" is tried as @Testchannel, which is the channel's handle
+    assert resolver.resolve(API_KEY, "Test channel") == channel.id
+    assert (fake.requests["channels"], fake.requests["search"]) == (1, 0)
+
+    # No channel has the handle @channel, so the name is searched
+    assert resolver.resolve(API_KEY, "channel") == channel.id
+    assert (fake.requests["channels"], fake.requests["search"]) == (2, 1)
+    assert resolver.lookups == {"parsed": 0, "handle": 2, "username": 0, "search": 1}
+
+
+def test_answers_are_remembered(channel, fake, resolver):
+    resolver.resolve(API_KEY, "channel")
+    fake.requests.clear()
+
+    assert resolver.resolve(API_KEY, "  CHANNEL ") == channel.id
+    # The title is stored as a name as well
+    assert resolver.resolve(API_KEY, "test   channel") == channel.id
+    assert sum(fake.requests.values()) == 0
+    assert resolver.suggest("test chanel") == [(channel.title, channel.id)]
+
+
+def test_unknown_handles_are_not_searched_and_remembered(fake, resolver):
+    assert resolver.resolve(API_KEY, "@nobody") is None
+    assert resolver.resolve(API_KEY, "@nobody") is None
+
+    assert fake.requests["channels"] == 1
+    assert fake.requests["search"] == 0
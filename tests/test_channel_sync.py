@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from channel_sync import loadCatalog, staleVideoIds, syncChannel
+from compact_frames import compact_video_data
+from conftest import API_KEY
+from response_cache import get_response_cache
+from video_catalog import VideoCatalog
+
+
+def test_first_sync_stores_the_whole_catalog(channel, fake):
+    videos, stats_df = syncChannel(API_KEY, channel.id, channel.uploads_id)
+
+    assert [video['id'] for video in videos] == channel.video_ids
+    assert set(stats_df['id']) == set(channel.video_ids)
+
+    videos_df, stored_stats_df = loadCatalog(channel.id)
+    assert videos_df['id'].tolist() == channel.video_ids
+    assert len(stored_stats_df) == channel.video_count
+
+
+def test_resync_of_unchanged_channel_requests_no_statistics(channel, fake):
+    syncChannel(API_KEY, channel.id, channel.uploads_id)
+    fake.requests.clear()
+
+    videos, stats_df = syncChannel(API_KEY, channel.id, channel.uploads_id)
+
+    assert len(videos) == channel.video_count
+    assert fake.requests["videos"] == 0
+    # Paging stops on the first page, every video on it is already known
+    assert fake.requests["playlistItems"] == 1
+
+
+def test_stale_statistics_are_refreshed(channel, fake):
+    _, first_stats_df = syncChannel(API_KEY, channel.id, channel.uploads_id)
+    # Past the response cache TTL, within it a stale video is answered from the cached page
+    get_response_cache().clear()
+    fake.requests.clear()
+
+    _, stats_df = syncChannel(API_KEY, channel.id, channel.uploads_id, tiers=[(None, timedelta(0))])
+
+    assert fake.requests["videos"] > 0
+    assert stats_df['id'].tolist() == first_stats_df['id'].tolist()
+    assert (stats_df['stats_fetched_at'] > first_stats_df['stats_fetched_at'].max()).all()
+
+
+def test_stale_ids_follow_the_age_tiers():
+    now = pd.Timestamp("2024-06-10", tz="UTC")
+    fetched = (now - pd.Timedelta(hours=2)).timestamp()
+    stats_df = pd.DataFrame({
+        'id': ["new", "recent", "old"],
+        'published_date': [now - pd.Timedelta(days=1), now - pd.Timedelta(days=10), now - pd.Timedelta(days=400)],
+        'stats_fetched_at': [fetched, fetched, (now - pd.Timedelta(days=20)).timestamp()],
+    })
+
+    # New uploads tolerate an hour, the month tier half a day, anything older two weeks
+    assert staleVideoIds(stats_df, now=now) == ["new", "old"]
+    assert staleVideoIds(stats_df, tiers=[(None, timedelta(days=30))], now=now) == []
+
+
+def test_videos_the_api_no_longer_returns_are_dropped_once(channel, fake):
+    syncChannel(API_KEY, channel.id, channel.uploads_id)
+    hidden = channel.video_ids[:3]
+    for video_id in hidden:
+        fake.hide_video(video_id)
+    get_response_cache().clear()
+
+    _, stats_df = syncChannel(API_KEY, channel.id, channel.uploads_id, tiers=[(None, timedelta(0))])
+    assert not stats_df['id'].isin(hidden).any()
+    assert len(stats_df) == channel.video_count - len(hidden)
+
+    # Still known to the uploads list, so they are neither new nor stale on the next sync
+    get_response_cache().clear()
+    fake.requests.clear()
+    _, stats_df = syncChannel(API_KEY, channel.id, channel.uploads_id)
+    assert fake.requests["videos"] == 0
+    assert len(loadCatalog(channel.id)[1]) == channel.video_count - len(hidden)
+
+
+def test_refresh_where_every_video_is_gone(channel, fake):
+    syncChannel(API_KEY, channel.id, channel.uploads_id)
+    for video_id in channel.video_ids:
+        fake.hide_video(video_id)
+    get_response_cache().clear()
+
+    videos, stats_df = syncChannel(API_KEY, channel.id, channel.uploads_id, tiers=[(None, timedelta(0))])
+
+    assert len(videos) == channel.video_count
+    assert stats_df.empty
+    assert {'view_count', 'duration_minutes', 'published_date', 'stats_fetched_at'} <= set(stats_df.columns)
+
+    # The dashboard still builds its frames and catalog from the empty statistics
+    catalog = VideoCatalog(*compact_video_data(stats_df))
+    assert len(catalog) == 0 and catalog.top_n('view_count', 5).empty
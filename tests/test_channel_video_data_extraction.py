@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+import pytest
+
+from channelVideoDataExtraction import VIDEO_COLUMNS, buildVideoListDataframe, iterVideoComments, normalizeVideoData, \
+    saveVideoComments
+from conftest import API_KEY
+from dataset_store import list_parts, read_parts
+from fake_youtube import INLINE_REPLIES
+
+
+@pytest.mark.parametrize("duration, seconds", [
+    ("PT15M33S", 933),
+    ("PT45S", 45),
+    ("PT2H", 7200),
+    ("P1DT2H3M4S", 93784),
+    ("P1W", 604800),
+    ("P0D", 0),
+])
+def test_iso8601_durations(duration, seconds):
+    video_data = normalizeVideoData(pd.DataFrame([{'duration': duration}], columns=VIDEO_COLUMNS))
+
+    assert video_data['duration_seconds'][0] == seconds
+    assert video_data['duration_minutes'][0] == pytest.approx(seconds / 60)
+
+
+@pytest.mark.parametrize("duration", [None, "", "15:33", "PT15X"])
+def test_missing_and_malformed_durations_are_missing(duration):
+    video_data = normalizeVideoData(pd.DataFrame([{'duration': duration}], columns=VIDEO_COLUMNS))
+
+    assert pd.isna(video_data['duration_seconds'][0])
+    assert pd.isna(video_data['duration_minutes'][0])
+
+
+def test_counts_and_dates_keep_real_dtypes():
+    video_data = normalizeVideoData(pd.DataFrame([
+        {'view_count': "1200", 'like_count': None, 'comment_count': "7", 'published_date': "2024-06-01T08:00:00Z"},
+        {'view_count': "35", 'like_count': "2", 'comment_count': None, 'published_date': "2024-05-31T23:00:00Z"},
+    ]))
+
+    assert str(video_data['view_count'].dtype) == 'Int64'
+    assert video_data['view_count'].tolist() == [1200, 35]
+    # Hidden likes and disabled comments stay missing instead of becoming zero
+    assert pd.isna(video_data['like_count'][0]) and pd.isna(video_data['comment_count'][1])
+    assert str(video_data['published_date'].dt.tz) == 'UTC'
+
+
+def test_video_list_dataframe_from_the_api(channel, fake):
+    video_data = buildVideoListDataframe(API_KEY, channel.video_ids)
+
+    assert video_data['id'].tolist() == channel.video_ids
+    assert video_data['duration_seconds'].tolist() == channel.durations.tolist()
+    assert video_data['comment_count'].tolist() == channel.comment_counts.tolist()
+    # One videos.list call per 50 IDs
+    assert fake.requests["videos"] == 2
+
+
+def test_rewriting_video_comments_leaves_no_stale_parts(channel, fake):
+    video_id = channel.video_ids[int(channel.comment_counts.argmax())]
+
+    total = saveVideoComments(API_KEY, channel.id, video_id, chunk_size=50)
+    assert len(next(iter(list_parts("comments", channel.id, video_id).values()))) > 1
+
+    assert saveVideoComments(API_KEY, channel.id, video_id, chunk_size=10 ** 6) == total
+    paths = next(iter(list_parts("comments", channel.id, video_id).values()))
+    assert [os.path.basename(path) for path in paths] == [f"{video_id}-00000.parquet"]
+    assert read_parts(paths)['comment_id'].is_unique
+
+
+def test_truncated_threads_are_expanded(channel, fake):
+    index = int(channel.comment_counts.argmax())
+    threads = channel.comment_threads(index)
+
+    comments = list(iterVideoComments(API_KEY, channel.video_ids[index], reply_workers=4))
+
+    ids = [comment_data['comment_id'] for comment_data in comments]
+    assert len(ids) == len(set(ids)) == channel.comment_counts[index]
+    # Every reply is linked to its thread
+    linked = {}
+    for comment_data in comments:
+        if comment_data.get('linkage') is not None:
+            linked.setdefault(comment_data['linkage'], set()).add(comment_data['comment_id'])
+    assert linked == {thread['id']: {reply['id'] for reply in replies} for thread, replies in threads if replies}
+
+    # Only threads with more replies than commentThreads embeds need comments.list, 100 replies per page
+    assert fake.requests["comments"] == sum(-(-len(replies) // 100) for _, replies in threads
+                                            if len(replies) > INLINE_REPLIES)
+
+
+def test_without_expansion_only_inline_replies_are_read(channel, fake):
+    index = int(channel.comment_counts.argmax())
+    threads = channel.comment_threads(index)
+
+    comments = list(iterVideoComments(API_KEY, channel.video_ids[index], expand_replies=False))
+
+    assert len(comments) == sum(1 + min(len(replies), INLINE_REPLIES) for _, replies in threads)
+    assert fake.requests["comments"] == 0
@@ -0,0 +1,45 @@
+from comment_harvester import harvest_channel_comments
+from conftest import API_KEY
+from dataset_store import read_dataset
+
+
+def stored_comments(channel):
+    return read_dataset("comments", channel.id)
+
+
+def test_harvest_stores_every_video(channel, fake):
+    summary = harvest_channel_comments(API_KEY, channel.id, channel.video_ids, max_workers=4)
+
+    commented = int((channel.comment_counts > 0).sum())
+    assert summary["videos"] == channel.video_count
+    assert summary["failed"] == [] and summary["remaining"] == 0
+    # One commentThreads page per 100 threads, videos without comments still cost their empty page
+    assert summary["quota_used"] == fake.requests["commentThreads"] >= channel.video_count
+
+    comments = stored_comments(channel)
+    assert len(comments) == summary["comments"]
+    assert comments['comment_id'].is_unique
+    assert comments['video_id'].nunique() == commented
+
+
+def test_exhausted_budget_resumes_where_it_stopped(channel, fake):
+    first = harvest_channel_comments(API_KEY, channel.id, channel.video_ids, max_workers=4, quota_budget=20)
+    assert first["quota_used"] <= 20
+    assert 0 < first["videos"] < channel.video_count
+    assert first["remaining"] == channel.video_count - first["videos"]
+
+    second = harvest_channel_comments(API_KEY, channel.id, channel.video_ids, max_workers=4)
+    assert second["skipped"] == first["videos"]
+    assert first["videos"] + second["videos"] == channel.video_count
+
+    comments = stored_comments(channel)
+    assert comments['comment_id'].is_unique
+    assert len(comments) == first["comments"] + second["comments"]
+
+
+def test_resume_false_starts_over(channel, fake):
+    harvest_channel_comments(API_KEY, channel.id, channel.video_ids[:5], max_workers=2)
+    again = harvest_channel_comments(API_KEY, channel.id, channel.video_ids[:5], max_workers=2, resume=False)
+
+    assert again["skipped"] == 0 and again["videos"] == 5
+    assert stored_comments(channel)['comment_id'].is_unique
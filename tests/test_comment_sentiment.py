@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from textblob import TextBlob
+
+import comment_sentiment
+from channelVideoDataExtraction import getVideoComments
+from comment_sentiment import add_sentiment, score_comments
+from conftest import API_KEY
+
+
+@pytest.fixture(autouse=True)
+def sentiment_cache(workdir, monkeypatch):
+    # A fresh score cache in the test's directory
+    monkeypatch.setattr(comment_sentiment, "_connection", None)
+    yield
+    if comment_sentiment._connection is not None:
+        comment_sentiment._connection.close()
+
+
+@pytest.fixture
+def scored(monkeypatch):
+    # Records every text sent to TextBlob
+    texts = []
+    score_batch = comment_sentiment._score_batch
+
+    def recording_score_batch(batch):
+        texts.extend(batch)
+        return score_batch(batch)
+
+    monkeypatch.setattr(comment_sentiment, "_score_batch", recording_score_batch)
+    return texts
+
+
+def test_scores_are_computed_once(scored):
+    texts = ["great video love this", "boring and confusing", "great video love this"]
+    ids = ["a", "b", "a"]
+
+    first = score_comments(ids, texts, processes=0)
+    assert first.tolist() == [TextBlob(text).sentiment.polarity for text in texts]
+    assert scored == texts[:2]
+
+    scored.clear()
+    assert score_comments(ids, texts, processes=0).tolist() == first.tolist()
+    assert scored == []
+
+
+def test_edited_comment_is_scored_again(scored):
+    score_comments(["a"], ["great video"], processes=0)
+    scored.clear()
+
+    edited = score_comments(["a"], ["terrible video"], processes=0)
+
+    assert scored == ["terrible video"]
+    assert edited[0] == TextBlob("terrible video").sentiment.polarity
+
+
+def test_comments_of_a_video_are_served_from_the_cache(channel, fake, scored):
+    comments = getVideoComments(API_KEY, channel.video_ids[int(np.argmax(channel.comment_counts))],
+                                channel_id=channel.id, max_comments=300)
+    first = add_sentiment(comments.copy(), processes=0)
+    assert set(first['Sentiment']) <= {"Positive", "Neutral", "Negative"}
+    assert len(scored) == comments.groupby(['comment_id', 'comment_text']).ngroups
+
+    scored.clear()
+    again = add_sentiment(comments.copy(), processes=0)
+    assert scored == []
+    assert again['polarity'].tolist() == first['polarity'].tolist()
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+import comment_sync
+from comment_sync import get_video_comments, load_comments, save_comments, sync_error, sync_video_comments
+from conftest import API_KEY
+
+
+@pytest.fixture
+def video(channel):
+    # A video whose comments all fit in the first fetch
+    index = next(index for index, count in enumerate(channel.comment_counts) if 100 <= count <= 500)
+    return index, channel.video_ids[index]
+
+
+def wait_for_sync(channel_id, video_id, timeout=30):
+    deadline = time.time() + timeout
+    while comment_sync._syncs.running((channel_id, video_id)):
+        assert time.time() < deadline, "background comment sync did not finish"
+        time.sleep(0.01)
+
+
+def without_newest_threads(channel, index, comments, count=3):
+    # As if the newest threads and their replies were posted after the last sync
+    newest = [thread['id'] for thread, _ in channel.comment_threads(index)[:count]]
+    return comments[~(comments['comment_id'].isin(newest) | comments['linkage'].isin(newest))]
+
+
+def make_stale(channel_id, video_id, comments):
+    save_comments(channel_id, video_id, comments, synced_at=0.0)
+    comment_sync._loaded.clear()
+
+
+def test_first_fetch_is_stored(channel, fake, video):
+    _, video_id = video
+    comments = sync_video_comments(API_KEY, channel.id, video_id)
+
+    assert len(comments) == channel.comment_counts[video[0]]
+    comment_sync._loaded.clear()
+    stored, synced_at = load_comments(channel.id, video_id)
+    assert set(stored['comment_id']) == set(comments['comment_id'])
+    assert synced_at > 0
+
+
+def test_delta_fetch_reads_only_new_threads(channel, fake, video):
+    index, video_id = video
+    comments = sync_video_comments(API_KEY, channel.id, video_id)
+
+    make_stale(channel.id, video_id, without_newest_threads(channel, index, comments))
+    fake.requests.clear()
+
+    synced = sync_video_comments(API_KEY, channel.id, video_id)
+
+    assert set(synced['comment_id']) == set(comments['comment_id'])
+    assert synced['comment_id'].is_unique
+    assert fake.requests["commentThreads"] == 1
+
+
+def test_stored_comments_are_served_while_syncing(channel, fake, video):
+    index, video_id = video
+    comments, is_current = get_video_comments(API_KEY, channel.id, video_id)
+    assert is_current
+
+    fake.requests.clear()
+    cached, is_current = get_video_comments(API_KEY, channel.id, video_id)
+    assert is_current and len(cached) == len(comments)
+    assert sum(fake.requests.values()) == 0
+
+    stored = without_newest_threads(channel, index, comments)
+    make_stale(channel.id, video_id, stored)
+    stale, is_current = get_video_comments(API_KEY, channel.id, video_id)
+    assert not is_current and len(stale) == len(stored) < len(comments)
+
+    wait_for_sync(channel.id, video_id)
+    synced, is_current = get_video_comments(API_KEY, channel.id, video_id)
+    assert is_current and len(synced) == len(comments)
+
+
+def test_failed_sync_backs_off(channel, fake, video, monkeypatch):
+    _, video_id = video
+    comments = sync_video_comments(API_KEY, channel.id, video_id)
+    make_stale(channel.id, video_id, comments)
+
+    attempts = []
+
+    def failing_sync(api_key, channel_id, video_id, full=False):
+        attempts.append(video_id)
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(comment_sync, "sync_video_comments", failing_sync)
+
+    _, is_current = get_video_comments(API_KEY, channel.id, video_id)
+    wait_for_sync(channel.id, video_id)
+    assert not is_current
+    assert sync_error(channel.id, video_id) == "RuntimeError: quota exceeded"
+
+    # Backing off, the stored comments are served without a new attempt
+    served, is_current = get_video_comments(API_KEY, channel.id, video_id)
+    assert not is_current and len(served) == len(comments)
+    assert len(attempts) == 1
+
+    monkeypatch.setattr(comment_sync._syncs, "retry_delay", 0)
+    get_video_comments(API_KEY, channel.id, video_id)
+    wait_for_sync(channel.id, video_id)
+    assert len(attempts) == 2
+
+
+def test_loaded_videos_are_bounded(channel, fake, monkeypatch):
+    monkeypatch.setattr(comment_sync, "MAX_LOADED_VIDEOS", 2)
+    video_ids = [video_id for video_id, count in zip(channel.video_ids, channel.comment_counts) if count][:3]
+
+    for video_id in video_ids:
+        sync_video_comments(API_KEY, channel.id, video_id)
+
+    assert list(comment_sync._loaded) == [(channel.id, video_id) for video_id in video_ids[1:]]
+    # An evicted video is read back from the store
+    stored, _ = load_comments(channel.id, video_ids[0])
+    assert len(stored) == channel.comment_counts[channel.video_index[video_ids[0]]]
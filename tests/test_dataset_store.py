@@ -0,0 +1,53 @@
+import os
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+from dataset_store import delete_parts, list_parts, read_dataset, read_parts, write_dataset
+
+
+def test_read_returns_latest_fetch_date():
+    write_dataset(pd.DataFrame({'id': ['a', 'b']}), "UC1", "videos", part_name="snapshot", fetch_date="2024-01-01")
+    write_dataset(pd.DataFrame({'id': ['c']}), "UC1", "videos", part_name="snapshot", fetch_date="2024-01-02")
+
+    assert read_dataset("videos", "UC1")['id'].tolist() == ['c']
+    assert sorted(read_dataset("videos", "UC1", fetch_date=None)['id']) == ['a', 'b', 'c']
+    assert read_dataset("videos", "UC2") is None
+
+
+def test_latest_fetch_date_of_every_channel():
+    write_dataset(pd.DataFrame({'id': ['a']}), "UC1", "videos", part_name="snapshot", fetch_date="2024-01-01")
+    write_dataset(pd.DataFrame({'id': ['b']}), "UC1", "videos", part_name="snapshot", fetch_date="2024-01-03")
+    write_dataset(pd.DataFrame({'id': ['c']}), "UC2", "videos", part_name="snapshot", fetch_date="2024-01-02")
+    write_dataset(pd.DataFrame({'id': ['d']}), "UC2", "uploads", part_name="snapshot", fetch_date="2024-01-04")
+
+    assert sorted(read_dataset("videos")['id']) == ['b', 'c']
+    assert sorted(read_dataset("videos", fetch_date=None)['id']) == ['a', 'b', 'c']
+    assert read_dataset("videos", fetch_date="2024-01-02")['id'].tolist() == ['c']
+    assert read_dataset("comments") is None
+
+
+def test_filter_and_replace():
+    write_dataset(pd.DataFrame({'video_id': ['a', 'b'], 'n': [1, 2]}), "UC1", "comments", part_name="one")
+    write_dataset(pd.DataFrame({'video_id': ['c'], 'n': [3]}), "UC1", "comments", part_name="two")
+
+    assert read_dataset("comments", "UC1", filter=ds.field("video_id") == "b")['n'].tolist() == [2]
+
+    write_dataset(pd.DataFrame({'video_id': ['d'], 'n': [4]}), "UC1", "comments", part_name="three", replace=True)
+    assert read_dataset("comments", "UC1")['video_id'].tolist() == ['d']
+
+
+def test_parts_of_one_prefix_only():
+    for part_name in ["abc-00000", "abc-00001", "abc", "abc-def-00000", "abcd-00000"]:
+        write_dataset(pd.DataFrame({'n': [1]}), "UC1", "comments", part_name=part_name, fetch_date="2024-01-01")
+    write_dataset(pd.DataFrame({'n': [2]}), "UC1", "comments", part_name="abc-00000", fetch_date="2024-01-02")
+
+    parts = list_parts("comments", "UC1", "abc")
+    assert list(parts) == ["2024-01-01", "2024-01-02"]
+    assert sorted(os.path.basename(path) for path in parts["2024-01-01"]) == \
+        ["abc-00000.parquet", "abc-00001.parquet", "abc.parquet"]
+    assert read_parts(parts["2024-01-02"])['n'].tolist() == [2]
+
+    assert delete_parts("comments", "UC1", "abc", fetch_date="2024-01-01") == 3
+    assert list(list_parts("comments", "UC1", "abc")) == ["2024-01-02"]
+    assert list_parts("comments", "UC1", "abcd")
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from comment_harvester import _progress_path
+from conftest import API_KEY
+from dataset_store import read_dataset
+from fake_youtube import FakeYouTube, SyntheticChannel
+from ingest import ingest_channels
+from request_scheduler import get_scheduler
+
+
+@pytest.fixture
+def channels():
+    channels = [SyntheticChannel(title=f"Ingest channel {number}", videos=40, comments=2000, seed=number)
+                for number in range(3)]
+    with FakeYouTube(channels):
+        yield channels
+
+
+def quota_used():
+    return get_scheduler().stats()["quota_used"]
+
+
+def test_parallel_harvests_share_the_run_budget(channels):
+    references = [channel.id for channel in channels]
+    ingest_channels(API_KEY, references, max_workers=3)
+
+    before = quota_used()
+    results, summary = ingest_channels(API_KEY, references, max_workers=3, comments=True, quota_budget=40)
+
+    assert quota_used() - before == summary["quota_used"] <= 40
+    assert summary["pending"] == len(channels)
+
+    # Later runs resume the harvests until every channel is done
+    for _ in range(10):
+        results, summary = ingest_channels(API_KEY, references, max_workers=3, comments=True, quota_budget=40)
+        if summary["done"] == len(channels):
+            break
+    assert summary["done"] == len(channels)
+    for channel in channels:
+        assert not os.path.exists(_progress_path(channel.id))
+
+
+def test_restart_harvests_the_comments_again(channels):
+    channel = channels[0]
+    ingest_channels(API_KEY, [channel.id], comments=True, quota_budget=30)
+    assert os.path.exists(_progress_path(channel.id))
+
+    results, _ = ingest_channels(API_KEY, [channel.id], comments=True, resume=False)
+    # Started over, so this run stored the comments of every video and not just the ones left over
+    stored = read_dataset("comments", channel.id)
+    assert results[0]["status"] == "done"
+    assert results[0]["comments"] == len(stored)
+
+    results, _ = ingest_channels(API_KEY, [channel.id], comments=True, resume=False)
+    assert results[0]["comments"] == len(stored)
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from conftest import API_KEY
+from request_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, QuotaExceededError, RequestScheduler
+from youtube_client import get_youtube_client
+
+
+def channel_request(channel):
+    return get_youtube_client(API_KEY).channels().list(part="snippet", id=channel.id)
+
+
+def search_request():
+    return get_youtube_client(API_KEY).search().list(part="snippet", q="test", type="channel")
+
+
+def test_transient_errors_are_retried(channel, fake):
+    fake.error_rate = 0.5
+    scheduler = RequestScheduler(daily_quota=10 ** 6, max_retries=20, base_delay=0.0)
+
+    for _ in range(20):
+        assert scheduler.execute(channel_request(channel))["items"][0]["id"] == channel.id
+
+    stats = scheduler.stats()
+    assert stats["retries"] > 0 and stats["failures"] == 0
+    assert stats["calls"]["youtube.channels.list"] == fake.requests["channels"] == 20 + stats["retries"]
+
+
+def test_retries_give_up_after_max_retries(channel, fake):
+    fake.error_rate = 1.0
+    scheduler = RequestScheduler(daily_quota=10 ** 6, max_retries=3, base_delay=0.0)
+
+    with pytest.raises(HttpError) as error:
+        scheduler.execute(channel_request(channel))
+
+    assert error.value.resp.status == 503
+    assert fake.requests["channels"] == 4
+    assert scheduler.stats()["failures"] == 1
+
+
+def test_client_errors_are_not_retried(fake):
+    scheduler = RequestScheduler(daily_quota=10 ** 6, base_delay=0.0)
+    request = get_youtube_client(API_KEY).commentThreads().list(part="snippet", videoId="missing0000")
+
+    with pytest.raises(HttpError):
+        scheduler.execute(request)
+
+    assert fake.requests["commentThreads"] == 1
+    assert scheduler.stats()["retries"] == 0
+
+
+def test_requests_beyond_the_quota_are_rejected_without_a_call(channel, fake):
+    scheduler = RequestScheduler(daily_quota=150)
+
+    scheduler.execute(search_request())
+    with pytest.raises(QuotaExceededError):
+        scheduler.execute(search_request())
+
+    assert fake.requests["search"] == 1
+    stats = scheduler.stats()
+    assert stats["quota_used"] == 100 and stats["quota_rejections"] == 1
+
+
+def test_background_requests_leave_the_interactive_reserve(channel, fake):
+    scheduler = RequestScheduler(daily_quota=10, interactive_reserve=0.2)
+
+    for _ in range(8):
+        scheduler.execute(channel_request(channel), priority=PRIORITY_BACKGROUND)
+    with pytest.raises(QuotaExceededError):
+        scheduler.execute(channel_request(channel), priority=PRIORITY_BACKGROUND)
+
+    # The reserved units still serve the dashboard
+    for _ in range(2):
+        scheduler.execute(channel_request(channel), priority=PRIORITY_INTERACTIVE)
+    assert fake.requests["channels"] == 10
+
+
+def test_quota_error_from_the_api_empties_the_bucket(channel, fake, monkeypatch):
+    scheduler = RequestScheduler(daily_quota=10 ** 6)
+    body = {"error": {"code": 403, "message": "quota", "errors": [{"reason": "quotaExceeded"}]}}
+    monkeypatch.setattr(fake, "handle", lambda uri, headers=None: (403, json.dumps(body).encode()))
+
+    with pytest.raises(QuotaExceededError):
+        scheduler.execute(channel_request(channel))
+
+    assert scheduler.stats()["remaining_quota"] == 0
+    assert scheduler.stats()["retries"] == 0
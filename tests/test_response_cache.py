@@ -0,0 +1,47 @@
+from conftest import API_KEY
+from response_cache import cached_execute, get_response_cache
+from youtube_client import get_youtube_client
+
+
+def video_request(channel):
+    return get_youtube_client(API_KEY).videos().list(part="snippet,statistics", id=channel.video_ids[0])
+
+
+def test_fresh_response_is_served_without_a_request(channel, fake):
+    cache = get_response_cache()
+    before = cache.stats()
+
+    first = cached_execute(video_request(channel))
+    second = cached_execute(video_request(channel))
+
+    assert second == first
+    assert fake.requests["videos"] == 1
+    stats = cache.stats()
+    assert (stats["misses"] - before["misses"], stats["hits"] - before["hits"]) == (1, 1)
+
+
+def test_stale_unchanged_response_is_revalidated_with_its_etag(channel, fake):
+    cache = get_response_cache()
+    first = cached_execute(video_request(channel))
+    before = cache.stats()
+
+    again = cached_execute(video_request(channel), ttl=0)
+
+    assert again == first
+    assert fake.requests["videos"] == 2
+    assert cache.stats()["revalidated"] - before["revalidated"] == 1
+    # The 304 made the entry fresh again
+    cached_execute(video_request(channel))
+    assert fake.requests["videos"] == 2
+
+
+def test_stale_changed_response_is_replaced(channel, fake):
+    first = cached_execute(video_request(channel))
+    channel.view_counts[0] += 1000
+
+    changed = cached_execute(video_request(channel), ttl=0)
+
+    assert changed["etag"] != first["etag"]
+    assert int(changed["items"][0]["statistics"]["viewCount"]) == \
+        int(first["items"][0]["statistics"]["viewCount"]) + 1000
+    assert cached_execute(video_request(channel)) == changed
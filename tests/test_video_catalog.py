@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from video_catalog import VideoCatalog
+
+
+@pytest.fixture
+def video_data():
+    rng = np.random.default_rng(7)
+    size = 3000
+    return pd.DataFrame({
+        'id': [f"video{index:05d}" for index in range(size)],
+        'published_date': pd.Timestamp("2024-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, 365 * 24, size),
+                                                                                  unit="h"),
+        'view_count': rng.integers(0, 10 ** 6, size),
+        'like_count': rng.integers(0, 10 ** 4, size),
+        'comment_count': rng.integers(0, 10 ** 3, size),
+    })
+
+
+@pytest.fixture
+def catalog(video_data):
+    video_tags = pd.DataFrame({'video_id': ["video00001", "video00001", "video00002"],
+                               'tag': ["physics", "exam", "physics"]})
+    return VideoCatalog(video_data, video_tags)
+
+
+def test_date_range_matches_a_mask(catalog, video_data):
+    start, end = pd.Timestamp("2024-03-01", tz="UTC"), pd.Timestamp("2024-04-15", tz="UTC")
+    positions = catalog.date_range_positions(start, end)
+
+    expected = video_data[(video_data['published_date'] >= start) & (video_data['published_date'] < end)]
+    assert sorted(positions.tolist()) == sorted(expected.index.tolist())
+    assert catalog.rows(positions)['published_date'].is_monotonic_increasing
+    assert len(catalog.date_range_positions()) == len(video_data)
+
+
+@pytest.mark.parametrize("metric", ["view_count", "like_count", "comment_count"])
+def test_top_n_matches_a_full_sort(catalog, video_data, metric):
+    assert catalog.top_n(metric, 10)[metric].tolist() == video_data[metric].nlargest(10).tolist()
+
+    subset = catalog.date_range_positions("2024-06-01", "2024-06-08")
+    expected = video_data.loc[subset, metric].nlargest(25)
+    assert catalog.top_n(metric, 25, subset)[metric].tolist() == expected.tolist()
+
+    small = subset[:5]
+    assert catalog.top_n(metric, 25, small)[metric].tolist() == \
+        sorted(video_data.loc[small, metric].tolist(), reverse=True)
+
+
+def test_sorted_positions_of_a_subset(catalog, video_data):
+    subset = catalog.date_range_positions("2024-02-01", "2024-03-01")
+
+    by_views = catalog.sorted_positions('view_count', subset)
+    assert sorted(by_views.tolist()) == sorted(subset.tolist())
+    assert video_data.loc[by_views, 'view_count'].is_monotonic_decreasing
+
+    by_date = catalog.sorted_positions('published_date', subset, descending=False)
+    assert video_data.loc[by_date, 'published_date'].is_monotonic_increasing
+
+
+def test_lookups(catalog):
+    assert catalog.get("video00002")['id'] == "video00002"
+    assert catalog.get("missing") is None
+    assert catalog.tags_of("video00001") == ["physics", "exam"]
+    assert catalog.tags_of("missing") == []
+    assert catalog.tag_frequencies() == {"physics": 2, "exam": 1}
+    assert catalog.positions_of(["video00003", "missing"]).tolist() == [3]
@@ -0,0 +1,46 @@
+import pytest
+
+from video_search import VideoSearchIndex
+
+
+@pytest.fixture
+def index():
+    index = VideoSearchIndex()
+    index.update_titles([{'id': "a", 'title': "Intro to Physics"},
+                         {'id': "b", 'title': "Physics lecture 2"},
+                         {'id': "c", 'title': "Chemistry basics"}])
+    index.update_tags(["a", "b", "c"], [["Physics", "exam"], ["physics 101"], ["chemistry"]])
+    return index
+
+
+def ids(videos):
+    return [video['id'] for video in videos]
+
+
+def test_title_substring_ranked_by_match_start(index):
+    assert ids(index.search_titles("PHYS")) == ["b", "a"]
+    assert ids(index.search_titles("lecture 2")) == ["b"]
+    assert ids(index.search_titles("biology")) == []
+
+
+def test_short_and_empty_title_queries(index):
+    assert ids(index.search_titles("ch")) == ["c"]
+    assert ids(index.search_titles("")) == ["a", "b", "c"]
+
+
+def test_renamed_title_is_reindexed(index):
+    index.update_titles([{'id': "a", 'title': "Intro to Biology"},
+                         {'id': "b", 'title': "Physics lecture 2"},
+                         {'id': "c", 'title': "Chemistry basics"}])
+
+    assert ids(index.search_titles("physics")) == ["b"]
+    assert ids(index.search_titles("biology")) == ["a"]
+
+
+def test_tag_exact_and_prefix(index):
+    assert index.search_tags("physics", prefix=False) == {"a"}
+    assert index.search_tags("phys") == {"a", "b"}
+    assert index.search_tags("  ") == set()
+
+    index.update_tags(["a"], [["exam"]])
+    assert index.search_tags("phys") == {"b"}
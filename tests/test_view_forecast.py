@@ -0,0 +1,101 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import view_forecast
+from view_forecast import fast_forecast, forecast_error, get_forecast
+
+
+def daily_series(days=200, start="2024-01-01", slope=2.0):
+    return pd.DataFrame({'ds': pd.date_range(start, periods=days, freq="D"),
+                         'y': 10.0 + slope * np.arange(days)})
+
+
+def wait_for_fit(forecast_df, timeout=30):
+    # Polls like a page rerun would, until the forecast is current or its fit failed
+    deadline = time.time() + timeout
+    while True:
+        forecast, is_current = get_forecast(forecast_df, key="UC1", periods=30, mode="prophet")
+        if is_current or forecast_error(forecast_df, periods=30) is not None:
+            return forecast, is_current
+        assert time.time() < deadline, "background fit did not finish"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    # Stands in for Prophet: stores the fast forecast where a fitted one would go and records every fit
+    calls = []
+
+    def fake_fit(forecast_df, digest, key, periods):
+        calls.append(digest)
+        forecast = fast_forecast(forecast_df, periods)
+        view_forecast.os.makedirs(view_forecast.FORECAST_DIR, exist_ok=True)
+        forecast.to_parquet(view_forecast._paths(digest)[1], index=False)
+        view_forecast._write_text(view_forecast._last_good_path(key), digest)
+        return forecast
+
+    monkeypatch.setattr(view_forecast, "_fit_prophet", fake_fit)
+    return calls
+
+
+def test_fast_forecast_continues_a_linear_trend():
+    forecast = fast_forecast(daily_series(), periods=30)
+
+    assert len(forecast) == 230
+    assert forecast['ds'].iloc[-1] == pd.Timestamp("2024-01-01") + pd.Timedelta(days=229)
+    assert forecast['yhat'].iloc[-30:].to_numpy() == pytest.approx(10.0 + 2.0 * np.arange(200, 230))
+
+
+def test_fast_forecast_of_an_empty_series():
+    forecast = fast_forecast(daily_series(days=0))
+
+    assert forecast.empty
+    assert list(forecast.columns) == ['ds', 'yhat']
+
+
+def test_auto_mode_uses_the_fast_forecaster_for_large_channels(monkeypatch, fits):
+    monkeypatch.setattr(view_forecast, "FAST_MODE_THRESHOLD", 100)
+
+    forecast, is_current = get_forecast(daily_series(), periods=30)
+
+    assert is_current and fits == []
+    assert forecast['yhat'].tolist() == fast_forecast(daily_series(), 30)['yhat'].tolist()
+
+
+def test_fitted_forecast_is_cached_per_series(fits):
+    series = daily_series()
+    forecast, is_current = get_forecast(series, key="UC1", periods=30, mode="prophet")
+    if not is_current:
+        forecast, is_current = wait_for_fit(series)
+    assert is_current and len(fits) == 1
+
+    assert get_forecast(series, key="UC1", periods=30, mode="prophet")[1]
+    assert len(fits) == 1
+
+    # A changed series is fitted again, the last good forecast of the channel is shown meanwhile
+    changed = daily_series(days=201)
+    assert wait_for_fit(changed)[1]
+    assert len(fits) == 2
+
+
+def test_failed_fit_is_reported_and_not_retried(monkeypatch):
+    calls = []
+
+    def failing_fit(forecast_df, digest, key, periods):
+        calls.append(digest)
+        raise RuntimeError("optimizer did not converge")
+
+    monkeypatch.setattr(view_forecast, "_fit_prophet", failing_fit)
+    series = daily_series(slope=3.0)
+
+    forecast, is_current = wait_for_fit(series)
+
+    assert not is_current
+    assert forecast_error(series, periods=30) == "RuntimeError: optimizer did not converge"
+    assert forecast['yhat'].tolist() == fast_forecast(series, 30)['yhat'].tolist()
+
+    get_forecast(series, key="UC1", periods=30, mode="prophet")
+    assert len(calls) == 1
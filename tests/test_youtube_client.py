@@ -0,0 +1,41 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import youtube_client
+from conftest import API_KEY
+from request_scheduler import execute
+
+
+def list_channel(channel):
+    return execute(youtube_client.get_youtube_client(API_KEY).channels().list(part="snippet", id=channel.id))
+
+
+def test_connections_are_reused_across_threads(channel, fake):
+    before = youtube_client.client_stats()["connections"]
+
+    # Every call runs on a new thread, like a Streamlit rerun or a per-call worker pool
+    for _ in range(5):
+        thread = threading.Thread(target=list_channel, args=(channel,))
+        thread.start()
+        thread.join()
+    for _ in range(3):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(list_channel, [channel] * 8))
+
+    assert fake.requests["channels"] == 29
+    assert youtube_client.client_stats()["connections"] - before <= 4
+
+
+def test_borrowed_pools_are_not_shared(fake):
+    with youtube_client.borrow_http() as first, youtube_client.borrow_http() as second:
+        assert first is not second
+    with youtube_client.borrow_http() as again:
+        assert again in (first, second)
+
+
+def test_replacing_the_transport_drops_idle_pools(fake):
+    with youtube_client.borrow_http() as http:
+        pass
+    youtube_client.set_transport(fake.http)
+    with youtube_client.borrow_http() as new_http:
+        assert new_http is not http
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+########################################################################################################################
+#                                       INDEXED VIDEO CATALOG
+########################################################################################################################
+RANKED_METRICS = ['view_count', 'like_count', 'comment_count']
+
+# Rows of a rank order examined per step when looking for the top videos of a subset
+MIN_SCAN_CHUNK = 1024
+
+
+class VideoCatalog:
+    """Read-only index over a video statistics dataframe, built once per dataset.
+
+    Keeps the rows ordered by publish date (date ranges resolve with a binary search), a hash index on the video
+    ID and a descending rank order per metric, so filters and top-N queries never sort the whole catalog again.
+    Tags come from a separate (video_id, tag) table, see compact_frames.compact_video_data.
+    """
+
+    def __init__(self, video_data, video_tags=None):
+        self.data = video_data.reset_index(drop=True)
+
+        # Publish dates as sorted int64 nanoseconds, missing dates sort first and never match a range
+        dates = self.data['published_date'].dt.tz_convert('UTC').dt.tz_localize(None)
+        date_values = dates.to_numpy(dtype='datetime64[ns]').astype('int64')
+        self._date_order = np.argsort(date_values, kind='stable')
+        self._sorted_dates = date_values[self._date_order]
+
+        # Video IDs are unique within a snapshot
+        self._id_index = pd.Index(self.data['id'])
+
+        self._rank_orders = {}
+        for metric in RANKED_METRICS:
+            values = self.data[metric].astype('float64').fillna(-np.inf).to_numpy()
+            self._rank_orders[metric] = np.argsort(-values, kind='stable')
+
+        # Per-video tag counters as one (row, tag code) list sorted by row, summed for any subset with a bincount
+        if video_tags is None:
+            video_tags = pd.DataFrame({'video_id': pd.Series(dtype=object), 'tag': pd.Categorical([])})
+        tags = video_tags['tag'].astype('category')
+        tag_rows = self._id_index.get_indexer(video_tags['video_id'].astype(object))
+        tag_codes = tags.cat.codes.to_numpy()
+        known = (tag_rows != -1) & (tag_codes != -1)
+        order = np.argsort(tag_rows[known], kind='stable')
+        self._tag_rows = tag_rows[known][order]
+        self._tag_codes = tag_codes[known][order]
+        self._tag_names = tags.cat.categories
+
+    def __len__(self):
+        return len(self.data)
+
+    def date_range_positions(self, start=None, end=None):
+        """Returns the row positions published in [start, end), ordered by publish date."""
+        low = 0 if start is None else np.searchsorted(self._sorted_dates, self._to_ns(start), side='left')
+        high = len(self.data) if end is None else np.searchsorted(self._sorted_dates, self._to_ns(end), side='left')
+        return self._date_order[low:high]
+
+    def rows(self, positions):
+        """Returns the dataframe rows at the given positions."""
+        return self.data.take(positions)
+
+    def positions_of(self, video_ids):
+        """Returns the row positions of the given video IDs, skipping IDs not in the catalog."""
+        positions = self._id_index.get_indexer(list(video_ids))
+        return positions[positions != -1]
+
+    def get(self, video_id):
+        """Returns the row of a video as a Series, or None if the video is not in the catalog."""
+        position = self._id_index.get_indexer([video_id])[0]
+        if position == -1:
+            return None
+        return self.data.iloc[position]
+
+    def tags_of(self, video_id):
+        """Returns the tags of a video, in the order they were given."""
+        position = self._id_index.get_indexer([video_id])[0]
+        if position == -1:
+            return []
+        low, high = np.searchsorted(self._tag_rows, [position, position + 1])
+        return self._tag_names[self._tag_codes[low:high]].tolist()
+
+    def top_n(self, metric, n, positions=None):
+        """Returns the n rows with the highest metric among positions (all rows when None), highest first."""
+        order = self._rank_orders[metric]
+        if positions is None:
+            return self.data.take(order[:n])
+
+        positions = np.asarray(positions)
+        if len(positions) <= n:
+            values = self.data[metric].astype('float64').fillna(-np.inf).to_numpy()[positions]
+            return self.data.take(positions[np.argsort(-values, kind='stable')])
+
+        # Walk the precomputed rank order until n members of the subset are found
+        member = np.zeros(len(self.data), dtype=bool)
+        member[positions] = True
+        chunk = max(MIN_SCAN_CHUNK, 4 * n)
+        found = []
+        found_count = 0
+        for start in range(0, len(order), chunk):
+            candidates = order[start:start + chunk]
+            hits = candidates[member[candidates]]
+            found.append(hits)
+            found_count += len(hits)
+            if found_count >= n:
+                break
+        return self.data.take(np.concatenate(found)[:n])
+
+    def sorted_positions(self, key, positions=None, descending=True):
+        """Returns positions (all rows when None) ordered by a ranked metric or 'published_date'.
+
+        Uses the precomputed orders, so paging through a sorted subset never sorts it. Missing values come last
+        in descending order.
+        """
+        order = self._date_order[::-1] if key == 'published_date' else self._rank_orders[key]
+        if not descending:
+            order = order[::-1]
+        if positions is None:
+            return order
+
+        member = np.zeros(len(self.data), dtype=bool)
+        member[np.asarray(positions)] = True
+        return order[member[order]]
+
+    def tag_frequencies(self, positions=None):
+        """Returns {tag: number of videos using it} over positions (all rows when None), most used first."""
+        codes = self._tag_codes
+        if positions is not None:
+            member = np.zeros(len(self.data), dtype=bool)
+            member[np.asarray(positions)] = True
+            codes = codes[member[self._tag_rows]]
+
+        counts = np.bincount(codes, minlength=len(self._tag_names))
+        used = np.flatnonzero(counts)
+        used = used[np.argsort(-counts[used], kind='stable')]
+        return dict(zip(self._tag_names[used], counts[used].tolist()))
+
+    @staticmethod
+    def _to_ns(value):
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+        return timestamp.to_datetime64().astype('datetime64[ns]').astype('int64')
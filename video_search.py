@@ -0,0 +1,116 @@
+import bisect
+import threading
+from collections import defaultdict
+
+########################################################################################################################
+#                                       VIDEO SEARCH INDEX
+########################################################################################################################
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class VideoSearchIndex:
+    """Inverted tag index and trigram title index of one channel, updated incrementally as videos are synced.
+
+    Tags match case-insensitively, exactly or by prefix. Titles match by case-insensitive substring and are ranked
+    by where the match starts, then by the order the videos were given in.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        self._videos = {}
+        self._titles = {}
+        self._order = {}
+        self._title_trigrams = defaultdict(set)
+
+        self._video_tags = {}
+        self._tag_postings = defaultdict(set)
+        self._sorted_tags = []
+
+    def update_titles(self, videos):
+        """Adds or refreshes video records (dicts with 'id' and 'title'), keeping the order they are given in."""
+        with self._lock:
+            for position, video in enumerate(videos):
+                video_id = video['id']
+                if video_id is None:
+                    continue
+                self._order[video_id] = position
+                self._videos[video_id] = video
+
+                title = (video.get('title') or '').lower()
+                old_title = self._titles.get(video_id)
+                if old_title == title:
+                    continue
+
+                # Only new or renamed videos touch the trigram postings
+                if old_title is not None:
+                    for trigram in _trigrams(old_title):
+                        self._title_trigrams[trigram].discard(video_id)
+                for trigram in _trigrams(title):
+                    self._title_trigrams[trigram].add(video_id)
+                self._titles[video_id] = title
+
+    def update_tags(self, video_ids, tags):
+        """Adds or refreshes the tags of videos."""
+        with self._lock:
+            changed = False
+            for video_id, video_tags in zip(video_ids, tags):
+                video_tags = frozenset(tag.lower() for tag in video_tags) if video_tags is not None else frozenset()
+                old_tags = self._video_tags.get(video_id, frozenset())
+                if old_tags == video_tags:
+                    continue
+
+                for tag in old_tags - video_tags:
+                    self._tag_postings[tag].discard(video_id)
+                for tag in video_tags - old_tags:
+                    self._tag_postings[tag].add(video_id)
+                self._video_tags[video_id] = video_tags
+                changed = True
+
+            if changed:
+                self._sorted_tags = sorted(tag for tag, postings in self._tag_postings.items() if postings)
+
+    def search_tags(self, query, prefix=True):
+        """Returns the IDs of videos with a tag equal to (or, with prefix, starting with) the query."""
+        query = query.strip().lower()
+        if not query:
+            return set()
+
+        with self._lock:
+            if not prefix:
+                return set(self._tag_postings.get(query, ()))
+
+            matches = set()
+            start = bisect.bisect_left(self._sorted_tags, query)
+            for tag in self._sorted_tags[start:]:
+                if not tag.startswith(query):
+                    break
+                matches |= self._tag_postings[tag]
+            return matches
+
+    def search_titles(self, query):
+        """Returns the video records whose title contains the query, best matches first."""
+        query = query.strip().lower()
+
+        with self._lock:
+            if not query:
+                return sorted(self._videos.values(), key=lambda video: self._order[video['id']])
+
+            if len(query) < 3:
+                # Too short for trigrams, scan the titles
+                candidates = self._titles.keys()
+            else:
+                postings = sorted((self._title_trigrams.get(trigram, set()) for trigram in _trigrams(query)), key=len)
+                candidates = set.intersection(*postings) if postings else set()
+
+            matches = []
+            for video_id in candidates:
+                match_start = self._titles[video_id].find(query)
+                if match_start != -1:
+                    matches.append((match_start, self._order[video_id], video_id))
+
+            matches.sort()
+            return [self._videos[video_id] for _, _, video_id in matches]
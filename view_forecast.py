@@ -0,0 +1,159 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from background_jobs import BackgroundJobs
+from instrumentation import timed
+
+########################################################################################################################
+#                                       VIEW FORECASTING SERVICE
+########################################################################################################################
+FORECAST_DIR = os.path.join(".cache", "forecasts")
+
+# Above this many videos the page defaults to the fast forecaster
+FAST_MODE_THRESHOLD = 5000
+
+# Smoothing factor of the fast (double exponential smoothing) forecaster
+FAST_ALPHA = 0.3
+
+# Prophet fits run one at a time in the background, so a slow fit never blocks a page run. A series whose fit
+# raised is reported instead of fitted again.
+_fits = BackgroundJobs(max_workers=1)
+
+
+def series_digest(forecast_df):
+    """Returns a digest of the (ds, y) series, fitted models are keyed on it."""
+    hashed = pd.util.hash_pandas_object(forecast_df[['ds', 'y']], index=False).values
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+def _paths(digest):
+    return (os.path.join(FORECAST_DIR, f"{digest}.json"),
+            os.path.join(FORECAST_DIR, f"{digest}.parquet"))
+
+
+def _last_good_path(key):
+    return os.path.join(FORECAST_DIR, f"last_{key}.txt")
+
+
+def _write_text(path, text):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+@timed("fit_prophet")
+def _fit_prophet(forecast_df, digest, key, periods):
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+
+    # Initialize the Prophet model
+    model = Prophet(
+        yearly_seasonality=False,
+        weekly_seasonality=True,
+        daily_seasonality=True,
+        seasonality_mode='additive')
+
+    # Fit the model with the data
+    model.fit(forecast_df)
+
+    # Predict views for the future dates
+    future_dates = model.make_future_dataframe(periods=periods)
+    forecast = model.predict(future_dates)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+    os.makedirs(FORECAST_DIR, exist_ok=True)
+    model_path, forecast_path = _paths(digest)
+    _write_text(model_path, model_to_json(model))
+    tmp_path = f"{forecast_path}.{threading.get_ident()}.tmp"
+    forecast.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, forecast_path)
+    if key is not None:
+        _write_text(_last_good_path(key), digest)
+
+    return forecast
+
+
+def _load_forecast(digest):
+    forecast_path = _paths(digest)[1]
+    if os.path.exists(forecast_path):
+        return pd.read_parquet(forecast_path)
+    return None
+
+
+def load_model(digest):
+    """Returns the fitted Prophet model stored for a series digest, or None."""
+    from prophet.serialize import model_from_json
+
+    model_path = _paths(digest)[0]
+    if not os.path.exists(model_path):
+        return None
+    with open(model_path) as f:
+        return model_from_json(f.read())
+
+
+def fast_forecast(forecast_df, periods=30, alpha=FAST_ALPHA):
+    """Forecasts daily views with Brown's double exponential smoothing, fully vectorized.
+
+    Returns the same ds/yhat columns as the Prophet forecast, covering the history and the next periods days.
+    """
+    daily = forecast_df.set_index('ds')['y'].astype('float64').resample('D').mean().interpolate()
+    if daily.empty:
+        return pd.DataFrame({'ds': pd.Series(dtype=forecast_df['ds'].dtype), 'yhat': pd.Series(dtype='float64')})
+
+    # Both smoothing passes are exponentially weighted means, computed without a Python loop
+    first = daily.ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    second = pd.Series(first).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+    level = 2 * first - second
+    trend = alpha / (1 - alpha) * (first - second)
+
+    steps = np.arange(1, periods + 1)
+    future = level[-1] + steps * trend[-1]
+    fitted = np.concatenate([[level[0]], level[:-1] + trend[:-1]])
+
+    return pd.DataFrame({
+        'ds': daily.index.append(pd.date_range(daily.index[-1] + pd.Timedelta(days=1), periods=periods)),
+        'yhat': np.concatenate([fitted, future]),
+    })
+
+
+def forecast_error(forecast_df, periods=30):
+    """Returns the error of a failed Prophet fit of this series, or None if it did not fail."""
+    return _fits.error(f"{series_digest(forecast_df)}_{periods}")
+
+
+@timed("forecast")
+def get_forecast(forecast_df, key=None, periods=30, mode="auto"):
+    """Returns (forecast, is_current) for a (ds, y) series without ever fitting Prophet on the caller's thread.
+
+    In prophet mode a forecast cached for this exact series is returned right away. Otherwise a background fit
+    is started and the last good forecast stored under key is returned (or the fast forecast when there is
+    none), with is_current False until the new fit is done. A series whose fit failed is not fitted again, see
+    forecast_error. mode="auto" picks the fast forecaster for very large channels.
+    """
+    if mode == "auto":
+        mode = "fast" if len(forecast_df) > FAST_MODE_THRESHOLD else "prophet"
+    if mode == "fast":
+        return fast_forecast(forecast_df, periods), True
+
+    digest = f"{series_digest(forecast_df)}_{periods}"
+    forecast = _load_forecast(digest)
+    if forecast is not None:
+        return forecast, True
+
+    future = _fits.submit(digest, _fit_prophet, forecast_df.copy(), digest, key, periods)
+    if future is not None and future.done() and future.exception() is None:
+        return future.result(), True
+
+    # Fall back to the last good forecast of this key while the new one is fitted
+    if key is not None and os.path.exists(_last_good_path(key)):
+        with open(_last_good_path(key)) as f:
+            forecast = _load_forecast(f.read().strip())
+        if forecast is not None:
+            return forecast, False
+
+    return fast_forecast(forecast_df, periods), False
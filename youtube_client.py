@@ -0,0 +1,172 @@
+import contextlib
+import json
+import threading
+import time
+
+import httplib2
+
+from instrumentation import annotate
+
+########################################################################################################################
+#                                       SHARED YOUTUBE API CLIENT
+########################################################################################################################
+# One client per API key, built from the discovery document bundled with google-api-python-client, so the document
+# is parsed once per process instead of once per fetch. Module level state survives Streamlit reruns because the
+# module itself stays imported.
+_clients = {}
+_clients_lock = threading.Lock()
+_discovery_doc = None
+
+# httplib2.Http is not thread-safe, so each request borrows a keep-alive connection pool from one process wide
+# free list and returns it afterwards. Streamlit reruns and short-lived worker pools run on fresh threads, a per
+# thread pool would open new connections for every one of them.
+_idle_http = []
+_idle_http_lock = threading.Lock()
+
+# Idle pools kept for reuse, more than the busiest fan-out (harvester, reply expansion, ingestion) ever borrows
+MAX_IDLE_HTTP = 16
+
+# Builds a new transport, replaced by set_transport (e.g. with the offline stand-in of fake_youtube)
+_http_factory = None
+_transport_generation = 0
+
+_stats_lock = threading.Lock()
+_stats = {
+    "builds": 0,
+    "build_seconds": 0.0,
+    "reuses": 0,
+    "connections": 0,
+    "cold_calls": 0,
+    "cold_call_seconds": 0.0,
+    "warm_calls": 0,
+    "warm_call_seconds": 0.0,
+    "response_bytes": 0,
+}
+
+
+def _get_discovery_doc():
+    global _discovery_doc
+    if _discovery_doc is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        _discovery_doc = json.loads(get_static_doc("youtube", "v3"))
+    return _discovery_doc
+
+
+def _checkout_http():
+    with _idle_http_lock:
+        generation = _transport_generation
+        if _idle_http:
+            return _idle_http.pop(), generation
+
+    http = _http_factory() if _http_factory is not None else httplib2.Http(timeout=60)
+    with _stats_lock:
+        _stats["connections"] += 1
+    return http, generation
+
+
+def _checkin_http(http, generation):
+    with _idle_http_lock:
+        # Pools of a replaced transport are dropped, the most recently used pool is handed out first
+        if generation == _transport_generation and len(_idle_http) < MAX_IDLE_HTTP:
+            _idle_http.append(http)
+
+
+@contextlib.contextmanager
+def borrow_http():
+    """Lends an idle keep-alive connection pool to the calling thread for the duration of the with block."""
+    http, generation = _checkout_http()
+    try:
+        yield http
+    finally:
+        _checkin_http(http, generation)
+
+
+def set_transport(factory):
+    """Makes every request go through factory() (an httplib2.Http look-alike), None restores HTTP."""
+    global _http_factory, _transport_generation
+    with _idle_http_lock:
+        _http_factory = factory
+        _transport_generation += 1
+        _idle_http.clear()
+
+
+def _build_request(http, postproc, *args, **kwargs):
+    from googleapiclient.http import HttpRequest
+
+    # The http object bound at build time is never used, execute() runs each request on a borrowed pool
+    def counting_postproc(resp, content):
+        with _stats_lock:
+            _stats["response_bytes"] += len(content)
+        annotate(bytes=len(content))
+        return postproc(resp, content)
+
+    return HttpRequest(http, counting_postproc, *args, **kwargs)
+
+
+def get_youtube_client(api_key):
+    """Returns the shared YouTube Data API client for the given API key."""
+    client = _clients.get(api_key)
+    if client is not None:
+        with _stats_lock:
+            _stats["reuses"] += 1
+        return client
+
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            # The discovery module is only needed to build a client, channels served from the caches never load it
+            from googleapiclient.discovery import build_from_document
+
+            start = time.perf_counter()
+            client = build_from_document(_get_discovery_doc(),
+                                         developerKey=api_key,
+                                         http=httplib2.Http(timeout=60),
+                                         requestBuilder=_build_request)
+            elapsed = time.perf_counter() - start
+            _clients[api_key] = client
+            with _stats_lock:
+                _stats["builds"] += 1
+                _stats["build_seconds"] += elapsed
+            return client
+
+    with _stats_lock:
+        _stats["reuses"] += 1
+    return client
+
+
+def execute(request):
+    """Executes an API request on a borrowed keep-alive connection pool and records its latency."""
+    with borrow_http() as http:
+        cold = not getattr(http, "connections", None)
+
+        start = time.perf_counter()
+        response = request.execute(http=http)
+        elapsed = time.perf_counter() - start
+
+    with _stats_lock:
+        if cold:
+            _stats["cold_calls"] += 1
+            _stats["cold_call_seconds"] += elapsed
+        else:
+            _stats["warm_calls"] += 1
+            _stats["warm_call_seconds"] += elapsed
+
+    return response
+
+
+def client_stats():
+    """Returns build/connection reuse counters and the estimated latency saved by reusing them."""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    avg_build = stats["build_seconds"] / stats["builds"] if stats["builds"] else 0.0
+    avg_cold = stats["cold_call_seconds"] / stats["cold_calls"] if stats["cold_calls"] else 0.0
+    avg_warm = stats["warm_call_seconds"] / stats["warm_calls"] if stats["warm_calls"] else 0.0
+
+    stats["avg_build_seconds"] = avg_build
+    stats["avg_cold_call_seconds"] = avg_cold
+    stats["avg_warm_call_seconds"] = avg_warm
+    # Every reuse skips a discovery parse, every warm call skips a TCP/TLS handshake
+    stats["startup_seconds_saved"] = avg_build * stats["reuses"]
+    stats["call_seconds_saved"] = max(avg_cold - avg_warm, 0.0) * stats["warm_calls"]
+    return stats